@@ -4,7 +4,10 @@ Main Streamlit interface for analyzing column lineage from GitHub repositories
 """
 
 import streamlit as st
+import os
+import shutil
 import sys
+import tempfile
 from pathlib import Path
 
 # Add local modules to path
@@ -12,10 +15,22 @@ sys.path.append(str(Path(__file__).parent))
 
 from src.github_ingestion import GitHubIngestion
 from src.code_parser import TeradataCodeParser
-from src.rag_pipeline import LineageRAGPipeline
-from src.lineage_analyzer import LineageAnalyzer
+from src.rag_pipeline import EmbeddingCache, LineageRAGPipeline, LocalDenseEmbedding
+from src.lineage_analyzer import LineageAnalyzer, LineageCache
 from src.visualizer import LineageVisualizer
 
+# Saved indexes, keyed by repository URL and commit SHA
+INDEX_CACHE_DIR = Path(tempfile.gettempdir()) / "teradata_lineage_index"
+
+# Chunk embeddings, keyed by chunk text and embedding model
+EMBEDDING_CACHE_DIR = Path(tempfile.gettempdir()) / "teradata_lineage_embeddings"
+
+# Lineage results, keyed by query, model and indexed commit
+LINEAGE_CACHE_PATH = Path(tempfile.gettempdir()) / "teradata_lineage_results.json"
+
+# Upper bound for parser processes and embedding threads
+MAX_WORKERS = 64
+
 # Page configuration
 st.set_page_config(
     page_title="Teradata Lineage Analyzer",
@@ -117,6 +132,75 @@ def sidebar_config():
             api_key = st.text_input("Anthropic API Key", type="password")
             model_id = "claude-3-5-sonnet-20241022"
         
+        # Indexing Settings
+        st.markdown("### Indexing")
+        sparse_embeddings = st.checkbox(
+            "Sparse TF-IDF index",
+            value=False,
+            help="Keep embeddings in a sparse matrix; recommended for large repositories"
+        )
+        
+        embedding_model_path = st.text_input(
+            "Local Embedding Model",
+            value="",
+            help="Directory of a sentence-transformers model for dense semantic embeddings; leave empty for TF-IDF"
+        )
+        
+        embedding_storage = st.selectbox(
+            "Embedding Storage",
+            ["float32", "float16", "int8"],
+            help="Precision of stored dense embeddings and the FAISS index; lower uses less memory"
+        )
+        
+        embedding_threads = st.number_input(
+            "Embedding Threads",
+            min_value=1,
+            max_value=MAX_WORKERS,
+            value=1,
+            help="Number of threads encoding batches with the local embedding model"
+        )
+        
+        max_features = st.number_input(
+            "Max Vocabulary Size",
+            min_value=0,
+            value=0,
+            step=10000,
+            help="Cap on TF-IDF terms (0 = unlimited), keeping the most frequent"
+        )
+        
+        min_df = st.number_input(
+            "Min Term Frequency",
+            min_value=1,
+            value=1,
+            help="Drop TF-IDF terms found in fewer chunks than this; 1 keeps rare table and column names"
+        )
+        
+        index_type = st.selectbox(
+            "Vector Index",
+            ["flat", "ivf", "hnsw"],
+            help="flat: exact search; ivf/hnsw: approximate search for very large repositories"
+        )
+        
+        parser_workers = st.number_input(
+            "Parser Workers",
+            min_value=1,
+            max_value=MAX_WORKERS,
+            value=min(os.cpu_count() or 1, MAX_WORKERS),
+            help="Number of processes used to parse code files"
+        )
+        
+        ignore_patterns = st.text_input(
+            "Ignore Patterns",
+            value="",
+            help="Comma-separated globs for files or folders to skip, e.g. archive/*, *_bkp.sql"
+        )
+        
+        incremental = st.checkbox(
+            "Incremental re-index",
+            value=True,
+            help="Only re-parse files changed since the last indexed commit"
+        )
+        
         # Index Repository Button
         st.markdown("---")
         if st.button("🔄 Index Repository", type="primary", use_container_width=True):
@@ -128,6 +212,16 @@ def sidebar_config():
                 'model_id': model_id,
                 'aws_region': aws_region if llm_provider == "AWS Bedrock" else None,
                 'api_key': api_key if llm_provider == "Anthropic API" else None,
+                'sparse_embeddings': sparse_embeddings,
+                'index_type': index_type,
+                'max_features': int(max_features) or None,
+                'min_df': int(min_df),
+                'embedding_model_path': embedding_model_path.strip() or None,
+                'embedding_storage': embedding_storage,
+                'embedding_threads': int(embedding_threads),
+                'incremental': incremental,
+                'parser_workers': int(parser_workers),
+                'ignore_patterns': [p.strip() for p in ignore_patterns.split(',') if p.strip()],
                 'index_action': True
             }
         
@@ -163,26 +257,87 @@ def index_repository(config):
                 st.session_state.repo_path = repo_path
                 st.write(f"✅ Repository cloned to: {repo_path}")
                 
-                # Step 2: Parse Code Files
-                st.write("🔍 Parsing Teradata code files...")
-                parser = TeradataCodeParser(repo_path)
-                parsed_files = parser.parse_all_files()
-                st.write(f"✅ Parsed {len(parsed_files)} files")
+                commit_sha = ingestion.get_commit_sha()
                 
-                # Step 3: Build RAG Pipeline
+                # Step 2: Build RAG Pipeline
                 st.write("🧠 Building RAG pipeline...")
+                embedder = None
+                if config.get('embedding_model_path'):
+                    embedder = LocalDenseEmbedding(
+                        config['embedding_model_path'],
+                        workers=config.get('embedding_threads', 1),
+                        storage_dtype=config.get('embedding_storage', 'float32')
+                    )
+                
                 rag_pipeline = LineageRAGPipeline(
                     llm_provider=config['llm_provider'],
                     model_id=config['model_id'],
                     aws_region=config.get('aws_region'),
-                    api_key=config.get('api_key')
+                    api_key=config.get('api_key'),
+                    sparse_embeddings=config.get('sparse_embeddings', False),
+                    embedding_options={
+                        'min_df': config.get('min_df', 1),
+                        'max_features': config.get('max_features')
+                    },
+                    index_type=config.get('index_type', 'flat'),
+                    embedder=embedder,
+                    embedding_cache=get_embedding_cache() if embedder else None
+                )
+                
+                # Step 3: Reuse a saved index for this commit if one exists
+                index_path = LineageRAGPipeline.index_path(
+                    INDEX_CACHE_DIR, config['repo_url'], commit_sha
                 )
                 
-                # Step 4: Index Documents
-                st.write("📚 Creating vector embeddings...")
-                rag_pipeline.index_documents(parsed_files)
+                previous_path = None
+                if config.get('incremental', True) and ingestion.previous_sha:
+                    previous_path = LineageRAGPipeline.index_path(
+                        INDEX_CACHE_DIR, config['repo_url'], ingestion.previous_sha
+                    )
+                
+                if rag_pipeline.load(index_path):
+                    st.write(f"✅ Loaded saved index for commit {commit_sha[:8]}")
+                elif previous_path and rag_pipeline.load(previous_path):
+                    # Step 4: Re-parse only files changed since the indexed commit
+                    changes = ingestion.get_changed_files(rag_pipeline.commit_sha)
+                    st.write(f"🔍 Re-parsing {len(changes['changed'])} changed files...")
+                    parser = TeradataCodeParser(
+                        repo_path,
+                        ignore_patterns=config.get('ignore_patterns')
+                    )
+                    parsed_files = parser.parse_files(
+                        [repo_path / rel_path for rel_path in changes['changed']],
+                        workers=config.get('parser_workers', 1)
+                    )
+                    
+                    # Step 5: Swap their chunks in the existing index
+                    st.write("📚 Updating vector embeddings...")
+                    rag_pipeline.update_documents(
+                        parsed_files,
+                        changes['changed'] + changes['deleted']
+                    )
+                    rag_pipeline.save(index_path, commit_sha=commit_sha)
+                    
+                    # The new index supersedes the one it was updated from
+                    shutil.rmtree(previous_path, ignore_errors=True)
+                    st.write(f"✅ Vector index updated ({len(changes['deleted'])} files removed)")
+                else:
+                    # Step 4: Parse, chunk and embed code files as a stream
+                    st.write("🔍 Parsing and indexing Teradata code files...")
+                    parser = TeradataCodeParser(
+                        repo_path,
+                        ignore_patterns=config.get('ignore_patterns')
+                    )
+                    rag_pipeline.index_documents(
+                        parser.iter_parsed_files(workers=config.get('parser_workers', 1))
+                    )
+                    st.write(f"✅ Parsed {rag_pipeline.get_stats()['total_files']} files")
+                    
+                    rag_pipeline.save(index_path, repo_url=config['repo_url'],
+                                      commit_sha=commit_sha)
+                    st.write("✅ Vector index created")
+                
                 st.session_state.rag_pipeline = rag_pipeline
-                st.write("✅ Vector index created")
                 
                 st.session_state.repo_indexed = True
                 st.session_state.initialized = True
@@ -269,6 +424,17 @@ def main():
             help="Enter the column name to trace"
         )
     
+    # Files touching the table, straight from the table index
+    if table_name:
+        referencing_files = st.session_state.rag_pipeline.table_index.files_for_table(table_name)
+        
+        if referencing_files:
+            with st.expander(f"📁 {len(referencing_files)} files reference {table_name.upper()}"):
+                for file_path in referencing_files:
+                    st.markdown(f"- `{file_path}`")
+        else:
+            st.warning(f"No indexed files reference {table_name.upper()}")
+    
     # Advanced options
     with st.expander("⚙️ Advanced Options"):
         max_depth = st.slider(
@@ -309,6 +475,18 @@ def main():
         )
 
 
+@st.cache_resource
+def get_embedding_cache():
+    """Embedding cache shared by all sessions (one writer per cache directory)"""
+    return EmbeddingCache(EMBEDDING_CACHE_DIR)
+
+
+@st.cache_resource
+def get_lineage_cache():
+    """Lineage result cache shared by all sessions"""
+    return LineageCache(LINEAGE_CACHE_PATH)
+
+
 def analyze_lineage(table_name, column_name, max_depth, 
                     include_transformations, show_code_snippets):
     """Perform lineage analysis"""
@@ -317,7 +495,10 @@ def analyze_lineage(table_name, column_name, max_depth,
         try:
             # Initialize analyzer
             st.write("🔍 Searching codebase...")
-            analyzer = LineageAnalyzer(st.session_state.rag_pipeline)
+            analyzer = LineageAnalyzer(
+                st.session_state.rag_pipeline,
+                result_cache=get_lineage_cache()
+            )
             
             # Perform analysis
             st.write("🧠 Analyzing with Claude...")
@@ -394,13 +575,15 @@ def display_lineage_chain(lineage_result, show_code_snippets):
     
     for i, step in enumerate(lineage_chain):
         with st.container():
-            st.markdown(f"#### Level {i + 1}: {step.get('table', 'Unknown')}")
+            st.markdown(f"#### Level {step.get('level', i + 1)}: {step.get('table', 'Unknown')}")
             
             col1, col2 = st.columns([2, 1])
             
             with col1:
                 st.markdown(f"**Column**: `{step.get('column', 'N/A')}`")
                 st.markdown(f"**Operation**: {step.get('operation', 'N/A')}")
+                if step.get('sources'):
+                    st.markdown(f"**Derived from**: {', '.join(f'`{source}`' for source in step['sources'])}")
                 
                 if show_code_snippets and step.get('code_snippet'):
                     with st.expander("View Code Snippet"):
@@ -410,7 +593,8 @@ def display_lineage_chain(lineage_result, show_code_snippets):
                 st.markdown(f"**File**: `{step.get('source_file', 'N/A')}`")
                 st.markdown(f"**Line**: {step.get('line_number', 'N/A')}")
             
-            if i < len(lineage_chain) - 1:
+            # Arrow between levels; steps of one level read side by side
+            if i < len(lineage_chain) - 1 and lineage_chain[i + 1].get('level') != step.get('level'):
                 st.markdown("⬇️")
 
 
@@ -3,21 +3,481 @@ Teradata Code Parser
 Extracts SQL and metadata from various file types
 """
 
+import mmap
+import os
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Tuple
 from dataclasses import dataclass
 
 
+# Source files at least this large are read through mmap (bytes)
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def read_source(path: str, start: int = 0, end: Optional[int] = None,
+                ascii_only: bool = False) -> str:
+    """
+    Read a character range of a source file, decoding like the parser does
+    
+    Only the bytes that can hold the range are read: the range itself for
+    ASCII files, otherwise the first 4 * end bytes (UTF-8 uses at most 4
+    bytes per character). Large files are read through mmap so a snippet
+    does not pull the whole file into memory.
+    
+    Args:
+        path: File path
+        start: Start character offset
+        end: End character offset (end of file if None)
+        ascii_only: The file is ASCII, so character and byte offsets agree
+    
+    Returns:
+        Text in [start, end)
+    """
+    if end is None:
+        byte_start, byte_end = 0, None
+    elif ascii_only:
+        byte_start, byte_end = start, end
+        start, end = 0, end - start
+    else:
+        byte_start, byte_end = 0, 4 * end
+    
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                data = mapped[byte_start:byte_end]
+        else:
+            f.seek(byte_start)
+            data = f.read(-1 if byte_end is None else byte_end - byte_start)
+    
+    return data.decode('utf-8', errors='ignore')[start:end]
+
+
+@dataclass
+class SQLStatement:
+    """
+    Single SQL statement extracted from a file
+    
+    Slotted, with TableRegistry-normalized (interned) table names, since a
+    large repository yields hundreds of thousands of these and they are
+    pickled between parser processes.
+    """
+    __slots__ = ('statement_id', 'type', 'content', 'tables',
+                 'target_table', 'target_tables', 'source_tables', 'columns',
+                 'start_offset', 'end_offset', 'start_line', 'end_line')
+    statement_id: int
+    type: str
+    content: str
+    tables: List[str]
+    # Table named by the leading keyword, and every table the statement
+    # writes (e.g. all INSERT targets inside a procedure body)
+    target_table: Optional[str]
+    target_tables: List[str]
+    source_tables: List[str]
+    columns: List[Tuple[str, str]]  # (name, expression)
+    # Location in the file content: character offsets and 1-based lines
+    start_offset: int
+    end_offset: int
+    start_line: int
+    end_line: int
+    
+    @property
+    def length(self) -> int:
+        return len(self.content)
+
+
 @dataclass
 class ParsedFile:
-    """Container for parsed file information"""
+    """
+    Container for parsed file information
+    
+    File text is not kept: content and read() load it from source_path on
+    access, so parsed files hold metadata rather than the repository.
+    """
+    __slots__ = ('file_path', 'file_type', 'source_path', 'sql_statements',
+                 'tables_referenced', 'metadata')
     file_path: str
     file_type: str  # 'sql', 'bteq', 'ksh', 'stored_proc'
-    content: str
-    sql_statements: List[Dict[str, any]]
+    source_path: str  # File on disk the content is read from
+    sql_statements: List[SQLStatement]
     tables_referenced: List[str]
     metadata: Dict[str, any]
+    
+    @property
+    def content(self) -> str:
+        """Full file text, read from disk"""
+        return self.read()
+    
+    def read(self, start: int = 0, end: Optional[int] = None) -> str:
+        """
+        Read part of the file text, e.g. a statement's offsets
+        
+        Args:
+            start: Start character offset
+            end: End character offset (end of file if None)
+        
+        Returns:
+            Text in [start, end)
+        """
+        return read_source(self.source_path, start, end,
+                           ascii_only=self.metadata.get('ascii', False))
+
+
+class TableRegistry:
+    """
+    Interns normalized DB.TABLE names to integer ids
+    
+    Ids are dense and assigned in first-seen order, so id lookups are list
+    indexing and table sets can be held as integer sets. Bare table names
+    and registered aliases resolve to the ids they may refer to.
+    """
+    
+    def __init__(self):
+        # id -> normalized name
+        self._names: List[str] = []
+        # normalized name -> id
+        self._ids: Dict[str, int] = {}
+        # bare table name -> ids of names with that table part
+        self._bare: Dict[str, set] = {}
+        # alias -> id
+        self._aliases: Dict[str, int] = {}
+    
+    def __len__(self) -> int:
+        return len(self._names)
+    
+    @staticmethod
+    def normalize(name: str) -> str:
+        """
+        Normalize a table name: strip quotes and whitespace, uppercase, intern
+        
+        Args:
+            name: Table name as written in SQL
+        
+        Returns:
+            Normalized name
+        """
+        return sys.intern(re.sub(r'["\'\s]', '', name).upper())
+    
+    @property
+    def names(self) -> List[str]:
+        """Normalized names indexed by id (live list, do not modify)"""
+        return self._names
+    
+    def intern(self, name: str) -> int:
+        """
+        Get the id of a table name, registering it if new
+        
+        Args:
+            name: Table name, qualified or bare
+        
+        Returns:
+            Table id
+        """
+        table_id = self._ids.get(name)
+        if table_id is not None:
+            return table_id
+        
+        name = self.normalize(name)
+        table_id = self._ids.get(name)
+        if table_id is None:
+            table_id = len(self._names)
+            self._names.append(name)
+            self._ids[name] = table_id
+            self._bare.setdefault(name.split('.')[-1], set()).add(table_id)
+        
+        return table_id
+    
+    def ids(self, names: Iterable[str]) -> List[int]:
+        """Intern several table names"""
+        return [self.intern(name) for name in names]
+    
+    def name(self, table_id: int) -> str:
+        """Get the normalized name of a table id"""
+        return self._names[table_id]
+    
+    def database(self, table_id: int) -> Optional[str]:
+        """Get the database part of a table id, None for bare names"""
+        name = self._names[table_id]
+        return name.split('.')[0] if '.' in name else None
+    
+    def table(self, table_id: int) -> str:
+        """Get the table part of a table id, without database"""
+        return self._names[table_id].split('.')[-1]
+    
+    def add_alias(self, alias: str, name: str) -> int:
+        """
+        Register another name for a table, e.g. a view or synonym
+        
+        Args:
+            alias: Alternative name
+            name: Table the alias refers to
+        
+        Returns:
+            Table id the alias resolves to
+        """
+        table_id = self.intern(name)
+        self._aliases[self.normalize(alias)] = table_id
+        
+        return table_id
+    
+    def remove_alias(self, alias: str) -> None:
+        """Drop an alias registered with add_alias, if any"""
+        self._aliases.pop(self.normalize(alias), None)
+    
+    def lookup(self, name: str) -> List[int]:
+        """
+        Resolve a name to the ids it may refer to, without registering it
+        
+        Aliases and qualified names (DB.TABLE) match exactly; bare names
+        match the table in any database.
+        
+        Args:
+            name: Table name, case-insensitive
+        
+        Returns:
+            Sorted list of table ids
+        """
+        name = self.normalize(name)
+        
+        if name in self._aliases:
+            return [self._aliases[name]]
+        if '.' in name:
+            return [self._ids[name]] if name in self._ids else []
+        
+        return sorted(self._bare.get(name, ()))
+    
+    def to_dict(self) -> Dict:
+        """Serialize to a JSON-compatible dictionary"""
+        return {
+            'names': self._names,
+            'aliases': {alias: self._names[table_id] for alias, table_id in self._aliases.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TableRegistry':
+        """Rebuild a registry serialized with to_dict, keeping ids"""
+        registry = cls()
+        
+        for name in data.get('names', []):
+            registry.intern(name)
+        for alias, name in data.get('aliases', {}).items():
+            registry.add_alias(alias, name)
+        
+        return registry
+
+
+class TableIndex:
+    """
+    Inverted index from table name to the files and statements referencing it
+    
+    Pass-through views (SELECT * from one table) are registered as aliases
+    of their table, so looking up the view finds the code writing the table.
+    """
+    
+    # CREATE/REPLACE VIEW v AS [LOCKING ... FOR ACCESS] SELECT * FROM t
+    VIEW_ALIAS_PATTERN = re.compile(
+        r'(?:\s+|--[^\n]*|/\*.*?\*/)*(?:CREATE|REPLACE)\s+VIEW\s+(\w+\.\w+|\w+)\s+AS\s+'
+        r'(?:LOCK(?:ING)?\s+(?:(?:ROW|TABLE|VIEW|DATABASE)\s+)?(?:\w+(?:\.\w+)?\s+)?FOR\s+ACCESS\s+)?'
+        r'SEL(?:ECT)?\s+\*\s+FROM\s+(\w+\.\w+|\w+)\s*',
+        re.IGNORECASE | re.DOTALL
+    )
+    
+    def __init__(self, registry: Optional[TableRegistry] = None):
+        """
+        Initialize index
+        
+        Args:
+            registry: Table registry assigning table ids (a new one if None)
+        """
+        self.registry = registry if registry is not None else TableRegistry()
+        
+        # table id -> file_path -> statement ids
+        self._tables: Dict[int, Dict[str, List[int]]] = {}
+        # table id -> file_path -> ids of statements writing the table
+        self._writers: Dict[int, Dict[str, List[int]]] = {}
+        # file_path -> table ids, for removal
+        self._files: Dict[str, List[int]] = {}
+        # file_path -> view -> table, for the view aliases each file defines
+        self._views: Dict[str, Dict[str, str]] = {}
+        # view -> file_path whose definition is registered
+        self._view_files: Dict[str, str] = {}
+    
+    def add_file(self, parsed_file: ParsedFile) -> None:
+        """
+        Add (or replace) the references of a parsed file
+        
+        Args:
+            parsed_file: ParsedFile object
+        """
+        file_path = parsed_file.file_path
+        self.remove_file(file_path)
+        
+        intern = self.registry.intern
+        references = {intern(table): [] for table in parsed_file.tables_referenced}
+        writers = {}
+        views = {}
+        for stmt in parsed_file.sql_statements:
+            for table in stmt.tables:
+                references.setdefault(intern(table), []).append(stmt.statement_id)
+            for table in stmt.target_tables:
+                writers.setdefault(intern(table), []).append(stmt.statement_id)
+            if stmt.type in ('CREATE', 'REPLACE'):
+                match = self.VIEW_ALIAS_PATTERN.fullmatch(stmt.content)
+                if match:
+                    views[match.group(1).upper()] = match.group(2).upper()
+        
+        for table_id, statement_ids in references.items():
+            self._tables.setdefault(table_id, {})[file_path] = statement_ids
+        
+        for table_id, statement_ids in writers.items():
+            self._writers.setdefault(table_id, {})[file_path] = statement_ids
+        
+        self._files[file_path] = list(references)
+        
+        if views:
+            self._views[file_path] = views
+        for view, table in views.items():
+            self.registry.add_alias(view, table)
+            self._view_files[view] = file_path
+    
+    def remove_file(self, file_path: str) -> None:
+        """
+        Drop all references of a file
+        
+        Table ids stay registered, so ids held elsewhere remain valid.
+        
+        Args:
+            file_path: Repository-relative file path
+        """
+        for table_id in self._files.pop(file_path, []):
+            for mapping in (self._writers, self._tables):
+                files = mapping.get(table_id)
+                if files is not None:
+                    files.pop(file_path, None)
+                    if not files:
+                        del mapping[table_id]
+        
+        for view in self._views.pop(file_path, {}):
+            # Keep a definition another file registered since
+            if self._view_files.get(view) == file_path:
+                del self._view_files[view]
+                self.registry.remove_alias(view)
+    
+    def resolve_ids(self, table_name: str) -> List[int]:
+        """
+        Resolve a table name to the ids of indexed tables it refers to
+        
+        Args:
+            table_name: Table name, qualified, bare or alias
+        
+        Returns:
+            Sorted list of table ids
+        """
+        return [table_id for table_id in self.registry.lookup(table_name)
+                if table_id in self._tables]
+    
+    def resolve(self, table_name: str) -> List[str]:
+        """
+        Resolve a table name to the indexed names it refers to
+        
+        Qualified names (DB.TABLE) match exactly; bare names match the table
+        in any database.
+        
+        Args:
+            table_name: Table name, case-insensitive
+        
+        Returns:
+            List of indexed table names
+        """
+        return sorted(self.registry.name(table_id) for table_id in self.resolve_ids(table_name))
+    
+    def files_for_table(self, table_name: str) -> List[str]:
+        """
+        Get files referencing a table
+        
+        Args:
+            table_name: Table name, qualified or bare
+        
+        Returns:
+            Sorted list of repository-relative file paths
+        """
+        files = set()
+        for table_id in self.resolve_ids(table_name):
+            files.update(self._tables[table_id])
+        
+        return sorted(files)
+    
+    def statements_for_table(self, table_name: str) -> List[Tuple[str, int]]:
+        """
+        Get statements referencing a table
+        
+        Args:
+            table_name: Table name, qualified or bare
+        
+        Returns:
+            Sorted list of (file_path, statement_id) pairs
+        """
+        statements = set()
+        for table_id in self.resolve_ids(table_name):
+            for file_path, statement_ids in self._tables[table_id].items():
+                statements.update((file_path, stmt_id) for stmt_id in statement_ids)
+        
+        return sorted(statements)
+    
+    def writers_for_table(self, table_name: str) -> List[Tuple[str, int]]:
+        """
+        Get statements writing a table (INSERT/CREATE/UPDATE/MERGE targets)
+        
+        Args:
+            table_name: Table name, qualified or bare
+        
+        Returns:
+            Sorted list of (file_path, statement_id) pairs
+        """
+        statements = set()
+        for table_id in self.resolve_ids(table_name):
+            for file_path, statement_ids in self._writers.get(table_id, {}).items():
+                statements.update((file_path, stmt_id) for stmt_id in statement_ids)
+        
+        return sorted(statements)
+    
+    def tables(self) -> List[str]:
+        """Get all indexed table names"""
+        return sorted(self.registry.name(table_id) for table_id in self._tables)
+    
+    def to_dict(self) -> Dict:
+        """Serialize to a JSON-compatible dictionary"""
+        name = self.registry.name
+        return {
+            'registry': self.registry.to_dict(),
+            'tables': {name(table_id): files for table_id, files in self._tables.items()},
+            'writers': {name(table_id): files for table_id, files in self._writers.items()},
+            'views': self._views,
+            'view_files': self._view_files
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TableIndex':
+        """Rebuild an index serialized with to_dict"""
+        index = cls(TableRegistry.from_dict(data.get('registry', {})))
+        intern = index.registry.intern
+        
+        for table, files in data.get('tables', {}).items():
+            table_id = intern(table)
+            index._tables[table_id] = files
+            for file_path in files:
+                index._files.setdefault(file_path, []).append(table_id)
+        for table, files in data.get('writers', {}).items():
+            index._writers[intern(table)] = files
+        # Registry aliases were restored with the registry
+        index._views = data.get('views', {})
+        index._view_files = data.get('view_files', {})
+        
+        return index
 
 
 class TeradataCodeParser:
@@ -27,6 +487,12 @@ class TeradataCodeParser:
     SQL_EXTENSIONS = ['.sql', '.bteq', '.btq']
     SCRIPT_EXTENSIONS = ['.ksh', '.sh', '.bash']
     
+    # Directories never descended into
+    IGNORED_DIRS = {'.git', 'node_modules'}
+    
+    # Files larger than this are skipped (bytes)
+    MAX_FILE_SIZE = 10 * 1024 * 1024
+    
     # Teradata-specific patterns
     PATTERNS = {
         'create_table': re.compile(
@@ -63,41 +529,272 @@ class TeradataCodeParser:
         )
     }
     
-    def __init__(self, repo_path: Path):
+    # All table reference kinds of PATTERNS fused into one alternation. Each
+    # alternative captures into a group named after its kind, so
+    # match.lastgroup tells the kind without a second scan. Keywords must
+    # start a word, so e.g. "valid_from x" is not read as a reference.
+    TABLE_REFERENCE_PATTERN = re.compile(
+        r'\bCREATE\s+(?:MULTISET\s+|SET\s+)?(?:VOLATILE\s+|GLOBAL\s+TEMPORARY\s+)?TABLE\s+'
+        r'(?P<create_table>\w+\.\w+|\w+)'
+        r'|\b(?:CREATE|REPLACE)\s+(?:RECURSIVE\s+)?VIEW\s+(?P<create_view>\w+\.\w+|\w+)'
+        r'|\bINS(?:ERT)?\s+INTO\s+(?P<insert_into>\w+\.\w+|\w+)'
+        r'|\bMERGE\s+INTO\s+(?P<merge_into>\w+\.\w+|\w+)'
+        r'|\bUPD(?:ATE)?\s+(?!SET\b)(?P<update>\w+\.\w+|\w+)'
+        r'|\bFROM\s+(?P<select_from>\w+\.\w+|\w+)'
+        r'|\bJOIN\s+(?P<join>\w+\.\w+|\w+)',
+        re.IGNORECASE
+    )
+    
+    # Whether each reference kind reads or writes its table
+    REFERENCE_ROLES = {
+        'create_table': 'write',
+        'create_view': 'write',
+        'insert_into': 'write',
+        'merge_into': 'write',
+        'update': 'write',
+        'select_from': 'read',
+        'join': 'read'
+    }
+    
+    # Lexical elements the statement splitter acts on; everything else is
+    # skipped. Strings and comments are consumed whole so semicolons and
+    # keywords inside them are ignored, and an unterminated one runs to the
+    # end of the content. BEGIN/END followed by "(" are the PERIOD functions
+    # BEGIN(p)/END(p), not block keywords.
+    STATEMENT_TOKEN_PATTERN = re.compile(
+        r"(?P<string>'(?:[^']|'')*'?)"
+        r'|(?P<quoted>"(?:[^"]|"")*"?)'
+        r'|(?P<line_comment>--[^\n]*)'
+        r'|(?P<block_comment>/\*.*?(?:\*/|\Z))'
+        r'|(?P<dot_command>^[ \t]*\.[A-Za-z][^\n]*)'
+        r'|(?P<semicolon>;)'
+        r'|\b(?P<keyword>END\s+CASE|(?:BEGIN|END)\b(?!\s*\()|CASE)\b(?:(?=\s+(?P<next_word>\w+)))?',
+        re.IGNORECASE | re.MULTILINE | re.DOTALL
+    )
+    
+    # Comments and whitespace before the first keyword of a statement
+    LEADING_COMMENTS_PATTERN = re.compile(r'^(?:\s+|--[^\n]*|/\*.*?\*/)*', re.DOTALL)
+    
+    # Words after BEGIN/END that do not open or close a BEGIN/CASE block
+    # (BEGIN TRANSACTION, END IF, END LOOP, ...); END CASE is one token
+    UNBLOCKED_KEYWORD_SUFFIXES = {
+        'TRANSACTION', 'WORK', 'IF', 'LOOP', 'WHILE', 'FOR', 'REPEAT'
+    }
+    
+    # Reference kinds naming the written table for each writing statement type
+    TARGET_PATTERNS = {
+        'INSERT': ('insert_into',),
+        'CREATE': ('create_table', 'create_view'),
+        'REPLACE': ('create_view',),
+        'UPDATE': ('update',),
+        'MERGE': ('merge_into',)
+    }
+    
+    # Statement type by leading keyword, including Teradata abbreviations
+    STATEMENT_TYPES = {
+        'SELECT': 'SELECT', 'SEL': 'SELECT',
+        'INSERT': 'INSERT', 'INS': 'INSERT',
+        'UPDATE': 'UPDATE', 'UPD': 'UPDATE',
+        'DELETE': 'DELETE', 'DEL': 'DELETE',
+        'CREATE': 'CREATE',
+        'REPLACE': 'REPLACE',
+        'MERGE': 'MERGE',
+        'DROP': 'DROP'
+    }
+    
+    def __init__(self, repo_path: Path, ignore_patterns: Optional[List[str]] = None,
+                 max_file_size: Optional[int] = MAX_FILE_SIZE):
         """
         Initialize parser
         
         Args:
             repo_path: Path to repository root
+            ignore_patterns: Glob patterns for files or directories to skip,
+                matched against names and repository-relative paths
+            max_file_size: Skip files larger than this many bytes (None for no limit)
         """
         self.repo_path = Path(repo_path)
+        self.ignore_patterns = list(ignore_patterns or [])
+        self.max_file_size = max_file_size
     
-    def parse_all_files(self) -> List[ParsedFile]:
+    def parse_all_files(self, workers: int = 1) -> List[ParsedFile]:
         """
         Parse all relevant files in repository
         
+        Args:
+            workers: Number of worker processes (1 parses in-process)
+        
         Returns:
             List of ParsedFile objects
         """
-        parsed_files = []
+        return self.parse_files(self.iter_candidate_files(), workers=workers)
+    
+    def iter_candidate_files(self) -> Iterator[Path]:
+        """
+        Walk the repository once, yielding files with a supported extension
+        
+        Ignored directories are pruned before descending, and files are
+        filtered with the same checks as is_candidate_file(). Entries are
+        visited in sorted order so results are deterministic.
+        
+        Yields:
+            Paths of candidate files
+        """
+        stack = [self.repo_path]
+        
+        while stack:
+            directory = stack.pop()
+            
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                print(f"Cannot read directory {directory}: {e}")
+                continue
+            
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if self._accepts_dir(entry.path):
+                        subdirs.append(Path(entry.path))
+                    continue
+                
+                if entry.is_file() and self._accepts_file(entry.path, entry.stat):
+                    yield Path(entry.path)
+            
+            # Push in reverse so directories are visited in sorted order
+            stack.extend(reversed(subdirs))
+    
+    def is_candidate_file(self, file_path: Path) -> bool:
+        """
+        Check whether iter_candidate_files() would yield a file
         
-        # Get all relevant files
-        all_files = []
-        all_files.extend(self.repo_path.rglob('*.sql'))
-        all_files.extend(self.repo_path.rglob('*.bteq'))
-        all_files.extend(self.repo_path.rglob('*.btq'))
-        all_files.extend(self.repo_path.rglob('*.ksh'))
-        all_files.extend(self.repo_path.rglob('*.sh'))
+        Applies the extension filter, ignored directories, ignore patterns
+        and size cap to an explicit path, e.g. one reported as changed by git.
+        
+        Args:
+            file_path: Path of a file inside the repository
         
-        for file_path in all_files:
+        Returns:
+            True if the file should be parsed
+        """
+        file_path = Path(file_path)
+        
+        try:
+            parents = file_path.relative_to(self.repo_path).parents
+        except ValueError:
+            parents = []
+        for parent in parents:
+            if parent.name and not self._accepts_dir(self.repo_path / parent):
+                return False
+        
+        return file_path.is_file() and self._accepts_file(file_path, file_path.stat)
+    
+    def _accepts_dir(self, path) -> bool:
+        """Check a directory against IGNORED_DIRS and the ignore patterns"""
+        return os.path.basename(path) not in self.IGNORED_DIRS and not self._is_ignored(path)
+    
+    def _accepts_file(self, path, stat: Callable[[], os.stat_result]) -> bool:
+        """Check a file's extension, ignore patterns and size"""
+        extensions = self.SQL_EXTENSIONS + self.SCRIPT_EXTENSIONS
+        if os.path.splitext(path)[1].lower() not in extensions:
+            return False
+        if self._is_ignored(path):
+            return False
+        
+        if self.max_file_size is not None:
             try:
-                parsed = self.parse_file(file_path)
-                if parsed:
-                    parsed_files.append(parsed)
-            except Exception as e:
-                print(f"Error parsing {file_path}: {e}")
+                if stat().st_size > self.max_file_size:
+                    return False
+            except OSError:
+                return False
+        
+        return True
+    
+    def _is_ignored(self, path) -> bool:
+        """Check a path inside the repository against the ignore patterns"""
+        if not self.ignore_patterns:
+            return False
+        
+        name = os.path.basename(path)
+        try:
+            rel_path = Path(path).relative_to(self.repo_path).as_posix()
+        except ValueError:
+            rel_path = name
+        
+        return any(
+            fnmatch(name, pattern) or fnmatch(rel_path, pattern)
+            for pattern in self.ignore_patterns
+        )
+    
+    def parse_files(self, file_paths: Iterable[Path], workers: int = 1) -> List[ParsedFile]:
+        """
+        Parse a list of files, optionally across a process pool
+        
+        Files that iter_candidate_files() would skip are left out.
+        
+        Args:
+            file_paths: Paths of files to parse
+            workers: Number of worker processes (1 parses in-process)
+        
+        Returns:
+            List of ParsedFile objects
+        """
+        return list(self.iter_parsed_files(file_paths, workers=workers))
+    
+    def iter_parsed_files(self, file_paths: Optional[Iterable[Path]] = None,
+                          workers: int = 1, batch_size: int = 256) -> Iterator[ParsedFile]:
+        """
+        Parse files lazily in bounded batches
+        
+        Only batch_size files are in flight at a time, so callers that consume
+        results as they arrive never hold the whole repository in memory.
+        Within a batch, files are handed to workers in chunks; results keep
+        the order of file_paths regardless of which worker finishes first.
+        
+        Args:
+            file_paths: Paths of files to parse (defaults to all candidate
+                files); paths failing is_candidate_file() are skipped
+            workers: Number of worker processes (1 parses in-process)
+            batch_size: Number of files parsed per batch
+        
+        Yields:
+            ParsedFile objects
+        """
+        if file_paths is None:
+            file_paths = self.iter_candidate_files()
+        else:
+            file_paths = filter(self.is_candidate_file, file_paths)
+        file_paths = iter(file_paths)
+        
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
         
-        return parsed_files
+        try:
+            while True:
+                batch = list(islice(file_paths, batch_size))
+                if not batch:
+                    break
+                
+                if executor:
+                    chunksize = max(1, len(batch) // (workers * 4))
+                    results = executor.map(self._parse_file_safe, batch, chunksize=chunksize)
+                else:
+                    results = map(self._parse_file_safe, batch)
+                
+                for parsed in results:
+                    if parsed:
+                        yield parsed
+        finally:
+            if executor:
+                executor.shutdown()
+    
+    def _parse_file_safe(self, file_path: Path) -> Optional[ParsedFile]:
+        """Parse a file, reporting errors instead of raising"""
+        try:
+            return self.parse_file(file_path)
+        except Exception as e:
+            print(f"Error parsing {file_path}: {e}")
+            return None
     
     def parse_file(self, file_path: Path) -> Optional[ParsedFile]:
         """
@@ -110,7 +807,8 @@ class TeradataCodeParser:
             ParsedFile object or None
         """
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            # Keep \r\n as is so offsets match the bytes read_source decodes
+            with open(file_path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
                 content = f.read()
         except Exception as e:
             print(f"Cannot read {file_path}: {e}")
@@ -119,29 +817,29 @@ class TeradataCodeParser:
         # Determine file type
         suffix = file_path.suffix.lower()
         
-        if suffix in ['.sql']:
+        if suffix == '.sql':
             return self._parse_sql_file(file_path, content)
-        elif suffix in ['.bteq', '.btq']:
+        elif suffix in self.SQL_EXTENSIONS:
             return self._parse_bteq_file(file_path, content)
-        elif suffix in ['.ksh', '.sh', '.bash']:
+        elif suffix in self.SCRIPT_EXTENSIONS:
             return self._parse_shell_script(file_path, content)
         
         return None
     
     def _parse_sql_file(self, file_path: Path, content: str) -> ParsedFile:
         """Parse standard SQL file"""
-        sql_statements = self._extract_sql_statements(content)
-        tables = self._extract_tables(content)
+        sql_statements, tables = self._extract_sql_statements(content)
         
         return ParsedFile(
             file_path=str(file_path.relative_to(self.repo_path)),
             file_type='sql',
-            content=content,
+            source_path=os.path.abspath(file_path),
             sql_statements=sql_statements,
             tables_referenced=tables,
             metadata={
                 'size': len(content),
-                'line_count': content.count('\n') + 1
+                'line_count': content.count('\n') + 1,
+                'ascii': content.isascii()
             }
         )
     
@@ -151,38 +849,37 @@ class TeradataCodeParser:
         logon_match = self.PATTERNS['bteq_logon'].search(content)
         logon = logon_match.group(1) if logon_match else None
         
-        # Remove BTEQ commands to get pure SQL
-        sql_content = re.sub(r'^\s*\..*$', '', content, flags=re.MULTILINE)
-        
-        sql_statements = self._extract_sql_statements(sql_content)
-        tables = self._extract_tables(sql_content)
+        # The statement splitter skips BTEQ dot-commands
+        sql_statements, tables = self._extract_sql_statements(content)
         
         return ParsedFile(
             file_path=str(file_path.relative_to(self.repo_path)),
             file_type='bteq',
-            content=content,
+            source_path=os.path.abspath(file_path),
             sql_statements=sql_statements,
             tables_referenced=tables,
             metadata={
                 'logon': logon,
                 'size': len(content),
-                'line_count': content.count('\n') + 1
+                'line_count': content.count('\n') + 1,
+                'ascii': content.isascii()
             }
         )
     
     def _parse_shell_script(self, file_path: Path, content: str) -> ParsedFile:
         """Parse shell script with embedded SQL"""
-        # Extract SQL from heredocs and bteq calls
-        sql_blocks = []
+        # Extract SQL from heredocs and bteq calls, as (start, end) offsets
+        # so statements keep their position in the script
+        spans = []
         
-        # Pattern for heredoc SQL
+        # Pattern for heredoc SQL; the body follows the line with the marker
         heredoc_pattern = re.compile(
-            r'<<\s*EOF.*?EOF',
+            r'<<\s*EOF[^\n]*\n(.*?)EOF',
             re.DOTALL | re.IGNORECASE
         )
         
         for match in heredoc_pattern.finditer(content):
-            sql_blocks.append(match.group(0))
+            spans.append(match.span(1))
         
         # Pattern for SQL in quotes
         quoted_pattern = re.compile(
@@ -191,86 +888,245 @@ class TeradataCodeParser:
         )
         
         for match in quoted_pattern.finditer(content):
-            sql_blocks.append(match.group(1))
+            spans.append(match.span(1))
+        
+        # Quoted SQL inside a heredoc is already covered by the heredoc
+        sql_blocks = []
+        for start, end in sorted(spans):
+            if not sql_blocks or start >= sql_blocks[-1][1]:
+                sql_blocks.append((start, end))
         
-        # Combine and parse SQL
-        combined_sql = '\n'.join(sql_blocks)
-        sql_statements = self._extract_sql_statements(combined_sql)
-        tables = self._extract_tables(combined_sql)
+        sql_statements, tables = self._extract_sql_statements(content, sql_blocks)
         
         return ParsedFile(
             file_path=str(file_path.relative_to(self.repo_path)),
             file_type='ksh',
-            content=content,
+            source_path=os.path.abspath(file_path),
             sql_statements=sql_statements,
             tables_referenced=tables,
             metadata={
                 'sql_blocks': len(sql_blocks),
                 'size': len(content),
-                'line_count': content.count('\n') + 1
+                'line_count': content.count('\n') + 1,
+                'ascii': content.isascii()
             }
         )
     
-    def _extract_sql_statements(self, content: str) -> List[Dict[str, any]]:
+    def _extract_sql_statements(self, content: str,
+                                regions: Optional[List[Tuple[int, int]]] = None
+                                ) -> Tuple[List[SQLStatement], List[str]]:
         """
         Extract individual SQL statements with metadata
         
+        Each piece of content is scanned for table references once; the
+        file-level table list is the union of the per-piece results.
+        
         Args:
             content: SQL content
+            regions: Sorted, non-overlapping (start, end) offsets of the SQL
+                within content; all of content if None
         
         Returns:
-            List of statement dictionaries
+            Tuple of (SQLStatement objects, sorted tables referenced in content)
         """
         statements = []
+        all_tables = set()
         
-        # Split by semicolon (simple approach)
-        raw_statements = content.split(';')
-        
-        for i, stmt in enumerate(raw_statements):
-            stmt = stmt.strip()
-            if not stmt or len(stmt) < 10:
+        spans = self._split_statements(content, regions)
+        for i, (start, end, start_line, end_line) in enumerate(spans):
+            stmt = content[start:end]
+            references = self._extract_table_references(stmt)
+            all_tables.update(table for table, _ in references)
+            
+            if len(stmt) < 10:
                 continue
             
             # Determine statement type
             stmt_type = self._get_statement_type(stmt)
             
-            # Extract tables
-            tables = self._extract_tables(stmt)
+            # Split tables into the written table and its sources
+            tables = sorted({table for table, _ in references})
+            target_table = self._get_target_table(references, stmt_type)
+            target_tables = self._get_target_tables(references)
+            source_tables = [t for t in tables if t != target_table]
             
             # Extract columns (for SELECT statements)
             columns = self._extract_columns(stmt) if 'SELECT' in stmt.upper() else []
             
-            statements.append({
-                'statement_id': i,
-                'type': stmt_type,
-                'content': stmt,
-                'tables': tables,
-                'columns': columns,
-                'length': len(stmt)
-            })
+            statements.append(SQLStatement(
+                statement_id=i,
+                type=stmt_type,
+                content=stmt,
+                tables=tables,
+                target_table=target_table,
+                target_tables=target_tables,
+                source_tables=source_tables,
+                columns=columns,
+                start_offset=start,
+                end_offset=end,
+                start_line=start_line,
+                end_line=end_line
+            ))
+        
+        return statements, sorted(all_tables)
+    
+    def _split_statements(self, content: str,
+                          regions: Optional[List[Tuple[int, int]]] = None
+                          ) -> List[Tuple[int, int, int, int]]:
+        """
+        Split SQL content into statements in one linear scan
+        
+        Statements end at semicolons outside string literals, quoted
+        identifiers, comments and BEGIN ... END blocks (stored procedure
+        bodies), so a procedure stays one statement. BTEQ dot-commands are
+        skipped and end any statement in progress. Line numbers are tracked
+        by counting the newlines between consecutive tokens, so each
+        character is looked at once.
+        
+        Args:
+            content: SQL content
+            regions: Sorted, non-overlapping (start, end) offsets to split,
+                each scanned on its own; all of content if None
+        
+        Returns:
+            List of (start offset, end offset, start line, end line), with
+            offsets into content, surrounding whitespace trimmed and the
+            terminating semicolon excluded; lines are 1-based
+        """
+        spans = []
+        
+        line = 1
+        position = 0
+        piece_start = 0
+        piece_line = 1
+        
+        def add_span(end: int, end_line: int) -> None:
+            # Trim whitespace, counting newlines in the skipped prefix
+            start = piece_start
+            start_line = piece_line
+            while start < end and content[start].isspace():
+                if content[start] == '\n':
+                    start_line += 1
+                start += 1
+            while end > start and content[end - 1].isspace():
+                if content[end - 1] == '\n':
+                    end_line -= 1
+                end -= 1
+            
+            if start < end:
+                spans.append((start, end, start_line, end_line))
+        
+        if regions is None:
+            regions = [(0, len(content))]
+        
+        for region_start, region_end in regions:
+            line += content.count('\n', position, region_start)
+            position = region_start
+            piece_start = region_start
+            piece_line = line
+            
+            # Open BEGIN/CASE blocks; semicolons only split at depth 0
+            depth = 0
+            
+            for match in self.STATEMENT_TOKEN_PATTERN.finditer(content, region_start, region_end):
+                kind = match.lastgroup
+                line += content.count('\n', position, match.start())
+                position = match.end()
+                
+                if kind == 'semicolon':
+                    if depth == 0:
+                        add_span(match.start(), line)
+                        piece_start = match.end()
+                        piece_line = line
+                elif kind == 'dot_command':
+                    if depth == 0:
+                        add_span(match.start(), line)
+                        piece_start = match.end()
+                        piece_line = line
+                elif kind == 'keyword' or kind == 'next_word':
+                    word = match.group('keyword').upper()
+                    next_word = (match.group('next_word') or '').upper()
+                    
+                    # END CASE may span lines
+                    line += word.count('\n')
+                    
+                    if next_word in self.UNBLOCKED_KEYWORD_SUFFIXES:
+                        continue
+                    if word.startswith('END'):
+                        depth = max(depth - 1, 0)
+                    else:
+                        depth += 1
+                else:
+                    # Strings and comments may span lines
+                    line += match.group(kind).count('\n')
+            
+            line += content.count('\n', position, region_end)
+            position = region_end
+            add_span(region_end, line)
         
-        return statements
+        return spans
     
     def _get_statement_type(self, statement: str) -> str:
         """Determine SQL statement type"""
-        stmt_upper = statement.upper().strip()
-        
-        if stmt_upper.startswith('SELECT'):
-            return 'SELECT'
-        elif stmt_upper.startswith('INSERT'):
-            return 'INSERT'
-        elif stmt_upper.startswith('UPDATE'):
-            return 'UPDATE'
-        elif stmt_upper.startswith('DELETE'):
-            return 'DELETE'
-        elif stmt_upper.startswith('CREATE'):
-            return 'CREATE'
-        elif stmt_upper.startswith('MERGE'):
-            return 'MERGE'
-        elif stmt_upper.startswith('DROP'):
-            return 'DROP'
-        else:
-            return 'OTHER'
+        first_word = re.match(r'\w*', self.LEADING_COMMENTS_PATTERN.sub('', statement)).group(0)
+        
+        return self.STATEMENT_TYPES.get(first_word.upper(), 'OTHER')
+    
+    def _get_target_table(self, references: List[Tuple[str, str]],
+                          stmt_type: str) -> Optional[str]:
+        """
+        Get the table written by a statement
+        
+        Args:
+            references: Table references of the statement, in order
+            stmt_type: Statement type from _get_statement_type
+        
+        Returns:
+            Uppercased table name, or None for statements that write no table
+        """
+        target_kinds = self.TARGET_PATTERNS.get(stmt_type)
+        if not target_kinds:
+            return None
+        
+        for table, kind in references:
+            if kind in target_kinds:
+                return table
+        
+        return None
+    
+    def _get_target_tables(self, references: List[Tuple[str, str]]) -> List[str]:
+        """
+        Get every table written by a statement, wherever it appears
+        
+        Unlike _get_target_table this is not tied to the leading keyword, so
+        the INSERT/UPDATE/MERGE targets inside a procedure body are included.
+        
+        Args:
+            references: Table references of the statement, in order
+        
+        Returns:
+            Uppercased table names in order of first appearance
+        """
+        return list(dict.fromkeys(
+            table for table, kind in references if self.REFERENCE_ROLES[kind] == 'write'
+        ))
+    
+    def _extract_table_references(self, content: str) -> List[Tuple[str, str]]:
+        """
+        Extract table references in one scan over the content
+        
+        Args:
+            content: SQL content
+        
+        Returns:
+            List of (table name, reference kind) in order of appearance; see
+            REFERENCE_ROLES for whether a kind reads or writes the table
+        """
+        # Names match \w+(\.\w+)?, so uppercasing is all the normalization needed
+        return [
+            (sys.intern(match.group(match.lastgroup).upper()), match.lastgroup)
+            for match in self.TABLE_REFERENCE_PATTERN.finditer(content)
+        ]
     
     def _extract_tables(self, content: str) -> List[str]:
         """
@@ -282,23 +1138,9 @@ class TeradataCodeParser:
         Returns:
             List of table names
         """
-        tables = set()
-        
-        # Find all table references
-        for pattern_name, pattern in self.PATTERNS.items():
-            if pattern_name in ['bteq_logon', 'column_definition']:
-                continue
-            
-            for match in pattern.finditer(content):
-                table_name = match.group(1).strip()
-                # Clean up table name
-                table_name = re.sub(r'["\']', '', table_name)
-                if table_name:
-                    tables.add(table_name.upper())
-        
-        return sorted(list(tables))
+        return sorted({table for table, _ in self._extract_table_references(content)})
     
-    def _extract_columns(self, statement: str) -> List[Dict[str, str]]:
+    def _extract_columns(self, statement: str) -> List[Tuple[str, str]]:
         """
         Extract column definitions from SELECT statement
         
@@ -306,7 +1148,7 @@ class TeradataCodeParser:
             statement: SELECT SQL statement
         
         Returns:
-            List of column dictionaries
+            List of (name, expression) tuples
         """
         columns = []
         
@@ -327,10 +1169,7 @@ class TeradataCodeParser:
             col_name = col_match.group(1).strip()
             col_expr = col_match.group(2).strip()
             
-            columns.append({
-                'name': col_name.upper(),
-                'expression': col_expr
-            })
+            columns.append((col_name.upper(), col_expr))
         
         return columns
     
@@ -339,6 +1178,8 @@ class TeradataCodeParser:
         """
         Find files that reference a specific table
         
+        For repeated lookups build a TableIndex once instead.
+        
         Args:
             table_name: Table name to search for
             parsed_files: List of parsed files
@@ -347,10 +1188,9 @@ class TeradataCodeParser:
             List of files referencing the table
         """
         table_upper = table_name.upper()
-        matching_files = []
-        
-        for parsed_file in parsed_files:
-            if table_upper in [t.upper() for t in parsed_file.tables_referenced]:
-                matching_files.append(parsed_file)
         
-        return matching_files
\ No newline at end of file
+        # tables_referenced is already uppercased by _extract_tables
+        return [
+            parsed_file for parsed_file in parsed_files
+            if table_upper in parsed_file.tables_referenced
+        ]
\ No newline at end of file
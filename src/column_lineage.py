@@ -0,0 +1,919 @@
+"""
+Column Lineage
+Builds a column-level lineage graph statically from parsed SQL
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+
+@dataclass
+class ColumnEdge:
+    """One source column feeding a target column through a statement"""
+    __slots__ = ('target_table', 'target_column', 'source_table', 'source_column',
+                 'expression', 'operation', 'file_path', 'statement_id', 'line')
+    target_table: str
+    target_column: str
+    source_table: str
+    source_column: str
+    expression: str  # SQL expression the target column is computed from
+    operation: str  # 'INSERT', 'CREATE', 'UPDATE' or 'MERGE'
+    file_path: str
+    statement_id: int
+    line: int
+    
+    @property
+    def is_transformation(self) -> bool:
+        """Whether the expression does more than copy the source column"""
+        return not re.fullmatch(r'(?:\w+\.){0,2}' + re.escape(self.source_column),
+                                self.expression.strip(), re.IGNORECASE)
+    
+    def to_list(self) -> List:
+        return [getattr(self, field) for field in self.__slots__]
+
+
+class _DeferredStatement(NamedTuple):
+    """Statement text kept until the column list it depends on is known"""
+    statement_id: int
+    start_line: int
+    content: str
+
+
+class ColumnLineageExtractor:
+    """
+    Static column lineage from Teradata DML
+    
+    Handles INSERT ... SELECT (matching columns by position), CREATE TABLE
+    ... AS SELECT (by output name), UPDATE ... SET and MERGE clauses, plus
+    CREATE TABLE column definitions used to expand INSERTs without a column
+    list and SELECT *. Column references are resolved through the FROM/JOIN
+    aliases of each query, including derived tables. Analysis is heuristic:
+    unqualified columns in multi-table queries are attributed to the tables
+    known to have that column, or to every source table if none is known,
+    and the statement is incomplete unless exactly one table matched.
+    Statements using constructs that are not followed (UNION branches after
+    the first, WITH clauses, SELECT * over unknown columns, INSERTs without
+    a column list into tables whose columns are unknown, unresolved
+    aliases) are reported as incomplete, so callers can fall back to other
+    analysis for them; missing_tables names the column lists they lacked.
+    """
+    
+    # Start of a statement that writes columns
+    DML_PATTERN = re.compile(
+        r'\b(?:INSERT\s+INTO|INS\s+INTO|UPDATE|UPD|MERGE\s+INTO'
+        r'|CREATE\s+(?:MULTISET\s+|SET\s+)?(?:VOLATILE\s+|GLOBAL\s+TEMPORARY\s+)?TABLE)\b',
+        re.IGNORECASE
+    )
+    
+    TABLE_NAME = r'(\w+(?:\.\w+)?)'
+    
+    # Keywords ending a FROM clause
+    FROM_END_PATTERN = re.compile(
+        r'\b(?:WHERE|GROUP\s+BY|HAVING|QUALIFY|ORDER\s+BY|UNION|MINUS|EXCEPT'
+        r'|INTERSECT|SAMPLE|WITH\s+DATA|WITH\s+NO\s+DATA)\b',
+        re.IGNORECASE
+    )
+    
+    # Words that are never column names inside expressions
+    KEYWORDS = {
+        'SELECT', 'SEL', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'NULL', 'IS', 'IN',
+        'BETWEEN', 'LIKE', 'AS', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'CAST',
+        'DISTINCT', 'TOP', 'OVER', 'PARTITION', 'BY', 'ORDER', 'ROWS', 'RANGE',
+        'PRECEDING', 'FOLLOWING', 'UNBOUNDED', 'CURRENT', 'ROW', 'ASC', 'DESC',
+        'DATE', 'TIME', 'TIMESTAMP', 'INTERVAL', 'YEAR', 'MONTH', 'DAY', 'HOUR',
+        'MINUTE', 'SECOND', 'INTEGER', 'INT', 'SMALLINT', 'BIGINT', 'BYTEINT',
+        'DECIMAL', 'NUMBER', 'NUMERIC', 'FLOAT', 'REAL', 'DOUBLE', 'PRECISION',
+        'CHAR', 'CHARACTER', 'VARCHAR', 'VARYING', 'CLOB', 'BLOB', 'FORMAT',
+        'TITLE', 'CURRENT_DATE', 'CURRENT_TIME', 'CURRENT_TIMESTAMP', 'TRUE',
+        'FALSE', 'ANY', 'ALL', 'SOME', 'EXISTS', 'TRIM', 'BOTH', 'LEADING',
+        'TRAILING', 'EXTRACT', 'AT', 'LOCAL', 'ZONE', 'USER', 'WITH', 'UNION',
+        'JOIN', 'ON', 'USING', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'FULL', 'CROSS',
+        'GROUP', 'HAVING', 'QUALIFY', 'SET', 'VALUES', 'INTO', 'UPPERCASE',
+        'CASESPECIFIC', 'CS', 'NOT', 'DEFAULT', 'NULLIFZERO', 'ZEROIFNULL'
+    }
+    
+    # Items of a CREATE TABLE column list that are not columns
+    CONSTRAINT_WORDS = {
+        'PRIMARY', 'UNIQUE', 'INDEX', 'CONSTRAINT', 'FOREIGN', 'CHECK',
+        'PARTITION', 'REFERENCES'
+    }
+    
+    # Set operators combining SELECTs, only the first branch is resolved
+    SET_OPERATOR_PATTERN = re.compile(r'\b(?:UNION|MINUS|EXCEPT|INTERSECT)\b', re.IGNORECASE)
+    
+    # Common table expression ahead of a statement
+    WITH_PATTERN = re.compile(r'\bWITH\s+(?:RECURSIVE\s+)?\w+', re.IGNORECASE)
+    
+    COLUMN_REFERENCE_PATTERN = re.compile(
+        r'(?<![\w.])(?:(\w+)\.)?(?:(\w+)\.)?([A-Za-z_]\w*)(?![\w.])(?!\s*\()'
+    )
+    
+    def __init__(self, table_columns: Optional[Dict[str, List[str]]] = None):
+        """
+        Initialize extractor
+        
+        Args:
+            table_columns: Known column order per table, e.g. from CREATE
+                TABLE definitions in other files; updated as definitions
+                are found
+        """
+        self.table_columns = table_columns if table_columns is not None else {}
+        # Whether the statement being extracted was fully resolved
+        self._complete = True
+        # Tables whose column lists the last statement needed but were unknown,
+        # and tables whose column lists it defined or changed
+        self.missing_tables: Set[str] = set()
+        self.defined_tables: Set[str] = set()
+    
+    def extract(self, statement, file_path: str) -> Tuple[List[ColumnEdge], bool]:
+        """
+        Extract column edges from a parsed statement
+        
+        Statement bodies such as stored procedures are searched for every
+        writing statement they contain.
+        
+        Args:
+            statement: SQLStatement object
+            file_path: Repository-relative file path of the statement
+        
+        Returns:
+            Tuple of (ColumnEdge objects, whether the statement contains
+            writing statements and all of them were fully resolved)
+        """
+        text = statement.content
+        masked = _mask(text, parens=False)
+        edges = []
+        self._complete = True
+        self.missing_tables = set()
+        self.defined_tables = set()
+        found = False
+        
+        # Semicolons outside strings and comments separate nested statements
+        piece_start = 0
+        for piece_end in [m.start() for m in re.finditer(';', masked)] + [len(text)]:
+            match = self.DML_PATTERN.search(masked, piece_start, piece_end)
+            if match:
+                found = True
+                if self.WITH_PATTERN.search(masked, piece_start, match.start()):
+                    self._complete = False
+                line = statement.start_line + text.count('\n', 0, match.start())
+                context = (file_path, statement.statement_id, line)
+                edges.extend(self._extract_piece(text[match.start():piece_end], context))
+            piece_start = piece_end + 1
+        
+        return edges, found and self._complete
+    
+    def _extract_piece(self, sql: str, context: Tuple[str, int, int]) -> List[ColumnEdge]:
+        """Dispatch one writing statement on its leading keyword"""
+        keyword = sql.split(None, 1)[0].upper()
+        
+        if keyword in ('INSERT', 'INS'):
+            return self._extract_insert(sql, context)
+        if keyword in ('UPDATE', 'UPD'):
+            return self._extract_update(sql, context)
+        if keyword == 'MERGE':
+            return self._extract_merge(sql, context)
+        return self._extract_create(sql, context)
+    
+    def _extract_insert(self, sql: str, context) -> List[ColumnEdge]:
+        """INSERT INTO t [(cols)] SELECT ... - columns matched by position"""
+        masked = _mask(sql)
+        match = re.match(r'\s*INS(?:ERT)?\s+INTO\s+' + self.TABLE_NAME + r'\s*', masked, re.IGNORECASE)
+        if not match:
+            self._complete = False
+            return []
+        
+        target = match.group(1).upper()
+        rest = match.end()
+        
+        columns = None
+        if masked[rest:rest + 1] == '(' and not re.match(r'\(\s*SEL', sql[rest:], re.IGNORECASE):
+            close = _closing_paren(sql, rest)
+            columns = [c.strip().upper() for c in _split_top_level(sql[rest + 1:close])]
+            rest = close + 1
+        
+        query = sql[rest:]
+        if not re.match(r'[\s(]*SEL(?:ECT)?\b', _mask(query, parens=False), re.IGNORECASE):
+            # VALUES has constants only; anything else is not followed
+            if not re.match(r'\s*VALUES\b', query, re.IGNORECASE):
+                self._complete = False
+            return []
+        
+        outputs = self._select_outputs(_unwrap(query))
+        if columns is None:
+            columns = self.table_columns.get(target)
+        if columns is None:
+            # Guess by output name until the target's CREATE TABLE is seen
+            self._missing(target)
+            columns = [name for name, _, _ in outputs]
+        if len(columns) != len(outputs) or not all(columns):
+            self._complete = False
+        
+        return self._edges(target, zip(columns, outputs), 'INSERT', context)
+    
+    def _extract_create(self, sql: str, context) -> List[ColumnEdge]:
+        """CREATE TABLE t (defs) records columns; CREATE TABLE t AS SELECT maps by name"""
+        masked = _mask(sql)
+        match = re.match(
+            r'\s*CREATE\s+(?:MULTISET\s+|SET\s+)?(?:VOLATILE\s+|GLOBAL\s+TEMPORARY\s+)?TABLE\s+'
+            + self.TABLE_NAME, masked, re.IGNORECASE
+        )
+        if not match:
+            self._complete = False
+            return []
+        
+        target = match.group(1).upper()
+        
+        as_match = re.compile(r'\bAS\b', re.IGNORECASE).search(masked, match.end())
+        if not as_match:
+            # Column definitions: first word of each item in the first (...)
+            open_paren = masked.find('(', match.end())
+            if open_paren >= 0:
+                close = _closing_paren(sql, open_paren)
+                columns = []
+                for item in _split_top_level(sql[open_paren + 1:close]):
+                    words = item.split()
+                    if words and words[0].upper() not in self.CONSTRAINT_WORDS:
+                        columns.append(words[0].strip('"').upper())
+                if columns:
+                    self._define(target, columns)
+            return []
+        
+        query = sql[as_match.end():]
+        masked_query = _mask(query, parens=False)
+        
+        copy = re.match(r'\s*' + self.TABLE_NAME + r'\s+WITH\s+(NO\s+)?DATA\b', masked_query, re.IGNORECASE)
+        if copy:
+            # CREATE TABLE t AS src WITH [NO] DATA copies the column list,
+            # and the rows unless NO DATA
+            source = copy.group(1).upper()
+            columns = self.table_columns.get(source, [])
+            if columns:
+                self._define(target, list(columns))
+            else:
+                self._missing(source)
+            if copy.group(2):
+                return []
+            outputs = [(column, column, [(source, column)]) for column in columns]
+        elif re.match(r'[\s(]*SEL(?:ECT)?\b', masked_query, re.IGNORECASE):
+            outputs = self._select_outputs(_unwrap(query))
+            self._define(target, [name for name, _, _ in outputs if name])
+            if re.search(r'\bWITH\s+NO\s+DATA\b', _mask(query), re.IGNORECASE):
+                # Only the column list is taken from the query
+                return []
+        else:
+            self._complete = False
+            return []
+        
+        return self._edges(target, [(output[0], output) for output in outputs], 'CREATE', context)
+    
+    def _extract_update(self, sql: str, context) -> List[ColumnEdge]:
+        """UPDATE t [alias] [FROM ...] SET col = expr, ..."""
+        masked = _mask(sql)
+        match = re.match(r'\s*UPD(?:ATE)?\s+' + self.TABLE_NAME
+                         + r'(?:\s+(?:AS\s+)?(?!(?:FROM|SET)\b)(\w+))?',
+                         masked, re.IGNORECASE)
+        set_match = re.compile(r'\bSET\b', re.IGNORECASE).search(masked)
+        if not match or not set_match:
+            self._complete = False
+            return []
+        
+        target = match.group(1).upper()
+        aliases = {}
+        
+        if match.group(2):
+            aliases[match.group(2).upper()] = target
+        
+        from_match = re.compile(r'\bFROM\b', re.IGNORECASE).search(masked, match.end(), set_match.start())
+        derived = {}
+        if from_match:
+            aliases.update(self._from_aliases(sql[from_match.end():set_match.start()], derived))
+        
+        # Teradata allows UPDATE alias FROM table alias, ...
+        target = aliases.get(target, target)
+        aliases.setdefault(target, target)
+        aliases.setdefault(target.split('.')[-1], target)
+        
+        set_clause = sql[set_match.end():]
+        end = re.compile(r'\b(?:WHERE|ELSE)\b', re.IGNORECASE).search(_mask(set_clause))
+        if end:
+            set_clause = set_clause[:end.start()]
+        
+        return self._edges(target, self._assignments(set_clause, aliases, derived), 'UPDATE', context)
+    
+    def _extract_merge(self, sql: str, context) -> List[ColumnEdge]:
+        """MERGE INTO t USING src ON ... WHEN MATCHED / NOT MATCHED ..."""
+        masked = _mask(sql)
+        match = re.match(r'\s*MERGE\s+INTO\s+' + self.TABLE_NAME
+                         + r'(?:\s+(?:AS\s+)?(?!USING\b)(\w+))?',
+                         masked, re.IGNORECASE)
+        using = re.compile(r'\bUSING\b', re.IGNORECASE).search(masked)
+        on = re.compile(r'\bON\b', re.IGNORECASE).search(masked, using.end()) if using else None
+        if not match or not on:
+            self._complete = False
+            return []
+        
+        target = match.group(1).upper()
+        aliases = {target: target, target.split('.')[-1]: target}
+        if match.group(2):
+            aliases[match.group(2).upper()] = target
+        derived = {}
+        aliases.update(self._from_aliases(sql[using.end():on.start()], derived))
+        
+        pairs = []
+        
+        update = re.compile(r'\bUPDATE\s+SET\b', re.IGNORECASE).search(masked, on.end())
+        if update:
+            end = re.compile(r'\bWHEN\b', re.IGNORECASE).search(masked, update.end())
+            pairs.extend(self._assignments(sql[update.end():end.start() if end else len(sql)],
+                                           aliases, derived))
+        
+        insert = re.compile(r'\bINSERT\b\s*(\([^)]*\))?\s*VALUES\s*\(', re.IGNORECASE).search(masked, on.end())
+        if insert:
+            if insert.group(1):
+                columns = [c.strip().upper() for c in _split_top_level(sql[insert.start(1) + 1:insert.end(1) - 1])]
+            else:
+                columns = self.table_columns.get(target, [])
+                if not columns:
+                    self._missing(target)
+            close = _closing_paren(sql, insert.end() - 1)
+            values = _split_top_level(sql[insert.end():close])
+            for column, value in zip(columns, values):
+                column = column.split('.')[-1]
+                pairs.append((column, (column, value.strip(), self._references(value, aliases, derived))))
+        
+        return self._edges(target, pairs, 'MERGE', context)
+    
+    def _select_outputs(self, query: str, depth: int = 0) -> List[Tuple[Optional[str], str, List[Tuple[str, str]]]]:
+        """
+        Resolve the output columns of a SELECT
+        
+        Args:
+            query: SELECT statement text
+            depth: Derived table nesting depth
+        
+        Returns:
+            List of (output name or None, expression, [(table, column)])
+        """
+        masked = _mask(query)
+        select = re.match(r'\s*SEL(?:ECT)?\b', masked, re.IGNORECASE)
+        from_match = re.compile(r'\bFROM\b', re.IGNORECASE).search(masked)
+        if not select:
+            self._complete = False
+            return []
+        if self.SET_OPERATOR_PATTERN.search(masked):
+            self._complete = False
+        
+        select_list = query[select.end():from_match.start() if from_match else len(query)]
+        select_list = re.sub(r'^\s*(?:DISTINCT|ALL)\b|^\s*TOP\s+\d+(?:\s+PERCENT)?(?:\s+WITH\s+TIES)?',
+                             '', select_list, flags=re.IGNORECASE)
+        
+        aliases = {}
+        derived = {}
+        if from_match:
+            from_end = self.FROM_END_PATTERN.search(masked, from_match.end())
+            from_clause = query[from_match.end():from_end.start() if from_end else len(query)]
+            aliases = self._from_aliases(from_clause, derived, depth)
+        
+        outputs = []
+        for item in _split_top_level(select_list):
+            name, expression = self._split_alias(item)
+            
+            if expression.strip() == '*' or expression.strip().endswith('.*'):
+                qualifier = expression.strip()[:-1].rstrip('.').upper()
+                for table in ([aliases.get(qualifier, qualifier)] if qualifier else _unique(aliases.values())):
+                    columns = self._columns_of(table, derived)
+                    if not columns:
+                        self._complete = False
+                        if table not in derived:
+                            self._missing(table)
+                    for column in columns:
+                        outputs.append((column, column, self._resolve(table, column, derived)))
+                continue
+            
+            outputs.append((name, expression.strip(), self._references(expression, aliases, derived)))
+        
+        return outputs
+    
+    def _from_aliases(self, from_clause: str, derived: Optional[Dict] = None,
+                      depth: int = 0) -> Dict[str, str]:
+        """
+        Map the aliases and names of FROM/JOIN sources to tables
+        
+        Derived tables map to a pseudo table name whose columns are recorded
+        in derived, so references through them resolve to base tables.
+        """
+        aliases = {}
+        masked = _mask(from_clause)
+        
+        # Sources follow FROM, a comma or JOIN; ON conditions are skipped.
+        # A source without an alias must not take the next keyword as one.
+        pattern = re.compile(
+            r'(?:^|,|\bJOIN\b|\bUSING\b)\s*(?:' + self.TABLE_NAME + r'|(\())\s*'
+            r'(?:\)\s*)?(?:AS\s+)?'
+            r'(?!(?:JOIN|INNER|LEFT|RIGHT|FULL|CROSS|ON|WHERE|USING)\b)(\w+)?',
+            re.IGNORECASE
+        )
+        for match in pattern.finditer(masked):
+            alias = match.group(3)
+            if alias and alias.upper() in self.KEYWORDS:
+                alias = None
+            
+            if match.group(1):
+                table = match.group(1).upper()
+                aliases[table] = table
+                aliases.setdefault(table.split('.')[-1], table)
+                if alias:
+                    aliases[alias.upper()] = table
+            elif derived is None or depth >= 5:
+                self._complete = False
+            else:
+                close = _closing_paren(from_clause, match.start(2))
+                subquery = from_clause[match.start(2) + 1:close]
+                after = re.match(r'\s*(?:AS\s+)?(\w+)', masked[close + 1:], re.IGNORECASE)
+                if after and after.group(1).upper() not in self.KEYWORDS:
+                    pseudo = f"({after.group(1).upper()})"
+                    derived[pseudo] = {
+                        name.upper(): references
+                        for name, _, references in self._select_outputs(subquery, depth + 1)
+                        if name
+                    }
+                    aliases[after.group(1).upper()] = pseudo
+        
+        return aliases
+    
+    def _assignments(self, set_clause: str, aliases: Dict[str, str], derived: Dict):
+        """Parse col = expr, ... into (column, (column, expr, references)) pairs"""
+        pairs = []
+        
+        for item in _split_top_level(set_clause):
+            if '=' not in item:
+                continue
+            column, expression = item.split('=', 1)
+            column = column.strip().split('.')[-1].upper()
+            pairs.append((column, (column, expression.strip(),
+                                   self._references(expression, aliases, derived))))
+        
+        return pairs
+    
+    def _split_alias(self, item: str) -> Tuple[Optional[str], str]:
+        """Split a select item into (output name, expression)"""
+        masked = _mask(item)
+        
+        # Trailing [AS] name after something that can end an expression
+        match = re.search(r'(?:\s+(AS))?\s+("\s*"|\w+)\s*$', masked, re.IGNORECASE)
+        if match:
+            name = item[match.start(2):match.end(2)].strip('"').upper()
+            expression = item[:match.start()]
+            ends_expression = re.search(r'[\w)\'"]\s*$', masked[:match.start()])
+            if name and name not in self.KEYWORDS and (match.group(1) or ends_expression):
+                return name, expression
+        
+        bare = re.fullmatch(r'\s*(?:\w+\.){0,2}"?(\w+)"?\s*', item)
+        return (bare.group(1).upper() if bare else None), item
+    
+    def _references(self, expression: str, aliases: Dict[str, str],
+                    derived: Optional[Dict] = None) -> List[Tuple[str, str]]:
+        """Resolve the column references of an expression to (table, column)"""
+        masked = _mask(expression, parens=False)
+        # Blank out string literals entirely, the mask keeps their quotes
+        masked = re.sub(r"'[^']*'", lambda m: ' ' * len(m.group(0)), masked)
+        
+        references = []
+        tables = _unique(aliases.values())
+        
+        for match in self.COLUMN_REFERENCE_PATTERN.finditer(masked):
+            first, second, column = match.groups()
+            column = column.upper()
+            if column in self.KEYWORDS and not (first or second):
+                continue
+            
+            if second:
+                table = f"{first}.{second}".upper()
+            elif first:
+                table = aliases.get(first.upper())
+                if table is None:
+                    self._complete = False
+                    continue
+            else:
+                known = [t for t in tables if column in self._columns_of(t, derived or {})]
+                candidates = known or tables
+                if len(candidates) != 1:
+                    # Missing, or spread over several tables as a guess
+                    self._complete = False
+                if not candidates:
+                    continue
+                for table in candidates:
+                    references.extend(self._resolve(table, column, derived or {}))
+                continue
+            
+            references.extend(self._resolve(table, column, derived or {}))
+        
+        return _unique(references)
+    
+    def _resolve(self, table: str, column: str, derived: Dict) -> List[Tuple[str, str]]:
+        """Follow derived tables down to base table columns"""
+        if table in derived:
+            return derived[table].get(column, [])
+        return [(table, column)]
+    
+    def _columns_of(self, table: str, derived: Dict) -> List[str]:
+        """Known columns of a table or derived table"""
+        if table in derived:
+            return list(derived[table])
+        return self.table_columns.get(table, [])
+    
+    def _define(self, table: str, columns: List[str]) -> None:
+        """Record the column order of a table"""
+        if self.table_columns.get(table) != columns:
+            self.table_columns[table] = columns
+            self.defined_tables.add(table)
+    
+    def _missing(self, table: str) -> None:
+        """Note that the statement depends on a table's unknown column list"""
+        self._complete = False
+        self.missing_tables.add(table)
+    
+    def _edges(self, target: str, pairs, operation: str, context) -> List[ColumnEdge]:
+        """Build edges from (target column, (name, expression, references)) pairs"""
+        file_path, statement_id, line = context
+        edges = []
+        seen = set()
+        
+        for column, (_, expression, references) in pairs:
+            if not column:
+                continue
+            column = column.strip('"').upper()
+            expression = ' '.join(expression.split())[:500]
+            for source_table, source_column in references:
+                key = (column, source_table, source_column, expression)
+                if (source_table, source_column) == (target, column) or key in seen:
+                    continue
+                seen.add(key)
+                edges.append(ColumnEdge(
+                    target_table=target,
+                    target_column=column,
+                    source_table=source_table,
+                    source_column=source_column,
+                    expression=expression,
+                    operation=operation,
+                    file_path=file_path,
+                    statement_id=statement_id,
+                    line=line
+                ))
+        
+        return edges
+
+
+class ColumnLineageGraph:
+    """
+    Directed graph of table.column nodes, edges pointing upstream
+    
+    Statements that need a table's column list before its CREATE TABLE has
+    been added (e.g. an INSERT without a column list whose DDL is in a file
+    parsed later) are kept and extracted again once the definition arrives.
+    """
+    
+    def __init__(self):
+        # (table, column) -> edges producing it
+        self._upstream: Dict[Tuple[str, str], List[ColumnEdge]] = {}
+        # file_path -> edges from its statements, for removal
+        self._files: Dict[str, List[ColumnEdge]] = {}
+        # file_path -> ids of statements whose writes were fully resolved
+        self._resolved: Dict[str, Set[int]] = {}
+        # table -> column order from CREATE TABLE definitions
+        self.table_columns: Dict[str, List[str]] = {}
+        # table -> statements waiting for its column list, by (file_path, statement_id)
+        self._deferred: Dict[str, Dict[Tuple[str, int], _DeferredStatement]] = {}
+        # file_path -> tables its statements wait for, for removal
+        self._deferred_files: Dict[str, Set[str]] = {}
+        self._extractor = ColumnLineageExtractor(self.table_columns)
+    
+    def __len__(self) -> int:
+        return sum(len(edges) for edges in self._files.values())
+    
+    def add_file(self, parsed_file) -> None:
+        """
+        Add (or replace) the column edges of a parsed file
+        
+        Args:
+            parsed_file: ParsedFile object
+        """
+        self.remove_file(parsed_file.file_path)
+        
+        defined = set()
+        for stmt in parsed_file.sql_statements:
+            defined.update(self._add_statement(parsed_file.file_path, stmt))
+        
+        self._resolve_deferred(defined)
+    
+    def remove_file(self, file_path: str) -> None:
+        """
+        Drop the column edges of a file
+        
+        Args:
+            file_path: Repository-relative file path
+        """
+        self._resolved.pop(file_path, None)
+        for edge in self._files.pop(file_path, []):
+            self._unlink(edge)
+        
+        for table in self._deferred_files.pop(file_path, ()):
+            waiting = self._deferred.get(table, {})
+            for key in [key for key in waiting if key[0] == file_path]:
+                del waiting[key]
+            if not waiting:
+                self._deferred.pop(table, None)
+    
+    def _add_statement(self, file_path: str, statement) -> Set[str]:
+        """
+        Extract and link the edges of one statement
+        
+        Args:
+            file_path: Repository-relative file path
+            statement: SQLStatement (or _DeferredStatement)
+        
+        Returns:
+            Tables whose column lists the statement defined or changed
+        """
+        edges, complete = self._extractor.extract(statement, file_path)
+        
+        for edge in edges:
+            self._upstream.setdefault((edge.target_table, edge.target_column), []).append(edge)
+        if edges:
+            self._files.setdefault(file_path, []).extend(edges)
+        if complete:
+            self._resolved.setdefault(file_path, set()).add(statement.statement_id)
+        
+        deferred = _DeferredStatement(statement.statement_id, statement.start_line, statement.content)
+        for table in self._extractor.missing_tables:
+            self._deferred.setdefault(table, {})[(file_path, statement.statement_id)] = deferred
+            self._deferred_files.setdefault(file_path, set()).add(table)
+        
+        return set(self._extractor.defined_tables)
+    
+    def _resolve_deferred(self, defined: Set[str]) -> None:
+        """Extract again the statements waiting for newly defined tables"""
+        queue = list(defined)
+        while queue:
+            waiting = self._deferred.pop(queue.pop(), {})
+            for (file_path, statement_id), statement in waiting.items():
+                self._remove_statement(file_path, statement_id)
+                queue.extend(self._add_statement(file_path, statement))
+    
+    def _remove_statement(self, file_path: str, statement_id: int) -> None:
+        """Drop the edges, resolution and waits of one statement"""
+        self._resolved.get(file_path, set()).discard(statement_id)
+        
+        kept = []
+        for edge in self._files.get(file_path, []):
+            if edge.statement_id == statement_id:
+                self._unlink(edge)
+            else:
+                kept.append(edge)
+        if kept:
+            self._files[file_path] = kept
+        else:
+            self._files.pop(file_path, None)
+        
+        for table in self._deferred_files.get(file_path, ()):
+            self._deferred.get(table, {}).pop((file_path, statement_id), None)
+    
+    def _unlink(self, edge: ColumnEdge) -> None:
+        """Remove an edge from the upstream map"""
+        node = (edge.target_table, edge.target_column)
+        edges = self._upstream.get(node)
+        if edges is not None:
+            edges.remove(edge)
+            if not edges:
+                del self._upstream[node]
+    
+    def upstream(self, table: str, column: str) -> List[ColumnEdge]:
+        """
+        Get the edges producing a column
+        
+        Args:
+            table: Qualified table name
+            column: Column name
+        
+        Returns:
+            List of ColumnEdge objects
+        """
+        return self._upstream.get((table.upper(), column.upper()), [])
+    
+    def is_complete(self, table: str, column: str, writers: List[Tuple[str, int]]) -> bool:
+        """
+        Whether the edges of a column account for every statement writing it
+        
+        Args:
+            table: Qualified table name
+            column: Column name
+            writers: (file_path, statement_id) of the statements writing the
+                table, e.g. from TableIndex.writers_for_table
+        
+        Returns:
+            True if the column has edges and every writing statement, and
+            every statement its edges come from, was fully resolved
+        """
+        edges = self.upstream(table, column)
+        statements = set(writers) | {(edge.file_path, edge.statement_id) for edge in edges}
+        
+        return bool(edges) and all(
+            statement_id in self._resolved.get(file_path, ()) for file_path, statement_id in statements
+        )
+    
+    def is_source(self, table: str, column: str, writers: List[Tuple[str, int]]) -> bool:
+        """
+        Whether no code produces a column, e.g. its table is only created
+        
+        Args:
+            table: Qualified table name
+            column: Column name
+            writers: (file_path, statement_id) of the statements writing the
+                table, e.g. from TableIndex.writers_for_table
+        
+        Returns:
+            True if the column has no edges and every writing statement was
+            fully resolved, so none of them fills it
+        """
+        return not self.upstream(table, column) and all(
+            statement_id in self._resolved.get(file_path, ()) for file_path, statement_id in writers
+        )
+    
+    def lineage(self, table: str, column: str, max_depth: int = 5) -> List[List[ColumnEdge]]:
+        """
+        Walk upstream breadth-first from a column
+        
+        Args:
+            table: Qualified table name
+            column: Column name
+            max_depth: Maximum number of hops
+        
+        Returns:
+            Edges reached at each hop, nearest first; each column is
+            expanded once
+        """
+        levels = []
+        frontier = [(table.upper(), column.upper())]
+        visited = set(frontier)
+        
+        for _ in range(max_depth):
+            edges = [edge for node in frontier for edge in self._upstream.get(node, [])]
+            if not edges:
+                break
+            levels.append(edges)
+            
+            frontier = []
+            for edge in edges:
+                node = (edge.source_table, edge.source_column)
+                if node not in visited:
+                    visited.add(node)
+                    frontier.append(node)
+        
+        return levels
+    
+    def to_dict(self) -> Dict:
+        """Serialize to a JSON-compatible dictionary"""
+        return {
+            'fields': list(ColumnEdge.__slots__),
+            'edges': [edge.to_list() for edges in self._files.values() for edge in edges],
+            'resolved': {file_path: sorted(ids) for file_path, ids in self._resolved.items()},
+            'table_columns': self.table_columns,
+            'deferred': [
+                [table, file_path, statement.statement_id, statement.start_line, statement.content]
+                for table, waiting in self._deferred.items()
+                for (file_path, _), statement in waiting.items()
+            ]
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ColumnLineageGraph':
+        """Rebuild a graph serialized with to_dict"""
+        graph = cls()
+        graph.table_columns.update(data.get('table_columns', {}))
+        graph._resolved = {file_path: set(ids) for file_path, ids in data.get('resolved', {}).items()}
+        
+        fields = data.get('fields', list(ColumnEdge.__slots__))
+        for values in data.get('edges', []):
+            edge = ColumnEdge(**dict(zip(fields, values)))
+            graph._files.setdefault(edge.file_path, []).append(edge)
+            graph._upstream.setdefault((edge.target_table, edge.target_column), []).append(edge)
+        
+        for table, file_path, statement_id, start_line, content in data.get('deferred', []):
+            deferred = _DeferredStatement(statement_id, start_line, content)
+            graph._deferred.setdefault(table, {})[(file_path, statement_id)] = deferred
+            graph._deferred_files.setdefault(file_path, set()).add(table)
+        
+        return graph
+
+
+def _mask(text: str, parens: bool = True) -> str:
+    """
+    Blank out comments, string contents and (optionally) parenthesized text
+    
+    The result has the same length as text, so offsets found in it apply
+    to text; quotes and the outermost parentheses are kept.
+    """
+    chars = list(text)
+    depth = 0
+    i = 0
+    n = len(text)
+    
+    while i < n:
+        char = text[i]
+        if char == "'" or char == '"':
+            end = i + 1
+            while end < n:
+                if text[end] == char:
+                    if end + 1 < n and text[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            for j in range(i + 1, min(end, n)):
+                chars[j] = ' '
+            i = end + 1
+            continue
+        if text.startswith('--', i):
+            end = text.find('\n', i)
+            end = n if end < 0 else end
+            for j in range(i, end):
+                chars[j] = ' '
+            i = end
+            continue
+        if text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            for j in range(i, end):
+                chars[j] = ' '
+            i = end
+            continue
+        if parens:
+            if char == '(':
+                depth += 1
+                if depth > 1:
+                    chars[i] = ' '
+                i += 1
+                continue
+            if char == ')':
+                depth -= 1
+                if depth > 0:
+                    chars[i] = ' '
+                i += 1
+                continue
+            if depth > 0:
+                chars[i] = ' '
+        i += 1
+    
+    return ''.join(chars)
+
+
+def _closing_paren(text: str, open_index: int) -> int:
+    """Index of the parenthesis closing the one at open_index (len(text) if none)"""
+    masked = _mask(text, parens=False)
+    depth = 0
+    
+    for i in range(open_index, len(masked)):
+        if masked[i] == '(':
+            depth += 1
+        elif masked[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    
+    return len(text)
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas outside parentheses, strings and comments"""
+    masked = _mask(text, parens=False)
+    parts = []
+    depth = 0
+    start = 0
+    
+    for i, char in enumerate(masked):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    
+    return [part for part in parts if part.strip()]
+
+
+def _unwrap(query: str) -> str:
+    """Strip parentheses wrapping a whole query"""
+    query = query.strip()
+    while query.startswith('('):
+        close = _closing_paren(query, 0)
+        query = query[1:close].strip()
+    return query
+
+
+def _unique(values) -> List:
+    """Deduplicate keeping first-seen order"""
+    return list(dict.fromkeys(values))
@@ -7,7 +7,7 @@ import os
 import shutil
 import subprocess
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 import tempfile
 
 
@@ -28,6 +28,9 @@ class GitHubIngestion:
         self.token = token
         self.local_path = None
         
+        # Commit checked out before the last pull, if the clone already existed
+        self.previous_sha = None
+        
         # Create workspace directory
         self.workspace = Path(tempfile.gettempdir()) / "teradata_lineage_workspace"
         self.workspace.mkdir(exist_ok=True)
@@ -63,6 +66,7 @@ class GitHubIngestion:
         try:
             if self.local_path.exists():
                 print(f"Repository exists, pulling latest changes...")
+                self.previous_sha = self.get_commit_sha()
                 self._pull_changes()
             else:
                 print(f"Cloning repository...")
@@ -120,6 +124,64 @@ class GitHubIngestion:
         finally:
             os.chdir(original_dir)
     
+    def get_commit_sha(self) -> str:
+        """
+        Get the commit SHA currently checked out
+        
+        Returns:
+            Full commit SHA of HEAD
+        """
+        if not self.local_path or not self.local_path.exists():
+            raise Exception("Repository not cloned yet")
+        
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=self.local_path,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        
+        return result.stdout.strip()
+    
+    def get_changed_files(self, since_sha: str) -> Dict[str, List[str]]:
+        """
+        List files changed between a commit and HEAD
+        
+        Renames are reported as a deletion plus an addition.
+        
+        Args:
+            since_sha: Commit SHA to diff against
+        
+        Returns:
+            Dictionary with 'changed' (added or modified) and 'deleted'
+            repository-relative paths
+        """
+        if not self.local_path or not self.local_path.exists():
+            raise Exception("Repository not cloned yet")
+        
+        result = subprocess.run(
+            ["git", "diff", "--name-status", "--no-renames", since_sha, "HEAD"],
+            cwd=self.local_path,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        
+        changes = {'changed': [], 'deleted': []}
+        
+        for line in result.stdout.splitlines():
+            if not line.strip():
+                continue
+            
+            status, path = line.split('\t', 1)
+            if status.startswith('D'):
+                changes['deleted'].append(path)
+            else:
+                changes['changed'].append(path)
+        
+        return changes
+    
     def get_file_list(self, extensions: Optional[list] = None) -> list:
         """
         Get list of files in repository
@@ -3,28 +3,177 @@ Lineage Analyzer
 Uses RAG and LLM to analyze column lineage
 """
 
+import copy
+import hashlib
 import json
 import re
-from typing import Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+class LineageCache:
+    """
+    Persistent cache of lineage results
+    
+    Results are keyed by target table and column, max_depth, LLM model and
+    the commit SHA of the index they were computed from, so re-indexing a
+    repository never serves stale lineage. Entries expire ttl seconds after
+    they were computed and the least recently used are evicted beyond
+    max_entries. One writer per cache file.
+    """
+    
+    def __init__(self, cache_path: Path, max_entries: int = 1000,
+                 ttl: Optional[float] = 7 * 24 * 3600):
+        """
+        Initialize cache
+        
+        Args:
+            cache_path: JSON file holding cached results
+            max_entries: Maximum number of results kept
+            ttl: Seconds a result stays valid, None for no expiry
+        """
+        self.cache_path = Path(cache_path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        
+        # key -> {'created': timestamp, 'result': lineage result}, least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        
+        if self.cache_path.exists():
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    self._entries = OrderedDict(json.load(f))
+            except (OSError, ValueError):
+                print(f"Ignoring unreadable lineage cache at {self.cache_path}")
+            self._evict()
+    
+    @staticmethod
+    def key(table: str, column: str, max_depth: int, model_id: str, commit_sha: str,
+            options: Optional[Dict] = None) -> str:
+        """
+        Build the cache key of a lineage query
+        
+        Args:
+            table: Resolved target table name
+            column: Target column name
+            max_depth: Maximum depth traced
+            model_id: LLM model identifier
+            commit_sha: Commit SHA the index was built from
+            options: Analyzer settings that change the result
+        
+        Returns:
+            Key string
+        """
+        fields = [table.upper(), column.upper(), max_depth, model_id, commit_sha, options or {}]
+        return hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cached result
+        
+        Args:
+            key: Key from key()
+        
+        Returns:
+            Copy of the cached result, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                entry = None
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry['result'])
+    
+    def put(self, key: str, result: Dict) -> None:
+        """
+        Store a result and write the cache to disk
+        
+        Args:
+            key: Key from key()
+            result: Lineage result, JSON-serializable
+        """
+        with self._lock:
+            self._entries[key] = {'created': time.time(), 'result': copy.deepcopy(result)}
+            self._entries.move_to_end(key)
+            self._evict()
+            self.flush()
+    
+    def flush(self) -> None:
+        """Write the cached results to disk"""
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Replace atomically so readers never see a partial file
+        tmp_path = self.cache_path.with_name(self.cache_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self._entries.items()), f)
+        tmp_path.replace(self.cache_path)
+    
+    def _expired(self, entry: Dict) -> bool:
+        return self.ttl is not None and time.time() - entry['created'] > self.ttl
+    
+    def _evict(self) -> None:
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        for key in [key for key, entry in self._entries.items() if self._expired(entry)]:
+            del self._entries[key]
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
 
 
 class LineageAnalyzer:
     """Analyze column lineage using RAG and LLM"""
     
-    def __init__(self, rag_pipeline):
+    # Transformation type of a statically resolved expression, first match wins
+    TRANSFORMATION_TYPES = [
+        ('aggregation', re.compile(r'\b(?:SUM|COUNT|AVG|MIN|MAX)\s*\(', re.IGNORECASE)),
+        ('conditional', re.compile(r'\bCASE\b', re.IGNORECASE)),
+        ('function', re.compile(r'\w\s*\(')),
+    ]
+    
+    def __init__(self, rag_pipeline, structural_retrieval: bool = True,
+                 static_lineage: bool = True, result_cache: Optional[LineageCache] = None):
         """
         Initialize analyzer
         
         Args:
             rag_pipeline: LineageRAGPipeline instance
+            structural_retrieval: Look up statements writing the table in the
+                table index before falling back to vector search
+            static_lineage: Answer from the statically resolved column
+                lineage graph when it covers the column, without the LLM
+            result_cache: Cache of lineage results, used when the index
+                was built from a known commit
         """
         self.rag = rag_pipeline
+        self.structural_retrieval = structural_retrieval
+        self.static_lineage = static_lineage
+        self.result_cache = result_cache
     
     def analyze_column_lineage(self, table_name: str, column_name: str, 
                               max_depth: int = 5) -> Optional[Dict]:
         """
         Analyze lineage for a specific column
         
+        Upstream columns are traced level by level, up to max_depth hops.
+        Columns covered by the static column graph are resolved without
+        the LLM; the rest of each level is answered by one LLM call over
+        the statements writing their tables. Each table.column is traced
+        once, so a chain costs at most max_depth LLM calls. Results are
+        served from result_cache when the same query ran on the same commit.
+        
         Args:
             table_name: Target table name
             column_name: Target column name
@@ -35,83 +184,310 @@ class LineageAnalyzer:
         """
         print(f"Analyzing lineage for {table_name}.{column_name}")
         
-        # Step 1: Find relevant code
-        relevant_chunks = self._find_relevant_code(table_name, column_name)
+        target = (self._resolve_table(table_name), column_name.upper())
+        
+        cache_key = None
+        if self.result_cache is not None and self.rag.commit_sha:
+            cache_key = LineageCache.key(
+                *target, max_depth, self.rag.model_id, self.rag.commit_sha,
+                {'structural_retrieval': self.structural_retrieval,
+                 'static_lineage': self.static_lineage}
+            )
+            lineage_result = self.result_cache.get(cache_key)
+            if lineage_result is not None:
+                print("Returning cached lineage result")
+                return lineage_result
         
-        if not relevant_chunks:
-            print("No relevant code found")
-            return None
+        lineage_result = self._trace_lineage(target, table_name, column_name, max_depth)
         
-        print(f"Found {len(relevant_chunks)} relevant code chunks")
+        # Unparsed or failed LLM answers may be transient, so are not kept
+        if (cache_key is not None and lineage_result and 'raw_response' not in lineage_result
+                and not lineage_result.get('incomplete')):
+            self.result_cache.put(cache_key, lineage_result)
+        
+        return lineage_result
+    
+    def _trace_lineage(self, target: Tuple[str, str], table_name: str, column_name: str,
+                       max_depth: int) -> Optional[Dict]:
+        """Trace upstream from the resolved target (table, column) node"""
+        frontier = [target]
+        visited = {target}
+        
+        lineage_chain = []
+        sources = {}
+        transformations = {}
+        llm_calls = 0
+        # Columns whose LLM answer failed or could not be parsed
+        untraced = []
+        
+        for depth in range(max_depth + 1):
+            if not frontier:
+                break
+            
+            # Hops are only traced within max_depth; the last level are sources
+            hops = self._trace_level(frontier, depth) if depth < max_depth else {}
+            if hops.pop(None, False):
+                llm_calls += 1
+            untraced.extend(f"{table}.{column}" for table, column in hops.pop('failed', []))
+            
+            if depth == 0:
+                if target not in hops:
+                    print("No relevant code found")
+                    return None
+                if isinstance(hops[target], str):
+                    # LLM answer for the target column could not be parsed
+                    return self._parse_llm_response(hops[target], table_name, column_name)
+            
+            next_frontier = []
+            for node in frontier:
+                node_hops = hops.get(node) or []
+                if isinstance(node_hops, str):
+                    node_hops = []
+                
+                if not node_hops:
+                    source = sources.setdefault(node[0], {'table_name': node[0], 'columns': []})
+                    if node[1] not in source['columns']:
+                        source['columns'].append(node[1])
+                    lineage_chain.append({
+                        'level': depth + 1,
+                        'table': node[0],
+                        'column': node[1],
+                        'operation': 'SOURCE',
+                        'sources': []
+                    })
+                    continue
+                
+                for hop in node_hops:
+                    # Steps form a graph, not a chain: link each to the columns it reads
+                    lineage_chain.append({
+                        'level': depth + 1,
+                        'table': node[0],
+                        'column': node[1],
+                        **hop['step'],
+                        'sources': [f"{table}.{column}" for (table, column), _ in hop['sources']]
+                    })
+                    for transformation in hop['transformations']:
+                        transformations.setdefault(transformation['expression'], transformation)
+                    for source_node, details in hop['sources']:
+                        if source_node not in visited:
+                            visited.add(source_node)
+                            next_frontier.append(source_node)
+                        if details:
+                            entry = sources.setdefault(source_node[0], {'table_name': source_node[0],
+                                                                        'columns': []})
+                            for key, value in details.items():
+                                entry.setdefault(key, value)
+            
+            frontier = next_frontier
+        
+        # Join details recorded for tables that turned out to be intermediate
+        source_tables = [entry for entry in sources.values() if entry['columns']]
+        levels = max(step['level'] for step in lineage_chain) - 1
+        
+        print(f"Traced {len(visited)} columns over {levels} level(s) with {llm_calls} LLM call(s)")
+        
+        if source_tables:
+            summary = (f"{target[0]}.{target[1]} is derived from "
+                       f"{', '.join(entry['table_name'] for entry in source_tables)} "
+                       f"through {levels} level(s)")
+        else:
+            summary = f"{target[0]}.{target[1]} could not be traced to source tables"
+        
+        lineage_result = {
+            'summary': summary,
+            'target': {'table': target[0], 'column': target[1]},
+            'lineage_chain': lineage_chain,
+            'source_tables': source_tables,
+            'transformations': list(transformations.values()),
+            'llm_calls': llm_calls
+        }
         
-        # Step 2: Analyze with LLM
-        lineage_result = self._analyze_with_llm(
-            table_name,
-            column_name,
-            relevant_chunks,
-            max_depth
-        )
+        if untraced:
+            # Failed columns were reported as sources; the chain may stop early
+            lineage_result['incomplete'] = True
+            lineage_result['untraced_columns'] = untraced
+            lineage_result['summary'] += f" (incomplete: could not trace {', '.join(untraced)})"
         
         return lineage_result
     
-    def _find_relevant_code(self, table_name: str, column_name: str) -> List:
-        """Find code chunks relevant to table and column"""
+    def _trace_level(self, nodes: List[Tuple[str, str]], depth: int) -> Dict:
+        """
+        Find the direct upstream columns of one level of columns
+        
+        Args:
+            nodes: (table, column) pairs to trace
+            depth: Level of the nodes, 0 for the target column
+        
+        Returns:
+            Dictionary mapping each traced node to a list of hops
+            ({'step', 'sources', 'transformations'}), or to the raw LLM
+            response if it could not be parsed; nodes without code are
+            absent. The key None is set if the LLM was called, and the key
+            'failed' lists the nodes whose LLM answer could not be parsed.
+        """
+        graph = self.rag.column_graph
+        hops = {}
+        # Static hops of columns whose writers the graph only partly resolved
+        partial = {}
+        pending = []
+        
+        for node in nodes:
+            writers = self.rag.table_index.writers_for_table(node[0])
+            edges = graph.upstream(*node) if self.static_lineage else []
+            if edges and graph.is_complete(*node, writers):
+                hops[node] = self._hops_from_edges(edges)
+                continue
+            if edges:
+                partial[node] = self._hops_from_edges(edges)
+            # Upstream columns nothing writes, or only DDL creates, are
+            # sources, no lookup needed
+            is_source = not writers or (self.static_lineage and graph.is_source(*node, writers))
+            if depth == 0 or edges or not is_source:
+                pending.append(node)
+        
+        if pending:
+            hops.update(self._trace_with_llm(pending, depth))
+            hops['failed'] = [node for node in pending if isinstance(hops.get(node), str)]
+        
+        # The LLM sees every writer; keep static hops where it found nothing
+        for node, static_hops in partial.items():
+            if not isinstance(hops.get(node), list) or not hops[node]:
+                hops[node] = static_hops
+        
+        return hops
+    
+    def _trace_with_llm(self, pending: List[Tuple[str, str]], depth: int) -> Dict:
+        """Trace columns one hop with one LLM call over the code writing their tables"""
+        hops = {}
+        
+        chunks = self._find_level_code(pending)
+        if not chunks:
+            return hops
+        
+        print(f"Level {depth + 1}: tracing {len(pending)} columns over {len(chunks)} code chunks")
+        
+        prompt = self._create_lineage_prompt(pending, self._prepare_context(chunks))
+        response = self.rag.query_llm(prompt, max_tokens=4000)
+        hops[None] = True
+        
+        hops.update(self._parse_level_response(response, pending))
+        
+        return hops
+    
+    def _hops_from_edges(self, edges: List) -> List[Dict]:
+        """Convert static column graph edges into hops, one per writing statement"""
+        hops = {}
+        
+        for edge in edges:
+            hop = hops.get((edge.file_path, edge.line, edge.expression))
+            if hop is None:
+                hop = hops[(edge.file_path, edge.line, edge.expression)] = {
+                    'step': {
+                        'operation': edge.operation,
+                        'transformation': edge.expression,
+                        'source_file': edge.file_path,
+                        'code_snippet': f"{edge.target_column} = {edge.expression}",
+                        'line_number': edge.line
+                    },
+                    'sources': [],
+                    'transformations': []
+                }
+                if edge.is_transformation:
+                    hop['transformations'].append({
+                        'type': next((name for name, pattern in self.TRANSFORMATION_TYPES
+                                      if pattern.search(edge.expression)), 'calculation'),
+                        'expression': edge.expression,
+                        'description': f"Computes {edge.target_table}.{edge.target_column}"
+                    })
+            hop['sources'].append(((edge.source_table, edge.source_column), {}))
+        
+        return list(hops.values())
+    
+    def _resolve_table(self, table_name: str) -> str:
+        """Map a table name to the indexed name it refers to, if unambiguous"""
+        tables = self.rag.table_index.resolve(table_name)
+        return tables[0] if len(tables) == 1 else table_name.strip().upper()
+    
+    def _find_level_code(self, nodes: List[Tuple[str, str]]) -> List:
+        """Find code for a level of columns, interleaving tables so each gets context"""
+        per_table = []
+        for table in dict.fromkeys(table for table, _ in nodes):
+            columns = [column for node_table, column in nodes if node_table == table]
+            per_table.append(self._find_relevant_code(table, columns))
+        
+        chunks = []
+        seen = set()
+        for rank in range(max((len(found) for found in per_table), default=0)):
+            for found in per_table:
+                if rank < len(found) and found[rank].chunk_id not in seen:
+                    seen.add(found[rank].chunk_id)
+                    chunks.append(found[rank])
+        
+        return chunks
+    
+    def _find_relevant_code(self, table_name: str, column_names: List[str]) -> List:
+        """Find code chunks relevant to table and columns"""
+        if self.structural_retrieval:
+            chunks = self._find_writer_code(table_name, column_names)
+            if chunks:
+                return chunks
+        
+        return self._search_relevant_code(table_name, column_names)
+    
+    def _find_writer_code(self, table_name: str, column_names: List[str]) -> List:
+        """Find statements writing the table using parsed statement metadata"""
+        chunks = self.rag.get_writer_chunks(table_name)
+        
+        # Statements that mention the columns first
+        columns_upper = [column_name.upper() for column_name in column_names]
+        chunks.sort(key=lambda chunk: -sum(column in chunk.content.upper() for column in columns_upper))
+        
+        return chunks
+    
+    def _search_relevant_code(self, table_name: str, column_names: List[str]) -> List:
+        """Find code chunks relevant to table and columns via vector search"""
+        columns = ' '.join(column_names)
         
         # Search queries
         queries = [
-            f"{table_name} {column_name}",
+            f"{table_name} {columns}",
             f"INSERT INTO {table_name}",
             f"CREATE TABLE {table_name}",
-            f"SELECT {column_name}",
+            f"SELECT {columns}",
             table_name
         ]
         
         all_chunks = []
-        seen_ids = set()
         
-        for query in queries:
-            chunks = self.rag.retrieve(query, top_k=5)
-            
-            for chunk in chunks:
-                if chunk.chunk_id not in seen_ids:
-                    # Check if table is actually mentioned
-                    if table_name.upper() in chunk.content.upper():
-                        all_chunks.append(chunk)
-                        seen_ids.add(chunk.chunk_id)
+        # Ids of the indexed names the table may appear under
+        table_ids = set(self.rag.table_index.resolve_ids(table_name))
         
-        return all_chunks
-    
-    def _analyze_with_llm(self, table_name: str, column_name: str,
-                         chunks: List, max_depth: int) -> Dict:
-        """Use LLM to analyze lineage from code chunks"""
-        
-        # Prepare context from chunks
-        context = self._prepare_context(chunks)
-        
-        # Create analysis prompt
-        prompt = self._create_lineage_prompt(
-            table_name,
-            column_name,
-            context,
-            max_depth
-        )
-        
-        # Query LLM
-        response = self.rag.query_llm(prompt, max_tokens=4000)
-        
-        # Parse response
-        lineage_result = self._parse_llm_response(response, table_name, column_name)
+        # One batched search for all queries, already de-duplicated
+        for chunk in self.rag.retrieve_many(queries, top_k=5):
+            # Check if table is actually referenced; fall back to the text for
+            # names the parser did not extract
+            if table_ids:
+                if table_ids.intersection(chunk.metadata.get('table_ids', ())):
+                    all_chunks.append(chunk)
+            elif table_name.upper() in chunk.content.upper():
+                all_chunks.append(chunk)
         
-        return lineage_result
+        return all_chunks
     
     def _prepare_context(self, chunks: List) -> str:
         """Prepare context from chunks"""
         context_parts = []
         
         for i, chunk in enumerate(chunks[:15]):  # Limit to avoid token limits
+            if 'start_line' in chunk.metadata:
+                lines = f"{chunk.metadata['start_line']}-{chunk.metadata['end_line']}"
+            else:
+                lines = 'Unknown'
+            
             context_parts.append(f"""
 --- Code Chunk {i+1} ---
 File: {chunk.metadata.get('file_path', 'Unknown')}
+Lines: {lines}
 Type: {chunk.metadata.get('statement_type', 'Unknown')}
 Tables: {', '.join(chunk.metadata.get('tables', []))}
 
@@ -120,67 +496,43 @@ Tables: {', '.join(chunk.metadata.get('tables', []))}
         
         return "\n".join(context_parts)
     
-    def _create_lineage_prompt(self, table_name: str, column_name: str,
-                              context: str, max_depth: int) -> str:
-        """Create prompt for lineage analysis"""
+    def _create_lineage_prompt(self, nodes: List[Tuple[str, str]], context: str) -> str:
+        """Create prompt tracing one level of columns one hop upstream"""
+        columns = "\n".join(f"- {table}.{column}" for table, column in nodes)
         
-        prompt = f"""You are a Teradata SQL expert analyzing data lineage. Your task is to trace how a specific column in a table is derived from source data.
+        prompt = f"""You are a Teradata SQL expert analyzing data lineage. Your task is to find, for each of the columns below, the columns it is directly derived from.
 
-TARGET COLUMN TO ANALYZE:
-Table: {table_name}
-Column: {column_name}
+COLUMNS TO TRACE:
+{columns}
 
 AVAILABLE CODE:
 {context}
 
 INSTRUCTIONS:
-1. Analyze the provided Teradata code to understand how {column_name} in {table_name} is populated
-2. Trace back through all transformations to identify:
-   - Source tables and columns
-   - SQL transformations (calculations, aggregations, CASE statements, etc.)
-   - Join conditions
-   - Filter conditions (WHERE clauses)
-   - Any intermediate tables
-
-3. Build a complete lineage chain showing:
-   - Each step in the data flow
-   - The SQL logic at each step
-   - Which file contains each transformation
+1. For each column above, find the statements in the provided Teradata code that populate it
+2. Identify only its direct sources, one step upstream: the table columns read by those statements to compute it. Intermediate tables are traced separately, so do not follow them further
+3. Note the SQL transformation (calculations, aggregations, CASE statements, etc.), join type and filter conditions
 
 4. Provide your analysis in the following JSON format:
 
 {{
-  "summary": "Brief description of how the column is derived",
-  "target": {{
-    "table": "{table_name}",
-    "column": "{column_name}"
-  }},
-  "lineage_chain": [
+  "columns": [
     {{
-      "level": 1,
       "table": "TARGET_TABLE",
       "column": "TARGET_COLUMN",
-      "operation": "INSERT/CREATE/UPDATE",
-      "source_file": "path/to/file.sql",
-      "code_snippet": "relevant SQL code",
-      "line_number": 10
-    }},
-    {{
-      "level": 2,
-      "table": "INTERMEDIATE_TABLE",
-      "column": "SOURCE_COLUMN",
-      "operation": "SELECT with transformation",
+      "operation": "INSERT/CREATE/UPDATE/MERGE",
       "transformation": "SUM(amount) AS total",
       "source_file": "path/to/file.sql",
-      "code_snippet": "relevant SQL code"
-    }}
-  ],
-  "source_tables": [
-    {{
-      "table_name": "SOURCE_TABLE_1",
-      "columns": ["col1", "col2"],
-      "join_type": "LEFT JOIN",
-      "filter_conditions": "WHERE date > '2024-01-01'"
+      "code_snippet": "relevant SQL code",
+      "line_number": 10,
+      "sources": [
+        {{
+          "table": "SOURCE_DB.SOURCE_TABLE",
+          "column": "SOURCE_COLUMN",
+          "join_type": "LEFT JOIN",
+          "filter_conditions": "WHERE date > '2024-01-01'"
+        }}
+      ]
     }}
   ],
   "transformations": [
@@ -188,26 +540,78 @@ INSTRUCTIONS:
       "type": "aggregation",
       "expression": "SUM(amount)",
       "description": "Aggregates transaction amounts"
-    }},
-    {{
-      "type": "calculation",
-      "expression": "price * quantity",
-      "description": "Calculates line total"
     }}
   ]
 }}
 
 IMPORTANT:
-- If you cannot find the lineage, explain why
-- Include actual SQL code snippets
-- Be specific about file paths and line numbers when visible
-- Trace back to the original source tables (no further transformations)
+- Use the table and column names exactly as listed above for the traced columns
+- Use fully qualified DATABASE.TABLE names for sources, resolving aliases
+- If the code does not show how a column is populated, return it with an empty "sources" list
+- Be specific about file paths; take line_number from the "Lines" of the code chunk
 - Handle Teradata-specific syntax (QUALIFY, SAMPLE, COLLECT STATISTICS, etc.)
 
 Provide your analysis:"""
         
         return prompt
     
+    def _parse_level_response(self, response: str, nodes: List[Tuple[str, str]]) -> Dict:
+        """
+        Parse a one-hop LLM response into hops per traced column
+        
+        Returns:
+            Dictionary mapping nodes to lists of hops; every node maps to
+            the raw response if it is not valid JSON
+        """
+        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        try:
+            result = json.loads(json_match.group(0)) if json_match else None
+        except json.JSONDecodeError:
+            result = None
+        if not isinstance(result, dict):
+            return {node: response for node in nodes}
+        
+        hops = {node: [] for node in nodes}
+        transformations = [t for t in result.get('transformations', []) if isinstance(t, dict)]
+        
+        for entry in result.get('columns', []):
+            if not isinstance(entry, dict):
+                continue
+            node = (self._resolve_table(str(entry.get('table', ''))),
+                    str(entry.get('column', '')).upper())
+            if node not in hops:
+                continue
+            
+            sources = []
+            for source in entry.get('sources') or []:
+                if not isinstance(source, dict) or not source.get('table') or not source.get('column'):
+                    continue
+                details = {key: source[key] for key in ('join_type', 'filter_conditions') if source.get(key)}
+                sources.append(((self._resolve_table(str(source['table'])),
+                                 str(source['column']).upper()), details))
+            
+            if not sources:
+                continue
+            
+            step = {key: entry[key] for key in ('operation', 'transformation', 'source_file',
+                                                'code_snippet', 'line_number') if key in entry}
+            transformation = step.get('transformation', '')
+            hops[node].append({
+                'step': step,
+                'sources': sources,
+                'transformations': [t for t in transformations
+                                    if transformation and t.get('expression', '') in transformation]
+            })
+        
+        # Transformations the model did not tie to a column stay with the first hop
+        all_hops = [hop for node_hops in hops.values() for hop in node_hops]
+        if all_hops:
+            all_hops[0]['transformations'].extend(
+                t for t in transformations if not any(t in hop['transformations'] for hop in all_hops)
+            )
+        
+        return hops
+    
     def _parse_llm_response(self, response: str, table_name: str, 
                            column_name: str) -> Dict:
         """Parse LLM response into structured format"""
@@ -4,10 +4,29 @@ Handles document embedding, retrieval, and LLM integration
 """
 
 import json
-from typing import List, Dict, Optional
+import hashlib
+import re
+import shutil
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from itertools import islice
+from typing import Callable, List, Dict, Iterable, Optional
 import numpy as np
 from dataclasses import dataclass
 
+from .code_parser import TableIndex, TableRegistry
+from .column_lineage import ColumnLineageGraph
+
+# Sparse matrices for TF-IDF vectors
+try:
+    from scipy import sparse
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
 # Vector store using FAISS
 try:
     import faiss
@@ -16,6 +35,13 @@ except ImportError:
     FAISS_AVAILABLE = False
     print("FAISS not available, using simple vector store")
 
+# Local dense embedding models
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
 # LLM Integration
 try:
     import boto3
@@ -30,75 +56,1164 @@ except ImportError:
     ANTHROPIC_AVAILABLE = False
 
 
+# On-disk index layout version, bumped whenever the saved files change
+INDEX_FORMAT_VERSION = 14
+
+# Supported FAISS index types; all use inner product over L2-normalized
+# vectors, i.e. cosine similarity, matching the NumPy fallback
+INDEX_TYPES = ['flat', 'ivf', 'hnsw']
+
+
 @dataclass
 class DocumentChunk:
     """Represents a document chunk for RAG"""
     chunk_id: str
     content: str
     metadata: Dict
-    embedding: Optional[np.ndarray] = None
 
 
-class SimpleEmbedding:
+class _GrowableArray:
+    """Append-only NumPy array, concatenated lazily on first read"""
+    
+    def __init__(self, dtype, array: Optional[np.ndarray] = None):
+        self.dtype = dtype
+        self._parts = [np.zeros(0, dtype=dtype) if array is None else array]
+    
+    def extend(self, values) -> None:
+        self._parts.append(np.asarray(values, dtype=self.dtype))
+    
+    @property
+    def array(self) -> np.ndarray:
+        if len(self._parts) > 1:
+            self._parts = [np.concatenate(self._parts)]
+        return self._parts[0]
+
+
+class ChunkStore:
+    """
+    Array-backed chunk storage
+    
+    Chunk text lives in one UTF-8 byte blob addressed by an end-offset array,
+    and metadata in dictionary-encoded columns (list-valued fields as flat
+    codes plus end offsets). A saved store is memory-mapped by every process
+    that loads it, and DocumentChunk objects are only built on access.
+    
+    Table fields are encoded with TableRegistry ids, so decoded metadata
+    also carries 'table_ids' for integer set operations.
+    """
+    
+    SCALAR_FIELDS = ('file_path', 'file_type', 'chunk_type', 'statement_type', 'target_table')
+    LIST_FIELDS = ('tables', 'source_tables', 'columns')
+    TABLE_FIELDS = ('target_table', 'tables', 'source_tables')
+    # Non-negative integers, stored as is (-1 for None)
+    INT_FIELDS = ('start_line', 'end_line', 'start_offset', 'end_offset')
+    
+    def __init__(self, registry: Optional[TableRegistry] = None):
+        """
+        Initialize an empty store
+        
+        Args:
+            registry: Table registry encoding table fields (a new one if None)
+        """
+        self.registry = registry if registry is not None else TableRegistry()
+        self._ids: List[str] = []
+        self._text = _GrowableArray(np.uint8)
+        self._text_ends = _GrowableArray(np.int64)
+        
+        # Per field: distinct values, value key -> code, and codes per row
+        self._values: Dict[str, List] = {}
+        self._lookup: Dict[str, Dict] = {}
+        self._codes: Dict[str, _GrowableArray] = {}
+        self._list_ends: Dict[str, _GrowableArray] = {}
+        
+        for field in self.SCALAR_FIELDS + self.LIST_FIELDS:
+            self._values[field] = []
+            self._lookup[field] = {}
+            self._codes[field] = _GrowableArray(np.int32)
+        for field in self.LIST_FIELDS:
+            self._list_ends[field] = _GrowableArray(np.int64)
+        for field in self.INT_FIELDS:
+            self._codes[field] = _GrowableArray(np.int64)
+        for field in self.TABLE_FIELDS:
+            self._values[field] = self.registry.names
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def __getitem__(self, position: int) -> DocumentChunk:
+        return DocumentChunk(
+            chunk_id=self._ids[position],
+            content=self.text(position),
+            metadata=self.metadata(position)
+        )
+    
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+    
+    def extend(self, chunks: List[DocumentChunk]) -> None:
+        """
+        Append chunks
+        
+        Args:
+            chunks: Chunks whose metadata uses the store's fields
+        """
+        if not chunks:
+            return
+        
+        encoded = [chunk.content.encode('utf-8') for chunk in chunks]
+        offset = self._text_ends.array[-1] if len(self) else 0
+        
+        self._ids.extend(chunk.chunk_id for chunk in chunks)
+        self._text.extend(np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        self._text_ends.extend(offset + np.cumsum([len(text) for text in encoded]))
+        
+        for field in self.SCALAR_FIELDS:
+            self._codes[field].extend(
+                [self._encode(field, chunk.metadata.get(field)) for chunk in chunks]
+            )
+        
+        for field in self.INT_FIELDS:
+            self._codes[field].extend([
+                -1 if chunk.metadata.get(field) is None else chunk.metadata[field]
+                for chunk in chunks
+            ])
+        
+        for field in self.LIST_FIELDS:
+            ends = self._list_ends[field].array
+            offset = ends[-1] if len(ends) else 0
+            
+            codes = []
+            row_ends = []
+            for chunk in chunks:
+                codes.extend(self._encode(field, value) for value in chunk.metadata.get(field) or [])
+                row_ends.append(offset + len(codes))
+            
+            self._codes[field].extend(codes)
+            self._list_ends[field].extend(row_ends)
+    
+    def select(self, positions: List[int]) -> 'ChunkStore':
+        """
+        Copy a subset of rows into a new store
+        
+        Args:
+            positions: Row positions to keep, in ascending order
+        
+        Returns:
+            New ChunkStore
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if np.any(np.diff(positions) <= 0):
+            raise ValueError("Row positions must be strictly ascending")
+        
+        keep = np.zeros(len(self), dtype=bool)
+        keep[positions] = True
+        
+        # Slice the encoded columns directly; codes stay valid against copied value tables
+        store = ChunkStore(self.registry)
+        store._ids = [self._ids[position] for position in positions]
+        store._text, store._text_ends = self._select_ranges(
+            self._text.array, self._text_ends.array, keep
+        )
+        
+        for field in self.SCALAR_FIELDS + self.INT_FIELDS:
+            store._codes[field] = _GrowableArray(
+                self._codes[field].dtype, self._codes[field].array[positions]
+            )
+        
+        for field in self.LIST_FIELDS:
+            store._codes[field], store._list_ends[field] = self._select_ranges(
+                self._codes[field].array, self._list_ends[field].array, keep
+            )
+        
+        for field in self.SCALAR_FIELDS + self.LIST_FIELDS:
+            if field not in self.TABLE_FIELDS:
+                store._values[field] = list(self._values[field])
+                store._lookup[field] = dict(self._lookup[field])
+        
+        return store
+    
+    def chunk_ids(self) -> List[str]:
+        """Chunk ids in row order"""
+        return self._ids
+    
+    def text(self, position: int) -> str:
+        """Chunk content at a row position"""
+        ends = self._text_ends.array
+        start = ends[position - 1] if position > 0 else 0
+        return self._text.array[start:ends[position]].tobytes().decode('utf-8')
+    
+    def column(self, field: str) -> List:
+        """
+        Decode a scalar metadata column
+        
+        Args:
+            field: One of SCALAR_FIELDS
+        
+        Returns:
+            Value per row (None where unset)
+        """
+        values = self._values[field] + [None]
+        return [values[code] for code in self._codes[field].array]
+    
+    def metadata(self, position: int) -> Dict:
+        """Metadata dictionary at a row position"""
+        metadata = {}
+        
+        for field in self.SCALAR_FIELDS:
+            code = self._codes[field].array[position]
+            if code >= 0:
+                metadata[field] = self._values[field][code]
+        
+        for field in self.LIST_FIELDS:
+            ends = self._list_ends[field].array
+            start = ends[position - 1] if position > 0 else 0
+            codes = self._codes[field].array[start:ends[position]]
+            metadata[field] = [self._values[field][code] for code in codes]
+            if field == 'tables':
+                metadata['table_ids'] = codes.tolist()
+        
+        for field in self.INT_FIELDS:
+            value = int(self._codes[field].array[position])
+            if value >= 0:
+                metadata[field] = value
+        
+        return metadata
+    
+    def save(self, path: Path) -> None:
+        """
+        Write the store as .npy arrays plus a JSON value table
+        
+        Args:
+            path: Target directory
+        """
+        path = Path(path)
+        
+        np.save(path / 'chunk_text.npy', self._text.array)
+        np.save(path / 'chunk_text_ends.npy', self._text_ends.array)
+        for field in self.SCALAR_FIELDS + self.LIST_FIELDS + self.INT_FIELDS:
+            np.save(path / f'chunk_{field}.npy', self._codes[field].array)
+        for field in self.LIST_FIELDS:
+            np.save(path / f'chunk_{field}_ends.npy', self._list_ends[field].array)
+        
+        # Table fields are restored from the registry saved with the table index
+        values = {
+            field: values for field, values in self._values.items()
+            if field not in self.TABLE_FIELDS
+        }
+        with open(path / 'chunks.json', 'w', encoding='utf-8') as f:
+            json.dump({'chunk_ids': self._ids, 'values': values}, f)
+    
+    @classmethod
+    def load(cls, path: Path, registry: TableRegistry) -> 'ChunkStore':
+        """
+        Memory-map a store written by save()
+        
+        Args:
+            path: Index directory
+            registry: Table registry the store was encoded with
+        
+        Returns:
+            ChunkStore backed by read-only memory maps
+        """
+        path = Path(path)
+        store = cls(registry)
+        
+        with open(path / 'chunks.json', 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        store._ids = saved['chunk_ids']
+        
+        def load_array(name: str, dtype) -> _GrowableArray:
+            return _GrowableArray(dtype, np.load(path / name, mmap_mode='r'))
+        
+        store._text = load_array('chunk_text.npy', np.uint8)
+        store._text_ends = load_array('chunk_text_ends.npy', np.int64)
+        for field in cls.SCALAR_FIELDS + cls.LIST_FIELDS:
+            if field not in cls.TABLE_FIELDS:
+                store._values[field] = saved['values'][field]
+                store._lookup[field] = {
+                    cls._value_key(value): code for code, value in enumerate(store._values[field])
+                }
+            store._codes[field] = load_array(f'chunk_{field}.npy', np.int32)
+        for field in cls.LIST_FIELDS:
+            store._list_ends[field] = load_array(f'chunk_{field}_ends.npy', np.int64)
+        for field in cls.INT_FIELDS:
+            store._codes[field] = load_array(f'chunk_{field}.npy', np.int64)
+        
+        return store
+    
+    @staticmethod
+    def _select_ranges(data: np.ndarray, ends: np.ndarray, keep: np.ndarray):
+        """
+        Keep the end-offset ranges of selected rows
+        
+        Args:
+            data: Flat values addressed by ends
+            ends: End offset per row
+            keep: Boolean row mask
+        
+        Returns:
+            Tuple of (data, ends) growable arrays for the kept rows
+        """
+        lengths = np.diff(ends, prepend=0)
+        return (
+            _GrowableArray(data.dtype, data[np.repeat(keep, lengths)]),
+            _GrowableArray(ends.dtype, np.cumsum(lengths[keep]))
+        )
+    
+    def _encode(self, field: str, value) -> int:
+        """Get the dictionary code for a value, -1 for None"""
+        if value is None:
+            return -1
+        if field in self.TABLE_FIELDS:
+            return self.registry.intern(value)
+        
+        key = self._value_key(value)
+        code = self._lookup[field].get(key)
+        if code is None:
+            code = len(self._values[field])
+            self._lookup[field][key] = code
+            self._values[field].append(value)
+        
+        return code
+    
+    @staticmethod
+    def _value_key(value):
+        """Hashable key for strings and JSON-serializable values"""
+        if isinstance(value, str):
+            return value
+        return ('json', json.dumps(value, sort_keys=True))
+
+
+class SQLTokenizer:
+    """Split SQL text into lowercase identifier terms for embeddings and queries"""
+    
+    # Dotted identifiers (DB.TABLE, alias.column) or numbers, in one scan
+    TOKEN_PATTERN = re.compile(r'[a-z_$#][\w$#]*(?:\.[a-z_$#][\w$#]*)*|\d[\w.]*')
+    
+    # SQL/Teradata keywords and chunk header labels that carry no lineage meaning
+    STOP_WORDS = frozenset([
+        'select', 'sel', 'from', 'where', 'and', 'or', 'not', 'as', 'on', 'in',
+        'is', 'null', 'insert', 'ins', 'into', 'values', 'update', 'upd', 'set',
+        'delete', 'del', 'create', 'replace', 'table', 'multiset', 'volatile',
+        'global', 'temporary', 'with', 'data', 'no', 'primary', 'unique',
+        'index', 'group', 'by', 'order', 'having', 'join', 'inner', 'left',
+        'right', 'full', 'outer', 'cross', 'union', 'all', 'distinct', 'case',
+        'when', 'then', 'else', 'end', 'between', 'like', 'exists', 'merge',
+        'using', 'matched', 'qualify', 'begin', 'procedure', 'drop', 'collect',
+        'statistics', 'stats', 'column', 'partition', 'over', 'asc', 'desc',
+        'preserve', 'commit', 'rows', 'file', 'type', 'tables', 'referenced',
+        'statement', 'sql'
+    ])
+    
+    def __init__(self, qualified: bool = True, unqualified: bool = True,
+                 stop_words: bool = True, keep_numbers: bool = False,
+                 min_length: int = 2):
+        """
+        Initialize tokenizer
+        
+        Args:
+            qualified: Emit dotted names as one term (analytics.customer_summary)
+            unqualified: Emit each part of dotted names (analytics, customer_summary)
+            stop_words: Drop SQL keywords
+            keep_numbers: Keep numeric literals
+            min_length: Drop terms shorter than this, e.g. one-letter aliases
+        """
+        self.qualified = qualified
+        self.unqualified = unqualified
+        self.stop_words = self.STOP_WORDS if stop_words else frozenset()
+        self.keep_numbers = keep_numbers
+        self.min_length = min_length
+    
+    def get_config(self) -> Dict:
+        """Settings that change the produced terms"""
+        return {
+            'qualified': self.qualified,
+            'unqualified': self.unqualified,
+            'stop_words': bool(self.stop_words),
+            'keep_numbers': self.keep_numbers,
+            'min_length': self.min_length
+        }
+    
+    def tokenize(self, text: str) -> List[str]:
+        """
+        Tokenize text
+        
+        Args:
+            text: SQL or free text
+        
+        Returns:
+            List of terms, in order of appearance
+        """
+        terms = []
+        
+        for token in self.TOKEN_PATTERN.findall(text.lower()):
+            if token[0].isdigit():
+                if self.keep_numbers:
+                    terms.append(token)
+            elif '.' in token:
+                if self.qualified:
+                    terms.append(token)
+                if self.unqualified:
+                    terms.extend(part for part in token.split('.') if self._keep(part))
+            elif self._keep(token):
+                terms.append(token)
+        
+        return terms
+    
+    def _keep(self, term: str) -> bool:
+        """Check a single identifier against the length and stop-word filters"""
+        return len(term) >= self.min_length and term not in self.stop_words
+
+
+class Embedder:
+    """
+    Interface for chunk embedders used by LineageRAGPipeline
+    
+    Documents are fed in batches through partial_fit and embedded by
+    finish_fit; queries and incremental updates go through transform.
+    All methods return L2-normalized float32 matrices (CSR when sparse).
+    """
+    
+    # Whether produced matrices are scipy.sparse CSR
+    sparse = False
+    
+    # Storage dtype for the pipeline's embedding matrix
+    storage_dtype = 'float32'
+    
+    # Optional EmbeddingCache consulted by transform_cached
+    cache = None
+    
+    # Whether fitted state (e.g. vocabulary and IDF) depends on the corpus
+    corpus_dependent = False
+    
+    def reset(self) -> None:
+        """Discard fitted state and pending partial_fit input"""
+        raise NotImplementedError
+    
+    def partial_fit(self, documents: List[str]) -> None:
+        """Consume a batch of documents"""
+        raise NotImplementedError
+    
+    def finish_fit(self):
+        """Embed every document passed to partial_fit since reset"""
+        raise NotImplementedError
+    
+    def transform(self, documents: List[str]):
+        """Embed documents with the fitted state"""
+        raise NotImplementedError
+    
+    def get_config(self) -> Dict:
+        """Settings that must match for saved embeddings to be reusable"""
+        raise NotImplementedError
+    
+    def unknown_term_share(self, documents: List[str]) -> float:
+        """Fraction of document terms the fitted state cannot represent"""
+        return 0.0
+    
+    def cache_version(self) -> Optional[str]:
+        """
+        Identify the function mapping text to vectors, for cache keys
+        
+        Returns:
+            Version string, or None if embeddings depend on the corpus and
+            must not be cached
+        """
+        return None
+    
+    def transform_cached(self, documents: List[str]):
+        """Embed documents, reusing cached vectors for previously seen texts"""
+        version = self.cache_version()
+        if self.cache is None or version is None:
+            return self.transform(documents)
+        
+        return self.cache.embed(version, documents, self.transform)
+    
+    def fit_transform(self, documents: List[str]):
+        """Fit on documents and return their embeddings"""
+        self.reset()
+        self.partial_fit(documents)
+        
+        return self.finish_fit()
+    
+    def quantize(self, matrix):
+        """
+        Convert a float32 embedding matrix to the storage dtype
+        
+        int8 stores components scaled by 127; cosine rankings are unaffected
+        by the scale, so stored rows can be searched without rescaling.
+        
+        Args:
+            matrix: Normalized float32 embedding matrix
+        
+        Returns:
+            Matrix in storage_dtype
+        """
+        if self.sparse or self.storage_dtype == 'float32':
+            return matrix
+        if self.storage_dtype == 'float16':
+            return matrix.astype(np.float16)
+        if self.storage_dtype == 'int8':
+            return np.round(matrix * 127).astype(np.int8)
+        
+        raise ValueError(f"Unknown storage dtype {self.storage_dtype!r}")
+    
+    def dequantize(self, matrix) -> np.ndarray:
+        """
+        Convert a stored embedding matrix back to float32
+        
+        Args:
+            matrix: Matrix returned by quantize()
+        
+        Returns:
+            float32 matrix
+        """
+        if self.storage_dtype == 'int8':
+            return np.asarray(matrix, dtype=np.float32) / 127
+        return np.asarray(matrix, dtype=np.float32)
+    
+    def save_state(self, path: Path) -> None:
+        """Write fitted state into an index directory"""
+    
+    def load_state(self, path: Path) -> None:
+        """Restore fitted state written by save_state"""
+
+
+class SimpleEmbedding(Embedder):
     """Simple embedding using TF-IDF when proper embeddings unavailable"""
     
-    def __init__(self):
-        self.vocab = {}
-        self.idf = {}
+    corpus_dependent = True
+    
+    def __init__(self, sparse: bool = False, min_df=1, max_df=1.0,
+                 max_features: Optional[int] = None,
+                 hash_features: Optional[int] = None,
+                 tokenizer: Optional[SQLTokenizer] = None):
+        """
+        Initialize embedding
+        
+        Args:
+            sparse: Keep document vectors in a CSR matrix instead of
+                one dense vocabulary-sized array per document
+            min_df: Drop terms in fewer documents than this (int count or
+                float fraction of documents)
+            max_df: Drop terms in more documents than this (int count or
+                float fraction of documents)
+            max_features: Keep only this many terms, by document frequency
+            hash_features: Hash terms into a fixed number of dimensions
+                instead of building a vocabulary; pruning does not apply
+            tokenizer: Tokenizer shared by documents and queries
+                (default: SQLTokenizer())
+        """
+        if sparse and not SCIPY_AVAILABLE:
+            print("SciPy not available, using dense TF-IDF vectors")
+        
+        self.sparse = sparse and SCIPY_AVAILABLE
+        self.min_df = min_df
+        self.max_df = max_df
+        self.max_features = max_features
+        self.hash_features = hash_features
+        self.tokenizer = tokenizer or SQLTokenizer()
+        self.reset()
+    
+    @property
+    def dimension(self) -> int:
+        """Embedding dimension"""
+        return self.hash_features or len(self.vocab)
+    
+    def get_config(self) -> Dict:
+        """Settings that must match for saved embeddings to be reusable"""
+        return {
+            'type': 'tfidf',
+            'sparse': self.sparse,
+            'hash_features': self.hash_features,
+            'tokenizer': self.tokenizer.get_config()
+        }
     
     def fit(self, documents: List[str]):
         """Build vocabulary and IDF from documents"""
-        # Build vocabulary
-        for doc in documents:
-            words = doc.lower().split()
-            for word in words:
-                if word not in self.vocab:
-                    self.vocab[word] = len(self.vocab)
+        self.fit_transform(documents)
+    
+    def fit_transform(self, documents: List[str]):
+        """
+        Build vocabulary and IDF and embed all documents in one pass
+        
+        Each document is tokenized exactly once; weighting and normalization
+        are applied to the whole document-term matrix at the end.
+        
+        Args:
+            documents: Document texts
+        
+        Returns:
+            Normalized (documents x dimension) float32 matrix, CSR in sparse mode
+        """
+        return super().fit_transform(documents)
+    
+    def reset(self) -> None:
+        """Clear the vocabulary and any pending partial_fit counts"""
+        self.vocab = {}
+        self.idf = np.zeros(self.hash_features or 0)
+        self._doc_freq = np.zeros(self.hash_features or 0, dtype=np.int64)
+        self._pending = []
+    
+    def partial_fit(self, documents: List[str]) -> None:
+        """
+        Tokenize a batch of documents and keep only their term counts
+        
+        The texts themselves are not retained, so callers can stream
+        documents through in bounded batches before calling finish_fit.
+        
+        Args:
+            documents: Document texts
+        """
+        indptr, indices, counts, doc_lengths = self._count_terms(
+            documents, grow_vocab=True
+        )
+        
+        # Each (document, term) pair appears once, so counting ids gives DF
+        doc_freq = np.bincount(indices, minlength=self.dimension).astype(np.int64)
+        doc_freq[:len(self._doc_freq)] += self._doc_freq
+        self._doc_freq = doc_freq
+        
+        self._pending.append((np.diff(indptr), indices, counts, doc_lengths))
+    
+    def finish_fit(self):
+        """
+        Prune the vocabulary, compute IDF and embed every document passed
+        to partial_fit
+        
+        Returns:
+            Normalized (documents x dimension) float32 matrix, CSR in sparse mode
+        """
+        if self._pending:
+            row_nnz, indices, counts, doc_lengths = (
+                np.concatenate(parts) for parts in zip(*self._pending)
+            )
+        else:
+            row_nnz = np.zeros(0, dtype=np.int64)
+            indices = np.zeros(0, dtype=np.int32)
+            counts = np.zeros(0, dtype=np.int32)
+            doc_lengths = np.zeros(0, dtype=np.int32)
+        self._pending = []
+        
+        doc_count = len(doc_lengths)
+        
+        mapping = self._prune(doc_count)
+        if mapping is not None:
+            # Renumber surviving terms and drop the rest from every row
+            rows = np.repeat(np.arange(doc_count), row_nnz)
+            indices = mapping[indices]
+            kept = indices >= 0
+            indices = indices[kept]
+            counts = counts[kept]
+            row_nnz = np.bincount(rows[kept], minlength=doc_count)
+        
+        indptr = np.concatenate([[0], np.cumsum(row_nnz)])
         
         # Calculate IDF
-        doc_count = len(documents)
-        word_doc_count = {}
+        self.idf = np.log(doc_count / (1 + self._doc_freq.astype(np.float64)))
+        
+        return self._weigh(indptr, indices, counts, doc_lengths)
+    
+    def _prune(self, doc_count: int) -> Optional[np.ndarray]:
+        """
+        Apply min_df/max_df/max_features to the vocabulary
+        
+        Args:
+            doc_count: Number of fitted documents
+        
+        Returns:
+            Old -> new term id array (-1 for dropped terms), or None if
+            nothing was dropped
+        """
+        if self.hash_features:
+            return None
+        
+        doc_freq = self._doc_freq
+        min_count = self.min_df if isinstance(self.min_df, int) else np.ceil(self.min_df * doc_count)
+        max_count = self.max_df if isinstance(self.max_df, int) else np.floor(self.max_df * doc_count)
+        keep = (doc_freq >= min_count) & (doc_freq <= max_count)
+        
+        if self.max_features is not None and keep.sum() > self.max_features:
+            candidates = np.flatnonzero(keep)
+            top = candidates[np.argsort(-doc_freq[candidates], kind='stable')[:self.max_features]]
+            keep = np.zeros(len(doc_freq), dtype=bool)
+            keep[top] = True
+        
+        if keep.all():
+            return None
+        
+        mapping = np.full(len(doc_freq), -1, dtype=np.int32)
+        mapping[keep] = np.arange(keep.sum(), dtype=np.int32)
+        
+        # Vocabulary ids follow insertion order
+        self.vocab = {
+            word: int(mapping[term_id])
+            for word, term_id in self.vocab.items() if keep[term_id]
+        }
+        self._doc_freq = doc_freq[keep]
+        
+        return mapping
+    
+    def transform(self, documents: List[str]):
+        """
+        Embed documents against the already fitted vocabulary and IDF
+        
+        Terms that were not seen by fit are ignored.
+        
+        Args:
+            documents: Document texts
+        
+        Returns:
+            Normalized (documents x dimension) float32 matrix, CSR in sparse mode
+        """
+        indptr, indices, counts, doc_lengths = self._count_terms(
+            documents, grow_vocab=False
+        )
+        
+        return self._weigh(indptr, indices, counts, doc_lengths)
+    
+    def unknown_term_share(self, documents: List[str]) -> float:
+        """
+        Fraction of term occurrences missing from the fitted vocabulary
+        
+        Args:
+            documents: Document texts
+        
+        Returns:
+            Share in [0, 1]; always 0 with hash_features
+        """
+        if self.hash_features:
+            return 0.0
+        
+        total = 0
+        unknown = 0
+        for doc in documents:
+            words = self.tokenizer.tokenize(doc)
+            total += len(words)
+            unknown += sum(1 for word in words if word not in self.vocab)
+        
+        return unknown / total if total else 0.0
+    
+    def _count_terms(self, documents: List[str], grow_vocab: bool):
+        """Tokenize documents once into CSR-style term counts"""
+        indptr = [0]
+        indices = []
+        counts = []
+        doc_lengths = []
         
         for doc in documents:
-            words = set(doc.lower().split())
+            words = self.tokenizer.tokenize(doc)
+            
+            word_count = {}
             for word in words:
-                word_doc_count[word] = word_doc_count.get(word, 0) + 1
+                word_count[word] = word_count.get(word, 0) + 1
+            
+            if self.hash_features:
+                # Stable across processes, unlike hash()
+                term_count = {}
+                for word, count in word_count.items():
+                    term_id = zlib.crc32(word.encode('utf-8')) % self.hash_features
+                    term_count[term_id] = term_count.get(term_id, 0) + count
+            else:
+                term_count = {}
+                for word, count in word_count.items():
+                    term_id = self.vocab.get(word)
+                    if term_id is None:
+                        if not grow_vocab:
+                            continue
+                        term_id = len(self.vocab)
+                        self.vocab[word] = term_id
+                    term_count[term_id] = count
+            
+            indices.extend(term_count)
+            counts.extend(term_count.values())
+            indptr.append(len(indices))
+            doc_lengths.append(max(len(words), 1))
+        
+        return (
+            np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int32),
+            np.array(counts, dtype=np.int32),
+            np.array(doc_lengths, dtype=np.int32)
+        )
+    
+    def _weigh(self, indptr: np.ndarray, indices: np.ndarray, counts: np.ndarray,
+               doc_lengths: np.ndarray):
+        """Turn term counts into a normalized TF-IDF matrix"""
+        doc_count = len(doc_lengths)
+        
+        # Calculate TF-IDF for every (document, term) pair at once
+        row_lengths = np.repeat(doc_lengths.astype(np.float32), np.diff(indptr))
+        data = counts.astype(np.float32) / row_lengths
+        data *= self.idf[indices].astype(np.float32)
+        
+        if self.sparse:
+            matrix = sparse.csr_matrix(
+                (data, indices, indptr),
+                shape=(doc_count, self.dimension)
+            )
+            return self._normalize_rows(matrix)
+        
+        matrix = np.zeros((doc_count, self.dimension), dtype=np.float32)
+        rows = np.repeat(np.arange(doc_count), np.diff(indptr))
+        matrix[rows, indices] = data
         
-        for word, count in word_doc_count.items():
-            self.idf[word] = np.log(doc_count / (1 + count))
+        # Normalize
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        
+        return matrix
+    
+    def _normalize_rows(self, matrix):
+        """L2-normalize each row of a CSR matrix in place"""
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(matrix.dtype)
+        return matrix
     
     def embed(self, text: str) -> np.ndarray:
         """Create embedding for text"""
-        vector = np.zeros(len(self.vocab))
-        words = text.lower().split()
+        matrix = self.transform([text])
         
-        # Count words
-        word_count = {}
-        for word in words:
-            word_count[word] = word_count.get(word, 0) + 1
+        return matrix.toarray()[0] if self.sparse else matrix[0]
+    
+    def embed_sparse(self, text: str):
+        """Create a 1 x dimension CSR embedding for text"""
+        return sparse.csr_matrix(self.transform([text]))
+    
+    def save_state(self, path: Path) -> None:
+        """Write vocabulary and IDF into an index directory"""
+        with open(Path(path) / 'vocab.json', 'w', encoding='utf-8') as f:
+            json.dump(sorted(self.vocab, key=self.vocab.get), f)
+        np.save(Path(path) / 'idf.npy', self.idf)
+    
+    def load_state(self, path: Path) -> None:
+        """Restore vocabulary and IDF written by save_state"""
+        with open(Path(path) / 'vocab.json', 'r', encoding='utf-8') as f:
+            self.vocab = {word: i for i, word in enumerate(json.load(f))}
+        self.idf = np.load(Path(path) / 'idf.npy')
+
+
+class LocalDenseEmbedding(Embedder):
+    """Dense semantic embeddings from a local sentence-transformers model"""
+    
+    STORAGE_DTYPES = ['float32', 'float16', 'int8']
+    
+    def __init__(self, model_path: str, batch_size: int = 64, workers: int = 1,
+                 storage_dtype: str = 'float32'):
+        """
+        Initialize embedding
         
-        # Calculate TF-IDF
-        for word, count in word_count.items():
-            if word in self.vocab:
-                tf = count / len(words)
-                idf = self.idf.get(word, 0)
-                vector[self.vocab[word]] = tf * idf
+        Args:
+            model_path: Directory of a sentence-transformers model; it is
+                loaded from disk only, without network access
+            batch_size: Number of texts per model call
+            workers: Number of threads encoding batches concurrently
+            storage_dtype: 'float32', 'float16' or 'int8' for the stored matrix
+        """
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise ImportError("sentence-transformers is required for LocalDenseEmbedding")
+        if storage_dtype not in self.STORAGE_DTYPES:
+            raise ValueError(f"Unknown storage dtype {storage_dtype!r}, expected one of {self.STORAGE_DTYPES}")
+        if not Path(model_path).is_dir():
+            raise FileNotFoundError(f"Embedding model not found at {model_path}")
         
-        # Normalize
-        norm = np.linalg.norm(vector)
-        if norm > 0:
-            vector = vector / norm
+        self.model_path = str(model_path)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.storage_dtype = storage_dtype
+        self.model = SentenceTransformer(self.model_path, device='cpu')
+        self.reset()
+    
+    def get_config(self) -> Dict:
+        """Settings that must match for saved embeddings to be reusable"""
+        return {
+            'type': 'dense',
+            'model_path': self.model_path,
+            'storage_dtype': self.storage_dtype
+        }
+    
+    def cache_version(self) -> str:
+        """Model path plus a fingerprint of the model files"""
+        fingerprint = hashlib.sha1()
+        for path in sorted(Path(self.model_path).iterdir()):
+            if path.is_file():
+                stat = path.stat()
+                fingerprint.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode('utf-8'))
+        
+        return f"dense:{self.model_path}:{fingerprint.hexdigest()}"
+    
+    def reset(self) -> None:
+        """Drop embeddings pending from partial_fit"""
+        self._pending = []
+    
+    def partial_fit(self, documents: List[str]) -> None:
+        """Embed a batch of documents right away; nothing is fitted"""
+        self._pending.append(self.transform_cached(documents))
+    
+    def finish_fit(self) -> np.ndarray:
+        """Stack the embeddings of every document passed to partial_fit"""
+        dimension = self.model.get_sentence_embedding_dimension()
+        matrix = (
+            np.vstack(self._pending) if self._pending
+            else np.zeros((0, dimension), dtype=np.float32)
+        )
+        self._pending = []
+        
+        return matrix
+    
+    def transform(self, documents: List[str]) -> np.ndarray:
+        """
+        Embed documents in batches, spread across worker threads
+        
+        Args:
+            documents: Document texts
+        
+        Returns:
+            Normalized (documents x dimension) float32 matrix
+        """
+        documents = list(documents)
+        if not documents:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        batches = [
+            documents[i:i + self.batch_size]
+            for i in range(0, len(documents), self.batch_size)
+        ]
+        
+        if self.workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(self._encode, batches))
+        else:
+            results = [self._encode(batch) for batch in batches]
+        
+        return np.vstack(results)
+    
+    def _encode(self, batch: List[str]) -> np.ndarray:
+        """Run the model on one batch"""
+        return self.model.encode(
+            batch,
+            batch_size=len(batch),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk cache of chunk embeddings
+    
+    Vectors are keyed by the SHA-1 of the chunk text and grouped by embedder
+    version, each version in its own directory holding a memory-mapped
+    float32 matrix and its key table. Least recently used entries are
+    evicted once max_entries is reached. One writer per cache directory:
+    share a single instance across threads, which serializes access.
+    
+    Slots freed by eviction are only reused after flush() has saved a key
+    table that no longer references them, so a crash between flushes never
+    leaves saved keys pointing at overwritten vectors.
+    """
+    
+    INITIAL_CAPACITY = 1024
+    
+    def __init__(self, cache_dir: Path, max_entries: int = 1_000_000):
+        """
+        Initialize cache
+        
+        Args:
+            cache_dir: Root directory for cached embeddings
+            max_entries: Maximum number of vectors kept per embedder version
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        
+        # version -> open store
+        self._stores: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+    
+    def embed(self, version: str, documents: List[str],
+              compute: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embed documents, computing only those not already cached
+        
+        Args:
+            version: Embedder cache version
+            documents: Document texts
+            compute: Function embedding a list of texts (the cache misses)
+        
+        Returns:
+            (documents x dimension) float32 matrix
+        """
+        keys = [hashlib.sha1(doc.encode('utf-8')).hexdigest() for doc in documents]
+        
+        with self._lock:
+            store = self._open(version)
+            
+            hit_rows = []
+            hit_slots = []
+            missing = []
+            for i, key in enumerate(keys):
+                slot = store['slots'].get(key)
+                if slot is None:
+                    missing.append(i)
+                else:
+                    store['slots'].move_to_end(key)
+                    hit_rows.append(i)
+                    hit_slots.append(slot)
+            
+            self.hits += len(hit_rows)
+            self.misses += len(missing)
+            
+            cached = store['vectors'][hit_slots] if hit_rows else None
+            dimension = store['dimension']
+        
+        # Compute misses without holding the lock
+        computed = compute([documents[i] for i in missing]) if missing else None
+        dimension = dimension or (computed.shape[1] if computed is not None else 0)
+        
+        result = np.empty((len(documents), dimension), dtype=np.float32)
+        if cached is not None:
+            result[hit_rows] = cached
+        
+        if computed is not None:
+            result[missing] = computed
+            with self._lock:
+                for i, row in zip(missing, computed):
+                    # Another thread may have cached the same text meanwhile
+                    if keys[i] not in store['slots']:
+                        self._insert(store, keys[i], row)
+        
+        return result
+    
+    def flush(self) -> None:
+        """Write key tables and vectors of all open stores to disk"""
+        with self._lock:
+            for store in self._stores.values():
+                if store['vectors'] is not None:
+                    store['vectors'].flush()
+                
+                # Evicted slots are unreferenced once this table is saved
+                free = store['free'] + store['evicted']
+                
+                tmp_path = store['path'] / 'keys.json.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({
+                        'dimension': store['dimension'],
+                        'free': free,
+                        'size': store['size'],
+                        # Least recently used first
+                        'slots': list(store['slots'].items())
+                    }, f)
+                tmp_path.replace(store['path'] / 'keys.json')
+                
+                store['free'] = free
+                store['evicted'] = []
+    
+    def _open(self, version: str) -> Dict:
+        """Open (or create) the store for an embedder version"""
+        if version in self._stores:
+            return self._stores[version]
         
-        return vector
+        path = self.cache_dir / hashlib.sha1(version.encode('utf-8')).hexdigest()[:16]
+        path.mkdir(parents=True, exist_ok=True)
+        
+        store = {
+            'path': path,
+            'dimension': 0,
+            'vectors': None,
+            'slots': OrderedDict(),
+            'free': [],
+            # Slots evicted since the last flush, still named by keys.json
+            'evicted': [],
+            'size': 0
+        }
+        
+        if (path / 'keys.json').exists() and (path / 'vectors.npy').exists():
+            with open(path / 'keys.json', 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            store['dimension'] = saved['dimension']
+            store['slots'] = OrderedDict(saved['slots'])
+            store['free'] = saved['free']
+            store['size'] = saved['size']
+            store['vectors'] = np.load(path / 'vectors.npy', mmap_mode='r+')
+            
+            # Honor a max_entries smaller than the one the store was built with
+            while len(store['slots']) > self.max_entries:
+                _, slot = store['slots'].popitem(last=False)
+                store['evicted'].append(slot)
+        
+        self._stores[version] = store
+        return store
+    
+    def _insert(self, store: Dict, key: str, vector: np.ndarray) -> None:
+        """Store one vector, evicting the least recently used entry if full"""
+        if store['vectors'] is None:
+            store['dimension'] = len(vector)
+            self._resize(store, self.INITIAL_CAPACITY)
+        
+        if len(store['slots']) >= self.max_entries:
+            _, evicted = store['slots'].popitem(last=False)
+            store['evicted'].append(evicted)
+        
+        if store['free']:
+            slot = store['free'].pop()
+        else:
+            if store['size'] >= len(store['vectors']):
+                # Past max_entries only while evicted slots await a flush
+                capacity = len(store['vectors'])
+                self._resize(store, max(min(capacity * 2, self.max_entries),
+                                        capacity + self.INITIAL_CAPACITY))
+            slot = store['size']
+            store['size'] += 1
+        
+        store['vectors'][slot] = vector
+        store['slots'][key] = slot
+    
+    def _resize(self, store: Dict, capacity: int) -> None:
+        """Grow the memory-mapped vector file to capacity rows"""
+        path = store['path'] / 'vectors.npy'
+        tmp_path = store['path'] / 'vectors.npy.tmp'
+        
+        vectors = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.float32,
+            shape=(capacity, store['dimension'])
+        )
+        if store['vectors'] is not None:
+            vectors[:len(store['vectors'])] = store['vectors']
+            del store['vectors']
+        vectors.flush()
+        del vectors
+        
+        tmp_path.replace(path)
+        store['vectors'] = np.load(path, mmap_mode='r+')
 
 
 class LineageRAGPipeline:
     """RAG pipeline for code lineage analysis"""
     
+    # Incremental updates refit corpus-dependent embedders on every chunk once
+    # this share of chunks was replaced, or this share of the new chunks' terms
+    # is missing from the fitted vocabulary
+    REFIT_CHANGED_SHARE = 0.2
+    REFIT_UNKNOWN_TERM_SHARE = 0.25
+    
     def __init__(self, llm_provider: str = "AWS Bedrock", 
                  model_id: str = "anthropic.claude-3-5-sonnet-20241022-v2:0",
                  aws_region: str = "us-east-1",
-                 api_key: Optional[str] = None):
+                 api_key: Optional[str] = None,
+                 sparse_embeddings: bool = False,
+                 embedding_options: Optional[Dict] = None,
+                 index_type: str = "flat",
+                 nlist: Optional[int] = None,
+                 nprobe: int = 8,
+                 hnsw_m: int = 32,
+                 ef_search: int = 64,
+                 embedder: Optional[Embedder] = None,
+                 embedding_cache: Optional[EmbeddingCache] = None):
         """
         Initialize RAG pipeline
         
@@ -107,7 +1222,24 @@ class LineageRAGPipeline:
             model_id: Model identifier
             aws_region: AWS region (for Bedrock)
             api_key: API key (for Anthropic API)
+            sparse_embeddings: Store TF-IDF vectors in a sparse matrix and
+                search it directly instead of building a dense FAISS index
+            embedding_options: Extra SimpleEmbedding arguments (min_df,
+                max_df, max_features, hash_features)
+            index_type: FAISS index type, one of INDEX_TYPES
+            nlist: Number of IVF clusters (default: 4 * sqrt(chunks),
+                capped so each cluster has enough training points)
+            nprobe: Number of IVF clusters visited per query
+            hnsw_m: Number of HNSW graph neighbors per vector
+            ef_search: HNSW search beam width
+            embedder: Embedder to use instead of the TF-IDF SimpleEmbedding
+            embedding_cache: Cache of chunk embeddings reused across
+                re-indexing runs, for embedders whose vectors do not depend
+                on the corpus (TF-IDF vectors do, so they are never cached)
         """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+        
         self.llm_provider = llm_provider
         self.model_id = model_id
         self.aws_region = aws_region
@@ -122,11 +1254,35 @@ class LineageRAGPipeline:
             print(f"Warning: {llm_provider} not available")
         
         # Document storage
-        self.chunks: List[DocumentChunk] = []
-        self.embedder = SimpleEmbedding()
+        self.chunks = ChunkStore()
+        self.embedder = embedder or SimpleEmbedding(
+            sparse=sparse_embeddings, **(embedding_options or {})
+        )
+        self.embedding_cache = embedding_cache
+        self.embedder.cache = embedding_cache
         
         # Vector index
         self.index = None
+        self.embeddings = None
+        self.index_type = index_type
+        # Type of the index actually built: IVF falls back to flat when
+        # there are too few vectors to train it
+        self.built_index_type = None
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        
+        # Table name -> referencing files/statements; chunks share its registry
+        self.table_index = TableIndex(self.chunks.registry)
+        self._chunk_positions: Dict[str, int] = {}
+        
+        # table.column -> upstream columns, resolved statically from the SQL
+        self.column_graph = ColumnLineageGraph()
+        
+        # Repository state the index was built from
+        self.repo_url = None
+        self.commit_sha = None
         
         # Statistics
         self.stats = {
@@ -137,59 +1293,338 @@ class LineageRAGPipeline:
             'total_chunks': 0
         }
     
-    def index_documents(self, parsed_files: List) -> None:
+    def index_documents(self, parsed_files: Iterable, batch_size: int = 512) -> None:
         """
         Index parsed documents into vector store
         
+        parsed_files may be a generator: files are chunked and tokenized in
+        batches and released once their chunks exist, so only the chunks and
+        term counts accumulate while the repository is being indexed.
+        
         Args:
-            parsed_files: List of ParsedFile objects
+            parsed_files: Iterable of ParsedFile objects
+            batch_size: Number of files chunked and tokenized per batch
         """
-        print(f"Indexing {len(parsed_files)} files...")
-        
-        # Update statistics
-        self.stats['total_files'] = len(parsed_files)
-        for pf in parsed_files:
-            if pf.file_type == 'sql':
-                self.stats['sql_files'] += 1
-            elif pf.file_type == 'ksh':
-                self.stats['ksh_files'] += 1
-            elif pf.file_type == 'bteq':
-                self.stats['bteq_files'] += 1
+        print("Indexing files...")
         
-        # Create chunks
-        all_chunks = []
+        self.table_index = TableIndex()
+        self.chunks = ChunkStore(self.table_index.registry)
+        self.column_graph = ColumnLineageGraph()
+        self.embedder.reset()
         
-        for parsed_file in parsed_files:
-            chunks = self._create_chunks(parsed_file)
-            all_chunks.extend(chunks)
+        parsed_files = iter(parsed_files)
+        while True:
+            batch = list(islice(parsed_files, batch_size))
+            if not batch:
+                break
+            
+            # Create chunks
+            batch_chunks = []
+            for parsed_file in batch:
+                batch_chunks.extend(self._create_chunks(parsed_file))
+                self.table_index.add_file(parsed_file)
+                self.column_graph.add_file(parsed_file)
+            del batch
+            
+            self.embedder.partial_fit([chunk.content for chunk in batch_chunks])
+            self.chunks.extend(batch_chunks)
         
-        self.chunks = all_chunks
-        self.stats['total_chunks'] = len(all_chunks)
+        self._update_stats()
+        self._update_chunk_positions()
         
-        print(f"Created {len(all_chunks)} chunks")
+        print(f"Created {len(self.chunks)} chunks from {self.stats['total_files']} files")
+        print(f"Resolved {len(self.column_graph)} column lineage edges")
         
         # Create embeddings
-        texts = [chunk.content for chunk in all_chunks]
-        self.embedder.fit(texts)
+        self._set_embeddings(self.embedder.finish_fit())
+    
+    def _set_embeddings(self, embeddings) -> None:
+        """
+        Store freshly fitted embeddings and build the vector index over them
+        
+        Args:
+            embeddings: Embedder output for every chunk, in row order
+        """
+        self.embeddings = self.embedder.quantize(embeddings)
+        self.index = None
+        self.built_index_type = None
+        self._flush_embedding_cache()
         
-        embeddings = []
-        for chunk in all_chunks:
-            embedding = self.embedder.embed(chunk.content)
-            chunk.embedding = embedding
-            embeddings.append(embedding)
+        if self.embedder.sparse:
+            # Sparse document-term matrix is searched directly
+            print(f"Built sparse TF-IDF matrix with {self.embeddings.nnz} non-zeros")
+            return
         
         # Build vector index
-        if FAISS_AVAILABLE and embeddings:
-            embeddings_array = np.array(embeddings).astype('float32')
-            dimension = embeddings_array.shape[1]
-            
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(embeddings_array)
+        if FAISS_AVAILABLE and self.chunks:
+            self.index = self._build_index(embeddings)
             
-            print(f"Built FAISS index with {len(embeddings)} vectors")
+            print(f"Built FAISS {self.built_index_type} index with {len(self.chunks)} vectors")
         else:
             print("Using simple similarity search")
     
+    def update_documents(self, parsed_files: List, removed_paths: List[str]) -> None:
+        """
+        Incrementally re-index changed files
+        
+        Chunks of removed and re-parsed files are dropped from the chunk list,
+        embedding matrix and vector index, and chunks for the re-parsed files
+        are embedded against the existing vocabulary and appended. For
+        corpus-dependent embedders (TF-IDF), the vocabulary and IDF are refit
+        on all chunks instead once the change passes REFIT_CHANGED_SHARE or
+        REFIT_UNKNOWN_TERM_SHARE; below that, new terms are ignored.
+        
+        Args:
+            parsed_files: ParsedFile objects for added or modified files
+            removed_paths: Repository-relative paths whose existing chunks
+                should be dropped, e.g. deleted files
+        """
+        stale_paths = set(removed_paths) | {pf.file_path for pf in parsed_files}
+        
+        keep_rows = []
+        drop_rows = []
+        for i, file_path in enumerate(self.chunks.column('file_path')):
+            if file_path in stale_paths:
+                drop_rows.append(i)
+            else:
+                keep_rows.append(i)
+        
+        new_chunks = []
+        for parsed_file in parsed_files:
+            new_chunks.extend(self._create_chunks(parsed_file))
+        
+        print(f"Re-indexing {len(parsed_files)} changed files: "
+              f"-{len(drop_rows)} / +{len(new_chunks)} chunks")
+        
+        self.chunks = self.chunks.select(keep_rows)
+        self.chunks.extend(new_chunks)
+        self._update_stats()
+        self._update_chunk_positions()
+        
+        for file_path in stale_paths:
+            self.table_index.remove_file(file_path)
+            self.column_graph.remove_file(file_path)
+        for parsed_file in parsed_files:
+            self.table_index.add_file(parsed_file)
+            self.column_graph.add_file(parsed_file)
+        
+        if self.embeddings is None:
+            return
+        
+        new_texts = [chunk.content for chunk in new_chunks]
+        changed = len(drop_rows) + len(new_chunks)
+        if self._needs_refit(changed, len(keep_rows) + len(drop_rows), new_texts):
+            self._refit_embeddings()
+            return
+        
+        new_embeddings = self.embedder.transform_cached(new_texts)
+        self._flush_embedding_cache()
+        
+        if self.embedder.sparse:
+            self.embeddings = sparse.vstack(
+                [self.embeddings[keep_rows], new_embeddings], format='csr'
+            )
+            return
+        
+        self.embeddings = np.vstack([
+            self.embeddings[keep_rows], self.embedder.quantize(new_embeddings)
+        ])
+        
+        if FAISS_AVAILABLE and self.index is not None:
+            if self.index_type == 'flat':
+                # Flat indexes compact in order on removal, keeping ids aligned with chunks
+                if drop_rows:
+                    self.index.remove_ids(np.array(drop_rows, dtype=np.int64))
+                if new_chunks:
+                    self.index.add(new_embeddings)
+            else:
+                # IVF keeps stale ids and HNSW cannot remove, so rebuild
+                self.index = self._build_index(self.embeddings)
+    
+    def _needs_refit(self, changed: int, previous: int, new_texts: List[str]) -> bool:
+        """
+        Decide whether an incremental update should refit the embedder
+        
+        Args:
+            changed: Number of chunks dropped plus added
+            previous: Number of chunks before the update
+            new_texts: Texts of the added chunks
+        
+        Returns:
+            True if the fitted state is too stale to embed new_texts against
+        """
+        if not self.embedder.corpus_dependent:
+            return False
+        if changed > self.REFIT_CHANGED_SHARE * max(previous, 1):
+            return True
+        
+        return self.embedder.unknown_term_share(new_texts) > self.REFIT_UNKNOWN_TERM_SHARE
+    
+    def _refit_embeddings(self, batch_size: int = 4096) -> None:
+        """
+        Refit the embedder on every stored chunk and rebuild the index
+        
+        Args:
+            batch_size: Number of chunks tokenized per batch
+        """
+        print(f"Refitting embeddings on all {len(self.chunks)} chunks")
+        
+        self.embedder.reset()
+        for start in range(0, len(self.chunks), batch_size):
+            stop = min(start + batch_size, len(self.chunks))
+            self.embedder.partial_fit([self.chunks.text(position) for position in range(start, stop)])
+        
+        self._set_embeddings(self.embedder.finish_fit())
+    
+    def _flush_embedding_cache(self) -> None:
+        """Persist cached embeddings and report the hit rate"""
+        if self.embedding_cache is None or self.embedder.cache_version() is None:
+            return
+        
+        self.embedding_cache.flush()
+        print(f"Embedding cache: {self.embedding_cache.hits} hits, "
+              f"{self.embedding_cache.misses} misses")
+    
+    def _build_index(self, embeddings: np.ndarray):
+        """
+        Build and fill a FAISS inner-product index of the configured type
+        
+        IVF falls back to a flat index when there are too few vectors to
+        train it; built_index_type records the type actually built. Vectors are encoded with a scalar quantizer matching the embedder's
+        storage dtype, so float16/int8 storage also shrinks the index.
+        
+        Args:
+            embeddings: L2-normalized (chunks x dimension) matrix, float32 or
+                in the embedder's storage dtype
+        
+        Returns:
+            FAISS index
+        """
+        embeddings = np.ascontiguousarray(self.embedder.dequantize(embeddings))
+        count, dimension = embeddings.shape
+        
+        qtype = self._scalar_quantizer_type()
+        metric = faiss.METRIC_INNER_PRODUCT
+        sample_size = count
+        
+        self.built_index_type = self.index_type
+        if self.index_type == 'ivf' and count < 39:
+            # FAISS wants roughly 39+ training points per cluster
+            print(f"Too few vectors ({count}) to train an IVF index, building a flat index")
+            self.built_index_type = 'flat'
+        
+        if self.built_index_type == 'hnsw':
+            if qtype is None:
+                index = faiss.IndexHNSWFlat(dimension, self.hnsw_m, metric)
+            else:
+                index = faiss.IndexHNSWSQ(dimension, qtype, self.hnsw_m, metric)
+        elif self.built_index_type == 'ivf':
+            nlist = self.nlist or int(4 * np.sqrt(count))
+            nlist = max(1, min(nlist, count // 39))
+            
+            quantizer = faiss.IndexFlatIP(dimension)
+            if qtype is None:
+                index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+            else:
+                index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, qtype, metric)
+            
+            # Train the coarse quantizer on a sample rather than every vector
+            sample_size = min(count, nlist * 64)
+        elif qtype is None:
+            index = faiss.IndexFlatIP(dimension)
+        else:
+            index = faiss.IndexScalarQuantizer(dimension, qtype, metric)
+        
+        if not index.is_trained:
+            sample_size = min(sample_size, 100000)
+            sample = np.random.default_rng(0).choice(count, sample_size, replace=False)
+            index.train(embeddings[np.sort(sample)])
+        
+        index.add(embeddings)
+        self._set_search_params(index)
+        
+        return index
+    
+    def _scalar_quantizer_type(self):
+        """FAISS scalar quantizer for the embedder's storage dtype (None for float32)"""
+        if self.embedder.storage_dtype == 'float16':
+            return faiss.ScalarQuantizer.QT_fp16
+        if self.embedder.storage_dtype == 'int8':
+            return faiss.ScalarQuantizer.QT_8bit
+        return None
+    
+    def _set_search_params(self, index) -> None:
+        """Apply nprobe/efSearch to a FAISS index"""
+        if hasattr(index, 'nprobe'):
+            index.nprobe = self.nprobe
+        if hasattr(index, 'hnsw'):
+            index.hnsw.efSearch = self.ef_search
+    
+    def get_chunks_for_table(self, table_name: str) -> List[DocumentChunk]:
+        """
+        Get statement chunks referencing a table via the table index
+        
+        Args:
+            table_name: Table name, qualified or bare
+        
+        Returns:
+            List of DocumentChunk objects
+        """
+        return self._statement_chunks(self.table_index.statements_for_table(table_name))
+    
+    def get_writer_chunks(self, table_name: str) -> List[DocumentChunk]:
+        """
+        Get statement chunks that write a table (INSERT/CREATE/UPDATE/MERGE)
+        
+        Args:
+            table_name: Table name, qualified or bare
+        
+        Returns:
+            List of DocumentChunk objects
+        """
+        return self._statement_chunks(self.table_index.writers_for_table(table_name))
+    
+    def _statement_chunks(self, statements: List) -> List[DocumentChunk]:
+        """Map (file_path, statement_id) pairs to their chunks"""
+        chunks = []
+        
+        for file_path, stmt_id in statements:
+            position = self._chunk_positions.get(f"{file_path}:stmt_{stmt_id}")
+            if position is not None:
+                chunks.append(self.chunks[position])
+        
+        return chunks
+    
+    def _update_chunk_positions(self) -> None:
+        """Rebuild the chunk id -> position lookup"""
+        self._chunk_positions = {
+            chunk_id: i for i, chunk_id in enumerate(self.chunks.chunk_ids())
+        }
+    
+    def _update_stats(self) -> None:
+        """Recompute statistics from the current chunks"""
+        self.stats = {
+            'total_files': 0,
+            'sql_files': 0,
+            'ksh_files': 0,
+            'bteq_files': 0,
+            'total_chunks': len(self.chunks)
+        }
+        
+        chunk_types = self.chunks.column('chunk_type')
+        file_types = self.chunks.column('file_type')
+        for chunk_type, file_type in zip(chunk_types, file_types):
+            if chunk_type != 'metadata':
+                continue
+            
+            self.stats['total_files'] += 1
+            if file_type == 'sql':
+                self.stats['sql_files'] += 1
+            elif file_type == 'ksh':
+                self.stats['ksh_files'] += 1
+            elif file_type == 'bteq':
+                self.stats['bteq_files'] += 1
+    
     def _create_chunks(self, parsed_file) -> List[DocumentChunk]:
         """Create chunks from parsed file"""
         chunks = []
@@ -203,7 +1638,7 @@ Tables Referenced: {', '.join(parsed_file.tables_referenced)}
         
         chunks.append(DocumentChunk(
             chunk_id=f"{parsed_file.file_path}:metadata",
-            content=metadata_content + "\n" + parsed_file.content[:1000],
+            content=metadata_content + "\n" + parsed_file.read(0, 1000),
             metadata={
                 'file_path': parsed_file.file_path,
                 'file_type': parsed_file.file_type,
@@ -216,22 +1651,32 @@ Tables Referenced: {', '.join(parsed_file.tables_referenced)}
         for stmt in parsed_file.sql_statements:
             chunk_content = f"""
 File: {parsed_file.file_path}
-Statement Type: {stmt['type']}
-Tables: {', '.join(stmt['tables'])}
+Lines: {stmt.start_line}-{stmt.end_line}
+Statement Type: {stmt.type}
+Tables: {', '.join(stmt.tables)}
 SQL:
-{stmt['content']}
+{stmt.content}
 """
             
             chunks.append(DocumentChunk(
-                chunk_id=f"{parsed_file.file_path}:stmt_{stmt['statement_id']}",
+                chunk_id=f"{parsed_file.file_path}:stmt_{stmt.statement_id}",
                 content=chunk_content,
                 metadata={
                     'file_path': parsed_file.file_path,
                     'file_type': parsed_file.file_type,
                     'chunk_type': 'statement',
-                    'statement_type': stmt['type'],
-                    'tables': stmt['tables'],
-                    'columns': stmt.get('columns', [])
+                    'statement_type': stmt.type,
+                    'tables': stmt.tables,
+                    'target_table': stmt.target_table,
+                    'source_tables': stmt.source_tables,
+                    'columns': [
+                        {'name': name, 'expression': expression}
+                        for name, expression in stmt.columns
+                    ],
+                    'start_line': stmt.start_line,
+                    'end_line': stmt.end_line,
+                    'start_offset': stmt.start_offset,
+                    'end_offset': stmt.end_offset
                 }
             ))
         
@@ -251,26 +1696,68 @@ SQL:
         if not self.chunks:
             return []
         
-        query_embedding = self.embedder.embed(query)
+        return [self.chunks[idx] for idx in self._search([query], top_k)[0]]
+    
+    def retrieve_many(self, queries: List[str], top_k: int = 10) -> List[DocumentChunk]:
+        """
+        Retrieve relevant chunks for several queries with one batched search
+        
+        Args:
+            queries: Search queries
+            top_k: Number of results per query
+        
+        Returns:
+            List of unique DocumentChunk objects, in query order then rank
+        """
+        if not self.chunks or not queries:
+            return []
+        
+        results = []
+        seen = set()
+        
+        for row in self._search(queries, top_k):
+            for idx in row:
+                if idx not in seen:
+                    seen.add(idx)
+                    results.append(self.chunks[idx])
         
-        if FAISS_AVAILABLE and self.index:
+        return results
+    
+    def _search(self, queries: List[str], top_k: int) -> List[List[int]]:
+        """
+        Score all queries against the index in one operation
+        
+        Args:
+            queries: Search queries
+            top_k: Number of results per query
+        
+        Returns:
+            Chunk positions per query, best match first
+        """
+        top_k = min(top_k, len(self.chunks))
+        if top_k <= 0:
+            return [[] for _ in queries]
+        
+        # One (queries x vocab) matrix for the whole batch
+        query_matrix = self.embedder.transform(queries)
+        
+        if self.embedder.sparse:
+            # Sparse matrix product over all chunks
+            similarities = (self.embeddings @ query_matrix.T).T.toarray()
+        elif FAISS_AVAILABLE and self.index is not None:
             # Use FAISS for fast search
-            query_vector = query_embedding.reshape(1, -1).astype('float32')
-            distances, indices = self.index.search(query_vector, min(top_k, len(self.chunks)))
-            
-            results = [self.chunks[idx] for idx in indices[0]]
+            distances, indices = self.index.search(query_matrix, top_k)
+            return [[int(idx) for idx in row if idx >= 0] for row in indices]
         else:
             # Simple cosine similarity
-            similarities = []
-            for chunk in self.chunks:
-                sim = np.dot(query_embedding, chunk.embedding)
-                similarities.append(sim)
-            
-            # Get top-k
-            top_indices = np.argsort(similarities)[-top_k:][::-1]
-            results = [self.chunks[idx] for idx in top_indices]
+            similarities = query_matrix @ self.embeddings.T
         
-        return results
+        # Get top-k per query
+        top_indices = np.argpartition(-similarities, top_k - 1, axis=1)[:, :top_k]
+        top_scores = np.take_along_axis(similarities, top_indices, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        
+        return np.take_along_axis(top_indices, order, axis=1).tolist()
     
     def query_llm(self, prompt: str, max_tokens: int = 4000) -> str:
         """
@@ -336,4 +1823,143 @@ SQL:
     
     def get_stats(self) -> Dict:
         """Get indexing statistics"""
-        return self.stats
\ No newline at end of file
+        return self.stats
+    
+    @staticmethod
+    def index_path(cache_dir: Path, repo_url: str, commit_sha: str) -> Path:
+        """
+        Get the directory holding the saved index for a repository commit
+        
+        Args:
+            cache_dir: Root directory for saved indexes
+            repo_url: Repository URL
+            commit_sha: Indexed commit SHA
+        
+        Returns:
+            Path to index directory
+        """
+        repo_name = repo_url.rstrip('/').split('/')[-1]
+        if repo_name.endswith('.git'):
+            repo_name = repo_name[:-4]
+        
+        key = hashlib.sha1(f"{repo_url}@{commit_sha}".encode('utf-8')).hexdigest()[:16]
+        
+        return Path(cache_dir) / f"{repo_name}-{key}"
+    
+    def save(self, path: Path, repo_url: Optional[str] = None,
+             commit_sha: Optional[str] = None) -> None:
+        """
+        Persist chunks, vocabulary/IDF, embeddings and vector index
+        
+        Args:
+            path: Target directory (replaced if it exists)
+            repo_url: Repository URL the index was built from
+            commit_sha: Commit SHA the index was built from
+        """
+        path = Path(path)
+        if repo_url is not None:
+            self.repo_url = repo_url
+        if commit_sha is not None:
+            self.commit_sha = commit_sha
+        
+        # Write into a scratch directory so readers never see a partial index
+        tmp_path = path.with_name(path.name + '.tmp')
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        tmp_path.mkdir(parents=True)
+        
+        self.chunks.save(tmp_path)
+        self.embedder.save_state(tmp_path)
+        
+        with open(tmp_path / 'table_index.json', 'w', encoding='utf-8') as f:
+            json.dump(self.table_index.to_dict(), f)
+        
+        with open(tmp_path / 'column_lineage.json', 'w', encoding='utf-8') as f:
+            json.dump(self.column_graph.to_dict(), f)
+        
+        if self.embeddings is not None:
+            if self.embedder.sparse:
+                sparse.save_npz(tmp_path / 'embeddings.npz', self.embeddings)
+            else:
+                np.save(tmp_path / 'embeddings.npy', np.asarray(self.embeddings))
+        
+        if FAISS_AVAILABLE and self.index is not None:
+            faiss.write_index(self.index, str(tmp_path / 'faiss.index'))
+        
+        with open(tmp_path / 'manifest.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'format_version': INDEX_FORMAT_VERSION,
+                'repo_url': self.repo_url,
+                'commit_sha': self.commit_sha,
+                'embedder': self.embedder.get_config(),
+                'index_type': self.built_index_type,
+                'requested_index_type': self.index_type,
+                'stats': self.stats
+            }, f, indent=2)
+        
+        if path.exists():
+            shutil.rmtree(path)
+        tmp_path.rename(path)
+        
+        print(f"Saved index with {len(self.chunks)} chunks to {path}")
+    
+    def load(self, path: Path) -> bool:
+        """
+        Restore an index written by save()
+        
+        Args:
+            path: Index directory
+        
+        Returns:
+            True if loaded, False if missing or built with another configuration
+        """
+        path = Path(path)
+        manifest_path = path / 'manifest.json'
+        if not manifest_path.exists():
+            return False
+        
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        if manifest.get('format_version') != INDEX_FORMAT_VERSION:
+            print(f"Ignoring index at {path}: unsupported format")
+            return False
+        if manifest.get('embedder') != self.embedder.get_config():
+            print(f"Ignoring index at {path}: built with a different embedding mode")
+            return False
+        if manifest.get('requested_index_type', manifest.get('index_type')) != self.index_type:
+            print(f"Ignoring index at {path}: built with a different index type")
+            return False
+        
+        with open(path / 'table_index.json', 'r', encoding='utf-8') as f:
+            self.table_index = TableIndex.from_dict(json.load(f))
+        
+        with open(path / 'column_lineage.json', 'r', encoding='utf-8') as f:
+            self.column_graph = ColumnLineageGraph.from_dict(json.load(f))
+        
+        self.chunks = ChunkStore.load(path, self.table_index.registry)
+        self.embedder.load_state(path)
+        self._update_chunk_positions()
+        
+        self.embeddings = None
+        if self.embedder.sparse:
+            if (path / 'embeddings.npz').exists():
+                self.embeddings = sparse.load_npz(path / 'embeddings.npz').tocsr()
+        elif (path / 'embeddings.npy').exists():
+            # Memory-map so a warm start does not copy the matrix up front
+            self.embeddings = np.load(path / 'embeddings.npy', mmap_mode='r')
+        
+        self.index = None
+        self.built_index_type = None
+        if FAISS_AVAILABLE and (path / 'faiss.index').exists():
+            # Memory-map so sessions serving the same commit share the page cache
+            self.index = faiss.read_index(str(path / 'faiss.index'), faiss.IO_FLAG_MMAP)
+            self.built_index_type = manifest.get('index_type')
+            self._set_search_params(self.index)
+        
+        self.repo_url = manifest.get('repo_url')
+        self.commit_sha = manifest.get('commit_sha')
+        self.stats = manifest.get('stats', self.stats)
+        
+        print(f"Loaded index with {len(self.chunks)} chunks from {path}")
+        return True
@@ -90,11 +90,31 @@ class LineageVisualizer:
         return nodes
     
     def _extract_edges(self, lineage_result: Dict) -> list:
-        """Extract edges from lineage result"""
+        """
+        Extract edges from lineage result
+        
+        Steps listing their 'sources' are linked to exactly those columns;
+        results without them (e.g. unparsed LLM answers) are read as a
+        linear chain.
+        """
         edges = []
         
         lineage_chain = lineage_result.get('lineage_chain', [])
         
+        if any('sources' in step for step in lineage_chain):
+            seen = set()
+            for step in lineage_chain:
+                target_id = f"{step.get('table', 'Unknown')}.{step.get('column', 'Unknown')}"
+                for source_id in step.get('sources', []):
+                    if (source_id, target_id) not in seen:
+                        seen.add((source_id, target_id))
+                        edges.append({
+                            'source': source_id,
+                            'target': target_id,
+                            'label': step.get('operation', '')
+                        })
+            return edges
+        
         for i in range(len(lineage_chain) - 1):
             source_step = lineage_chain[i]
             target_step = lineage_chain[i + 1]
@@ -115,7 +135,7 @@ class LineageVisualizer:
         """Generate HTML visualization"""
         
         # Create simple hierarchical layout
-        html = f"""
+        page = f"""
 <!DOCTYPE html>
 <html>
 <head>
@@ -194,13 +214,18 @@ class LineageVisualizer:
         # Sort nodes by level
         sorted_nodes = sorted(nodes, key=lambda x: x.get('level', 0))
         
+        # Upstream columns of each node
+        upstream = {}
+        for edge in edges:
+            upstream.setdefault(edge['target'], []).append(edge['source'])
+        
         # Render nodes
-        for i, node in enumerate(sorted_nodes):
+        for node in sorted_nodes:
             node_type = node.get('type', 'intermediate')
             node_id = html.escape(node.get('id', ''))
             operation = node.get('operation', '')
             
-            html += f"""
+            page += f"""
             <div class="node node-{node_type}">
                 <div>{node_id}</div>
                 {f'<div class="node-details">{html.escape(operation)}</div>' if operation else ''}
@@ -208,12 +233,13 @@ class LineageVisualizer:
 """
             
             # Add edge indicator
-            if i < len(sorted_nodes) - 1:
-                html += f"""
-            <div class="edge">⬇️ derived from</div>
+            if upstream.get(node.get('id')):
+                sources = ', '.join(html.escape(source) for source in upstream[node['id']])
+                page += f"""
+            <div class="edge">⬇️ derived from {sources}</div>
 """
         
-        html += """
+        page += """
         </div>
         
         <div class="legend">
@@ -227,7 +253,7 @@ class LineageVisualizer:
 </html>
 """
         
-        return html
+        return page
     
     def create_ascii_tree(self, lineage_result: Dict) -> str:
         """
@@ -242,19 +268,27 @@ class LineageVisualizer:
         lines = []
         
         target = lineage_result.get('target', {})
-        lines.append(f"📊 {target.get('table', 'Target')}.{target.get('column', 'Column')}")
+        target_id = f"{target.get('table', 'Target')}.{target.get('column', 'Column')}"
+        lines.append(f"📊 {target_id}")
         
-        lineage_chain = lineage_result.get('lineage_chain', [])
+        upstream = {}
+        for edge in self._extract_edges(lineage_result):
+            upstream.setdefault(edge['target'], []).append(edge)
         
-        for i, step in enumerate(lineage_chain[1:], 1):
-            indent = "  " * i
-            table = step.get('table', 'Unknown')
-            column = step.get('column', 'Unknown')
-            operation = step.get('operation', '')
+        # Depth-first from the target, each column expanded once
+        visited = {target_id}
+        stack = [(edge, 1) for edge in reversed(upstream.get(target_id, []))]
+        while stack:
+            edge, depth = stack.pop()
+            indent = "  " * depth
             
-            lines.append(f"{indent}└── {table}.{column}")
-            if operation:
-                lines.append(f"{indent}    ({operation})")
+            lines.append(f"{indent}└── {edge['source']}")
+            if edge['label']:
+                lines.append(f"{indent}    ({edge['label']})")
+            
+            if edge['source'] not in visited:
+                visited.add(edge['source'])
+                stack.extend((parent, depth + 1) for parent in reversed(upstream.get(edge['source'], [])))
         
         return "\n".join(lines)
     
@@ -271,17 +305,18 @@ class LineageVisualizer:
         lines = ["graph TD"]
         
         # Add nodes and edges
-        lineage_chain = lineage_result.get('lineage_chain', [])
+        node_ids = {}
+        for i, node in enumerate(self._extract_nodes(lineage_result)):
+            node_ids[node['id']] = f"N{i}"
+            lines.append(f"    N{i}[\"{node['label']}\"]")
+            if node['type'] == 'target':
+                lines.append(f"    style N{i} fill:#FF6B35,color:#fff")
         
-        for i, step in enumerate(lineage_chain):
-            node_id = f"N{i}"
-            label = f"{step.get('table', 'Unknown')}.{step.get('column', 'Unknown')}"
-            
-            if i == 0:
-                lines.append(f"    {node_id}[\"{label}\"]")
-                lines.append(f"    style {node_id} fill:#FF6B35,color:#fff")
-            else:
-                lines.append(f"    {node_id}[\"{label}\"]")
-                lines.append(f"    N{i-1} --> |{step.get('operation', '')}| {node_id}")
+        for edge in self._extract_edges(lineage_result):
+            for node_id in (edge['source'], edge['target']):
+                if node_id not in node_ids:
+                    node_ids[node_id] = f"N{len(node_ids)}"
+                    lines.append(f"    {node_ids[node_id]}[\"{node_id}\"]")
+            lines.append(f"    {node_ids[edge['target']]} --> |{edge['label']}| {node_ids[edge['source']]}")
         
         return "\n".join(lines)
\ No newline at end of file
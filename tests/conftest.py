@@ -0,0 +1,9 @@
+"""
+Shared pytest setup
+"""
+
+import sys
+from pathlib import Path
+
+# Add local modules to path, as app.py does
+sys.path.append(str(Path(__file__).parent.parent))
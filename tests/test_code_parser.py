@@ -0,0 +1,206 @@
+"""
+Tests for statement splitting and table references in the code parser
+"""
+
+import pytest
+
+from src.code_parser import TableIndex, TeradataCodeParser
+
+
+def parse(tmp_path, content, name='script.sql'):
+    """Write content to a file in tmp_path and parse it"""
+    path = tmp_path / name
+    path.write_bytes(content.encode('utf-8'))
+    return TeradataCodeParser(tmp_path).parse_file(path)
+
+
+def statement_texts(parsed):
+    return [' '.join(stmt.content.split()) for stmt in parsed.sql_statements]
+
+
+class TestStatementSplitter:
+    """Statement boundaries, line numbers and offsets"""
+    
+    def test_splits_on_semicolons_with_lines(self, tmp_path):
+        parsed = parse(tmp_path, (
+            "INSERT INTO db.a SELECT * FROM db.b;\n"
+            "\n"
+            "DELETE FROM db.a\n"
+            "WHERE x = 1;\n"
+        ))
+        
+        assert statement_texts(parsed) == [
+            "INSERT INTO db.a SELECT * FROM db.b",
+            "DELETE FROM db.a WHERE x = 1",
+        ]
+        assert [(s.start_line, s.end_line) for s in parsed.sql_statements] == [(1, 1), (3, 4)]
+    
+    def test_procedure_body_stays_one_statement(self, tmp_path):
+        parsed = parse(tmp_path, (
+            "REPLACE PROCEDURE db.load_orders()\n"
+            "BEGIN\n"
+            "    INSERT INTO db.orders SELECT * FROM db.stage_orders;\n"
+            "    UPDATE db.orders SET loaded = 1;\n"
+            "END;\n"
+            "SELECT COUNT(*) FROM db.orders;\n"
+        ))
+        
+        texts = statement_texts(parsed)
+        assert len(texts) == 2
+        assert texts[0].startswith("REPLACE PROCEDURE") and texts[0].endswith("END")
+        assert texts[1] == "SELECT COUNT(*) FROM db.orders"
+    
+    def test_end_case_does_not_close_procedure(self, tmp_path):
+        parsed = parse(tmp_path, (
+            "REPLACE PROCEDURE db.route(IN mode INTEGER)\n"
+            "BEGIN\n"
+            "    CASE mode\n"
+            "        WHEN 1 THEN INSERT INTO db.a SELECT * FROM db.src;\n"
+            "        ELSE INSERT INTO db.b SELECT * FROM db.src;\n"
+            "    END CASE;\n"
+            "    DELETE FROM db.src;\n"
+            "END;\n"
+            "SELECT 1 FROM db.a;\n"
+        ))
+        
+        texts = statement_texts(parsed)
+        assert len(texts) == 2
+        assert "DELETE FROM db.src" in texts[0]
+        assert texts[1] == "SELECT 1 FROM db.a"
+    
+    def test_period_functions_are_not_blocks(self, tmp_path):
+        parsed = parse(tmp_path, (
+            "SELECT BEGIN(vt) FROM t1; INSERT INTO dw.z (q) SELECT r FROM stg.w;\n"
+            "REPLACE PROCEDURE db.load()\n"
+            "BEGIN\n"
+            "    INSERT INTO db.a (x) SELECT END (vt) FROM db.b;\n"
+            "    DELETE FROM db.b;\n"
+            "END;\n"
+            "SELECT 1 FROM db.a;\n"
+        ))
+        
+        texts = statement_texts(parsed)
+        assert texts[:2] == [
+            "SELECT BEGIN(vt) FROM t1",
+            "INSERT INTO dw.z (q) SELECT r FROM stg.w",
+        ]
+        assert len(texts) == 4
+        assert "DELETE FROM db.b" in texts[2]
+        assert texts[3] == "SELECT 1 FROM db.a"
+    
+    def test_case_expression_outside_procedure(self, tmp_path):
+        parsed = parse(tmp_path, (
+            "SELECT CASE WHEN x > 0 THEN 'pos' ELSE 'neg' END FROM db.t;\n"
+            "SELECT y FROM db.u;\n"
+        ))
+        
+        assert len(parsed.sql_statements) == 2
+    
+    def test_semicolons_in_strings_and_comments(self, tmp_path):
+        parsed = parse(tmp_path, (
+            "SELECT 'a;b', \"odd;name\" FROM db.t; -- trailing; comment\n"
+            "/* block; comment */ SELECT x FROM db.u;\n"
+        ))
+        
+        texts = statement_texts(parsed)
+        assert len(texts) == 2
+        assert texts[0] == "SELECT 'a;b', \"odd;name\" FROM db.t"
+        assert texts[1].endswith("SELECT x FROM db.u")
+    
+    def test_bteq_dot_commands_are_skipped(self, tmp_path):
+        parsed = parse(tmp_path, (
+            ".LOGON tdprod/etl_user,secret;\n"
+            "INSERT INTO db.a SELECT * FROM db.b;\n"
+            ".IF ERRORCODE <> 0 THEN .QUIT 8\n"
+            "DELETE FROM db.b WHERE x = 1;\n"
+            ".LOGOFF\n"
+        ), name='load.bteq')
+        
+        assert statement_texts(parsed) == [
+            "INSERT INTO db.a SELECT * FROM db.b",
+            "DELETE FROM db.b WHERE x = 1",
+        ]
+        assert parsed.metadata['logon'] is not None
+    
+    def test_offsets_match_crlf_file(self, tmp_path):
+        parsed = parse(tmp_path, "SELECT a\r\nFROM db.t;\r\nSELECT b FROM db.u;\r\n")
+        
+        for stmt in parsed.sql_statements:
+            assert parsed.read(stmt.start_offset, stmt.end_offset) == stmt.content
+        assert parsed.sql_statements[1].start_line == 3
+    
+    def test_shell_script_without_sql_has_no_statements(self, tmp_path):
+        parsed = parse(tmp_path, "#!/bin/ksh\necho 'done'; exit 0;\n", name='run.ksh')
+        
+        assert parsed.sql_statements == []
+        assert parsed.metadata['sql_blocks'] == 0
+    
+    def test_shell_heredoc_statements(self, tmp_path):
+        parsed = parse(tmp_path, (
+            "#!/bin/ksh\n"
+            "bteq <<EOF\n"
+            "INSERT INTO db.a SELECT * FROM db.b;\n"
+            "EOF\n"
+        ), name='run.ksh')
+        
+        assert statement_texts(parsed) == ["INSERT INTO db.a SELECT * FROM db.b"]
+        assert parsed.sql_statements[0].start_line == 3
+
+
+class TestTableReferences:
+    """Statement types and written tables"""
+    
+    @pytest.mark.parametrize('sql, statement_type, target', [
+        ("INS INTO db.tgt SELECT * FROM db.src", 'INSERT', 'DB.TGT'),
+        ("UPD db.tgt SET x = 1 WHERE y = 2", 'UPDATE', 'DB.TGT'),
+        ("CREATE VOLATILE TABLE vt_orders AS (SELECT * FROM db.src) WITH DATA",
+         'CREATE', 'VT_ORDERS'),
+        ("CREATE GLOBAL TEMPORARY TABLE db.gtt (x INTEGER)", 'CREATE', 'DB.GTT'),
+        ("REPLACE VIEW db.v_orders AS SELECT * FROM db.src", 'REPLACE', 'DB.V_ORDERS'),
+    ])
+    def test_target_table(self, tmp_path, sql, statement_type, target):
+        parsed = parse(tmp_path, sql + ";\n")
+        stmt = parsed.sql_statements[0]
+        
+        assert stmt.type == statement_type
+        assert stmt.target_table == target
+    
+    def test_procedure_body_targets_are_writers(self, tmp_path):
+        parsed = parse(tmp_path, (
+            "REPLACE PROCEDURE db.load()\n"
+            "BEGIN\n"
+            "    INSERT INTO dw.x SELECT * FROM stg.q;\n"
+            "    MERGE INTO dw.y t USING stg.q s ON t.id = s.id\n"
+            "    WHEN MATCHED THEN UPDATE SET v = s.v;\n"
+            "END;\n"
+        ))
+        stmt = parsed.sql_statements[0]
+        
+        assert stmt.target_table is None
+        assert stmt.target_tables == ['DW.X', 'DW.Y']
+        
+        index = TableIndex()
+        index.add_file(parsed)
+        assert index.writers_for_table('dw.x') == [(parsed.file_path, 0)]
+        assert index.writers_for_table('stg.q') == []
+    
+    def test_pass_through_view_is_an_alias(self, tmp_path):
+        load = parse(tmp_path, "INSERT INTO db_t.orders SELECT * FROM stg.orders;\n", name='load.sql')
+        views = parse(tmp_path, (
+            "REPLACE VIEW db_v.orders AS LOCKING ROW FOR ACCESS SELECT * FROM db_t.orders;\n"
+            "REPLACE VIEW db_v.open_orders AS SELECT * FROM db_t.orders WHERE status = 'O';\n"
+        ), name='views.sql')
+        
+        index = TableIndex()
+        index.add_file(load)
+        index.add_file(views)
+        
+        assert index.resolve('db_v.orders') == ['DB_T.ORDERS']
+        assert index.writers_for_table('db_v.orders') == [('load.sql', 0)]
+        assert index.resolve('db_v.open_orders') == ['DB_V.OPEN_ORDERS']
+        
+        restored = TableIndex.from_dict(index.to_dict())
+        assert restored.resolve('db_v.orders') == ['DB_T.ORDERS']
+        
+        restored.remove_file('views.sql')
+        assert restored.resolve('db_v.orders') == []
@@ -0,0 +1,253 @@
+"""
+Tests for static column lineage extraction and the column lineage graph
+"""
+
+from src.code_parser import TableIndex, TeradataCodeParser
+from src.column_lineage import ColumnLineageGraph
+
+
+def build_graph(tmp_path, content, name='etl.sql'):
+    """Parse content as one file and load it into a new graph"""
+    path = tmp_path / name
+    path.write_text(content, encoding='utf-8')
+    parsed = TeradataCodeParser(tmp_path).parse_file(path)
+    
+    graph = ColumnLineageGraph()
+    graph.add_file(parsed)
+    return graph, parsed
+
+
+def parse_files(tmp_path, files):
+    """Parse {name: content} files in order"""
+    parser = TeradataCodeParser(tmp_path)
+    parsed = []
+    for name, content in files.items():
+        path = tmp_path / name
+        path.write_text(content, encoding='utf-8')
+        parsed.append(parser.parse_file(path))
+    return parsed
+
+
+def sources(graph, table, column):
+    """Upstream table.column names of a column"""
+    return sorted(f"{e.source_table}.{e.source_column}" for e in graph.upstream(table, column))
+
+
+def writers(parsed, table):
+    """(file_path, statement_id) of the statements writing a table"""
+    return [(parsed.file_path, stmt.statement_id)
+            for stmt in parsed.sql_statements if table in stmt.target_tables]
+
+
+class TestExtraction:
+    """Column edges per statement kind"""
+    
+    def test_insert_matches_columns_by_position(self, tmp_path):
+        graph, parsed = build_graph(tmp_path, (
+            "INSERT INTO db.tgt (id, amount)\n"
+            "SELECT s.src_id, s.price * s.qty FROM db.src s;\n"
+        ))
+        
+        assert sources(graph, 'DB.TGT', 'ID') == ['DB.SRC.SRC_ID']
+        assert sources(graph, 'DB.TGT', 'AMOUNT') == ['DB.SRC.PRICE', 'DB.SRC.QTY']
+        
+        edge = graph.upstream('DB.TGT', 'AMOUNT')[0]
+        assert edge.operation == 'INSERT'
+        assert edge.is_transformation
+        assert not graph.upstream('DB.TGT', 'ID')[0].is_transformation
+        assert graph.is_complete('DB.TGT', 'AMOUNT', writers(parsed, 'DB.TGT'))
+    
+    def test_insert_without_column_list_uses_create_table(self, tmp_path):
+        graph, _ = build_graph(tmp_path, (
+            "CREATE TABLE db.tgt (id INTEGER, name VARCHAR(50));\n"
+            "INSERT INTO db.tgt SELECT cust_id, cust_name FROM db.customers;\n"
+        ))
+        
+        assert graph.table_columns['DB.TGT'] == ['ID', 'NAME']
+        assert sources(graph, 'DB.TGT', 'NAME') == ['DB.CUSTOMERS.CUST_NAME']
+    
+    def test_insert_before_its_create_table_is_resolved_later(self, tmp_path):
+        insert, ddl = parse_files(tmp_path, {
+            'a.sql': "INSERT INTO dw.t SELECT b, a FROM stg.s;\n",
+            'ddl.sql': "CREATE TABLE dw.t (a INTEGER, b INTEGER);\n",
+        })
+        
+        graph = ColumnLineageGraph()
+        graph.add_file(insert)
+        assert not graph.is_complete('DW.T', 'A', writers(insert, 'DW.T'))
+        
+        # Survives a save/load before the definition arrives
+        graph = ColumnLineageGraph.from_dict(graph.to_dict())
+        graph.add_file(ddl)
+        assert sources(graph, 'DW.T', 'A') == ['STG.S.B']
+        assert sources(graph, 'DW.T', 'B') == ['STG.S.A']
+        assert graph.is_complete('DW.T', 'A', writers(insert, 'DW.T'))
+    
+    def test_create_table_as_select(self, tmp_path):
+        graph, _ = build_graph(tmp_path, (
+            "CREATE TABLE db.summary AS (\n"
+            "    SELECT customer_id, SUM(amount) AS total FROM db.orders GROUP BY 1\n"
+            ") WITH DATA;\n"
+        ))
+        
+        assert sources(graph, 'DB.SUMMARY', 'TOTAL') == ['DB.ORDERS.AMOUNT']
+        assert graph.upstream('DB.SUMMARY', 'TOTAL')[0].operation == 'CREATE'
+    
+    def test_create_table_with_no_data_has_no_edges(self, tmp_path):
+        graph, _ = build_graph(tmp_path, (
+            "CREATE TABLE db.empty AS (SELECT customer_id FROM db.orders) WITH NO DATA;\n"
+        ))
+        
+        assert len(graph) == 0
+    
+    def test_update_from(self, tmp_path):
+        graph, parsed = build_graph(tmp_path, (
+            "UPDATE t FROM db.tgt t, db.src s\n"
+            "SET amount = s.total\n"
+            "WHERE t.id = s.id;\n"
+        ))
+        
+        assert sources(graph, 'DB.TGT', 'AMOUNT') == ['DB.SRC.TOTAL']
+        assert graph.upstream('DB.TGT', 'AMOUNT')[0].operation == 'UPDATE'
+        assert graph.is_complete('DB.TGT', 'AMOUNT', writers(parsed, 'DB.TGT'))
+    
+    def test_merge(self, tmp_path):
+        graph, _ = build_graph(tmp_path, (
+            "MERGE INTO db.tgt t\n"
+            "USING db.src s ON t.id = s.id\n"
+            "WHEN MATCHED THEN UPDATE SET amount = s.total\n"
+            "WHEN NOT MATCHED THEN INSERT (id, amount) VALUES (s.id, s.total);\n"
+        ))
+        
+        assert sources(graph, 'DB.TGT', 'AMOUNT') == ['DB.SRC.TOTAL']
+        assert sources(graph, 'DB.TGT', 'ID') == ['DB.SRC.ID']
+        assert {e.operation for e in graph.upstream('DB.TGT', 'AMOUNT')} == {'MERGE'}
+    
+    def test_derived_table_is_resolved_to_its_sources(self, tmp_path):
+        graph, _ = build_graph(tmp_path, (
+            "INSERT INTO db.tgt (total)\n"
+            "SELECT d.total FROM (SELECT SUM(amount) AS total FROM db.orders) d;\n"
+        ))
+        
+        assert sources(graph, 'DB.TGT', 'TOTAL') == ['DB.ORDERS.AMOUNT']
+    
+    def test_join_source_without_alias_is_registered(self, tmp_path):
+        graph, parsed = build_graph(tmp_path, (
+            "INSERT INTO dw.x (c, d)\n"
+            "SELECT s1.a, s2.b FROM stg.s1 JOIN stg.s2 ON s1.id = s2.id;\n"
+        ))
+        
+        assert sources(graph, 'DW.X', 'D') == ['STG.S2.B']
+        assert graph.is_complete('DW.X', 'D', writers(parsed, 'DW.X'))
+    
+    def test_ambiguous_unqualified_column_is_incomplete(self, tmp_path):
+        graph, parsed = build_graph(tmp_path, (
+            "INSERT INTO dw.x (c)\n"
+            "SELECT a FROM stg.s1 LEFT JOIN stg.s2 ON s1.id = s2.id;\n"
+        ))
+        
+        assert sources(graph, 'DW.X', 'C') == ['STG.S1.A', 'STG.S2.A']
+        assert not graph.is_complete('DW.X', 'C', writers(parsed, 'DW.X'))
+    
+    def test_unqualified_column_of_a_known_table_is_complete(self, tmp_path):
+        graph, parsed = build_graph(tmp_path, (
+            "CREATE TABLE stg.s1 (id INTEGER, a INTEGER);\n"
+            "CREATE TABLE stg.s2 (id INTEGER, b INTEGER);\n"
+            "INSERT INTO dw.x (c)\n"
+            "SELECT a FROM stg.s1 JOIN stg.s2 ON s1.id = s2.id;\n"
+        ))
+        
+        assert sources(graph, 'DW.X', 'C') == ['STG.S1.A']
+        assert graph.is_complete('DW.X', 'C', writers(parsed, 'DW.X'))
+    
+    def test_union_is_incomplete(self, tmp_path):
+        graph, parsed = build_graph(tmp_path, (
+            "INSERT INTO db.tgt (id)\n"
+            "SELECT id FROM db.a\n"
+            "UNION ALL\n"
+            "SELECT id FROM db.b;\n"
+        ))
+        
+        assert 'DB.A.ID' in sources(graph, 'DB.TGT', 'ID')
+        assert not graph.is_complete('DB.TGT', 'ID', writers(parsed, 'DB.TGT'))
+    
+    def test_cte_is_incomplete(self, tmp_path):
+        graph, parsed = build_graph(tmp_path, (
+            "WITH recent AS (SELECT id FROM db.orders)\n"
+            "INSERT INTO db.tgt (id) SELECT id FROM recent;\n"
+        ))
+        
+        assert not graph.is_complete('DB.TGT', 'ID', writers(parsed, 'DB.TGT'))
+    
+    def test_procedure_body_statements_are_extracted(self, tmp_path):
+        graph, _ = build_graph(tmp_path, (
+            "REPLACE PROCEDURE db.load()\n"
+            "BEGIN\n"
+            "    INSERT INTO db.a (x) SELECT y FROM db.b;\n"
+            "    UPDATE db.a SET x = 0 WHERE x IS NULL;\n"
+            "END;\n"
+        ))
+        
+        assert sources(graph, 'DB.A', 'X') == ['DB.B.Y']
+    
+    def test_procedure_writer_keeps_column_incomplete(self, tmp_path):
+        parsed = parse_files(tmp_path, {
+            'a.sql': "INSERT INTO dw.x (a) SELECT b FROM stg.y;\n",
+            'p.sql': (
+                "REPLACE PROCEDURE dw.load_x()\n"
+                "BEGIN\n"
+                "    INSERT INTO dw.x SELECT * FROM stg.q;\n"
+                "END;\n"
+            ),
+        })
+        
+        graph = ColumnLineageGraph()
+        index = TableIndex()
+        for parsed_file in parsed:
+            graph.add_file(parsed_file)
+            index.add_file(parsed_file)
+        
+        assert len(index.writers_for_table('DW.X')) == 2
+        assert not graph.is_complete('DW.X', 'A', index.writers_for_table('DW.X'))
+
+
+class TestGraph:
+    """Graph traversal, removal and serialization"""
+    
+    SQL = (
+        "INSERT INTO db.stage (amount) SELECT price FROM db.raw;\n"
+        "INSERT INTO db.mart (revenue) SELECT SUM(amount) FROM db.stage;\n"
+    )
+    
+    def test_lineage_walks_upstream_by_level(self, tmp_path):
+        graph, _ = build_graph(tmp_path, self.SQL)
+        
+        levels = graph.lineage('db.mart', 'revenue')
+        assert [[f"{e.source_table}.{e.source_column}" for e in level] for level in levels] == [
+            ['DB.STAGE.AMOUNT'],
+            ['DB.RAW.PRICE'],
+        ]
+        assert len(graph.lineage('db.mart', 'revenue', max_depth=1)) == 1
+    
+    def test_remove_file_drops_its_edges(self, tmp_path):
+        graph, parsed = build_graph(tmp_path, self.SQL)
+        
+        graph.remove_file(parsed.file_path)
+        assert len(graph) == 0
+        assert graph.upstream('DB.MART', 'REVENUE') == []
+    
+    def test_column_only_created_is_a_source(self, tmp_path):
+        graph, parsed = build_graph(tmp_path, (
+            "CREATE TABLE db.raw (price DECIMAL(10,2));\n" + self.SQL
+        ))
+        
+        assert graph.is_source('DB.RAW', 'PRICE', writers(parsed, 'DB.RAW'))
+        assert not graph.is_source('DB.STAGE', 'AMOUNT', writers(parsed, 'DB.STAGE'))
+    
+    def test_round_trips_through_dict(self, tmp_path):
+        graph, parsed = build_graph(tmp_path, self.SQL)
+        
+        restored = ColumnLineageGraph.from_dict(graph.to_dict())
+        assert len(restored) == len(graph)
+        assert sources(restored, 'DB.MART', 'REVENUE') == ['DB.STAGE.AMOUNT']
+        assert restored.is_complete('DB.MART', 'REVENUE', writers(parsed, 'DB.MART'))
@@ -0,0 +1,105 @@
+"""
+Tests for the lineage analyzer's level tracing and its result cache
+"""
+
+import pytest
+
+from src import lineage_analyzer
+from src.code_parser import TeradataCodeParser
+from src.lineage_analyzer import LineageAnalyzer, LineageCache
+from src.rag_pipeline import LineageRAGPipeline
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    """Index a small repository whose staging table is only created"""
+    (tmp_path / 'ddl.sql').write_text(
+        "CREATE TABLE stg.orders (order_id INTEGER, amount DECIMAL(10,2));\n",
+        encoding='utf-8'
+    )
+    (tmp_path / 'load.sql').write_text(
+        "INSERT INTO dw.sales (order_id, revenue)\n"
+        "SELECT order_id, amount * 2 FROM stg.orders;\n",
+        encoding='utf-8'
+    )
+    
+    rag = LineageRAGPipeline(llm_provider="Anthropic API", api_key="test-key")
+    rag.index_documents(TeradataCodeParser(tmp_path).parse_all_files())
+    return rag
+
+
+def record_prompts(rag):
+    """Replace the pipeline's LLM with one recording its prompts"""
+    prompts = []
+    rag.query_llm = lambda prompt, max_tokens=4000: prompts.append(prompt) or ""
+    return prompts
+
+
+class TestTracing:
+    """Static hops and when the LLM is asked"""
+    
+    def test_table_only_created_is_a_source(self, pipeline):
+        prompts = record_prompts(pipeline)
+        result = LineageAnalyzer(pipeline).analyze_column_lineage('dw.sales', 'revenue')
+        
+        assert prompts == []
+        assert result['llm_calls'] == 0
+        assert [entry['table_name'] for entry in result['source_tables']] == ['STG.ORDERS']
+
+
+class TestLineageCache:
+    """TTL expiry, LRU eviction and persistence of lineage results"""
+    
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        """Controllable time.time() for the cache"""
+        now = [1000.0]
+        monkeypatch.setattr(lineage_analyzer.time, 'time', lambda: now[0])
+        return now
+    
+    def test_least_recently_used_is_evicted(self, tmp_path, clock):
+        cache = LineageCache(tmp_path / 'lineage.json', max_entries=2)
+        cache.put('a', {'summary': 'a'})
+        cache.put('b', {'summary': 'b'})
+        assert cache.get('a') == {'summary': 'a'}
+        
+        cache.put('c', {'summary': 'c'})
+        assert cache.get('b') is None
+        assert (cache.hits, cache.misses) == (1, 1)
+        
+        reloaded = LineageCache(tmp_path / 'lineage.json', max_entries=1)
+        assert reloaded.get('a') is None
+        assert reloaded.get('c') == {'summary': 'c'}
+    
+    def test_entries_expire_after_ttl(self, tmp_path, clock):
+        cache = LineageCache(tmp_path / 'lineage.json', ttl=60)
+        cache.put('a', {'summary': 'a'})
+        
+        clock[0] += 59
+        assert cache.get('a') is not None
+        clock[0] += 2
+        assert cache.get('a') is None
+        assert LineageCache(tmp_path / 'lineage.json', ttl=60).get('a') is None
+        assert LineageCache(tmp_path / 'lineage.json', ttl=None).get('a') is not None
+    
+    def test_results_are_copies(self, tmp_path, clock):
+        cache = LineageCache(tmp_path / 'lineage.json')
+        result = {'source_tables': []}
+        cache.put('a', result)
+        
+        result['source_tables'].append('X')
+        cache.get('a')['source_tables'].append('Y')
+        assert cache.get('a') == {'source_tables': []}
+    
+    def test_analyzer_reuses_results_per_commit(self, pipeline, tmp_path):
+        cache = LineageCache(tmp_path / 'lineage.json')
+        analyzer = LineageAnalyzer(pipeline, result_cache=cache)
+        
+        pipeline.commit_sha = 'abc123'
+        first = analyzer.analyze_column_lineage('dw.sales', 'revenue')
+        assert analyzer.analyze_column_lineage('DW.SALES', 'REVENUE') == first
+        assert (cache.hits, cache.misses) == (1, 1)
+        
+        pipeline.commit_sha = 'def456'
+        analyzer.analyze_column_lineage('dw.sales', 'revenue')
+        assert (cache.hits, cache.misses) == (1, 2)
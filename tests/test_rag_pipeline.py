@@ -0,0 +1,231 @@
+"""
+Tests for indexing, incremental updates and persistence of the RAG pipeline
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from src.code_parser import TeradataCodeParser
+from src.rag_pipeline import EmbeddingCache, LineageRAGPipeline
+
+FILES = {
+    'stage.sql': (
+        "INSERT INTO stg.orders (order_id, amount)\n"
+        "SELECT id, price * qty FROM raw.orders;\n"
+        "DELETE FROM raw.orders WHERE loaded = 1;\n"
+    ),
+    'mart.sql': (
+        "INSERT INTO dw.sales (order_id, revenue)\n"
+        "SELECT order_id, SUM(amount) FROM stg.orders GROUP BY 1;\n"
+    ),
+    'customers.bteq': (
+        ".LOGON tdprod/etl_user,secret;\n"
+        "INSERT INTO dw.customers (customer_id, name)\n"
+        "SELECT cust_id, TRIM(cust_name) FROM raw.customers;\n"
+        ".LOGOFF\n"
+    ),
+}
+
+
+def write_files(repo, files):
+    """Write {name: content} files into repo and parse them"""
+    parser = TeradataCodeParser(repo)
+    parsed = []
+    for name, content in files.items():
+        path = repo / name
+        path.write_text(content, encoding='utf-8')
+        parsed.append(parser.parse_file(path))
+    return parsed
+
+
+def make_pipeline(**options):
+    return LineageRAGPipeline(llm_provider="Anthropic API", api_key="test-key", **options)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    write_files(repo, FILES)
+    return repo
+
+
+def build(repo, **options):
+    """Index every file of repo into a new pipeline"""
+    rag = make_pipeline(**options)
+    rag.index_documents(TeradataCodeParser(repo).parse_all_files())
+    return rag
+
+
+def dense(embeddings):
+    return embeddings.toarray() if hasattr(embeddings, 'toarray') else np.asarray(embeddings)
+
+
+def search(rag, query):
+    return [chunk.chunk_id for chunk in rag.retrieve(query, top_k=3)]
+
+
+class RecordingEmbedder:
+    """compute() for EmbeddingCache that records the texts it embeds"""
+    
+    def __init__(self):
+        self.seen = []
+    
+    def __call__(self, documents):
+        self.seen.extend(documents)
+        return np.array([[len(doc), doc.count('a'), 1.0] for doc in documents], dtype=np.float32)
+
+
+class TestEmbeddingCache:
+    """Hits, LRU eviction and reload from disk"""
+    
+    def test_only_misses_are_computed(self, tmp_path):
+        cache = EmbeddingCache(tmp_path)
+        compute = RecordingEmbedder()
+        
+        first = cache.embed('v1', ['select a', 'select b'], compute)
+        second = cache.embed('v1', ['select b', 'select aa'], compute)
+        
+        assert compute.seen == ['select a', 'select b', 'select aa']
+        np.testing.assert_array_equal(second[0], first[1])
+        assert (cache.hits, cache.misses) == (1, 3)
+        
+        # Versions do not share vectors
+        cache.embed('v2', ['select a'], compute)
+        assert compute.seen[-1] == 'select a'
+    
+    def test_least_recently_used_is_evicted(self, tmp_path):
+        cache = EmbeddingCache(tmp_path, max_entries=2)
+        compute = RecordingEmbedder()
+        
+        cache.embed('v1', ['a', 'b'], compute)
+        cache.embed('v1', ['a'], compute)
+        cache.embed('v1', ['c'], compute)
+        assert compute.seen == ['a', 'b', 'c']
+        
+        cache.embed('v1', ['a', 'c'], compute)
+        cache.embed('v1', ['b'], compute)
+        assert compute.seen == ['a', 'b', 'c', 'b']
+    
+    def test_evicted_slot_is_reused_only_after_flush(self, tmp_path):
+        cache = EmbeddingCache(tmp_path, max_entries=2)
+        compute = RecordingEmbedder()
+        
+        cache.embed('v1', ['a', 'b', 'c'], compute)
+        store = cache._stores['v1']
+        assert store['size'] == 3 and store['free'] == []
+        
+        cache.flush()
+        assert len(store['free']) == 1
+        cache.embed('v1', ['d'], compute)
+        assert store['size'] == 3
+    
+    def test_reload_from_disk(self, tmp_path):
+        cache = EmbeddingCache(tmp_path)
+        expected = cache.embed('v1', ['a', 'bb', 'ccc'], RecordingEmbedder())
+        cache.flush()
+        
+        compute = RecordingEmbedder()
+        reloaded = EmbeddingCache(tmp_path)
+        np.testing.assert_array_equal(reloaded.embed('v1', ['ccc', 'a', 'bb'], compute), expected[[2, 0, 1]])
+        assert compute.seen == []
+        
+        # A smaller limit evicts the least recently used entries on load
+        compute = RecordingEmbedder()
+        smaller = EmbeddingCache(tmp_path, max_entries=1)
+        smaller.embed('v1', ['a', 'ccc'], compute)
+        assert compute.seen == ['a']
+
+
+class TestUpdate:
+    """Incremental updates keep chunks, embeddings and index rows aligned"""
+    
+    @pytest.mark.parametrize('options', [
+        {},
+        {'sparse_embeddings': True},
+        {'index_type': 'hnsw'},
+    ])
+    @pytest.mark.parametrize('refit', [False, True])
+    def test_rows_follow_chunks(self, repo, monkeypatch, options, refit):
+        if not refit:
+            monkeypatch.setattr(LineageRAGPipeline, 'REFIT_CHANGED_SHARE', float('inf'))
+            monkeypatch.setattr(LineageRAGPipeline, 'REFIT_UNKNOWN_TERM_SHARE', float('inf'))
+        rag = build(repo, **options)
+        
+        (repo / 'customers.bteq').unlink()
+        changed = write_files(repo, {
+            'mart.sql': (
+                "INSERT INTO dw.sales (order_id, revenue)\n"
+                "SELECT order_id, SUM(amount) * 1.2 FROM stg.orders GROUP BY 1;\n"
+            ),
+            'returns.sql': (
+                "INSERT INTO dw.returns (order_id, refund)\n"
+                "SELECT order_id, amount FROM stg.orders WHERE amount < 0;\n"
+            ),
+        })
+        rag.update_documents(changed, ['customers.bteq'])
+        
+        assert 'customers.bteq' not in rag.chunks.column('file_path')
+        assert rag.table_index.writers_for_table('dw.customers') == []
+        
+        embeddings = dense(rag.embeddings)
+        assert len(embeddings) == len(rag.chunks)
+        for position, chunk in enumerate(rag.chunks):
+            expected = dense(rag.embedder.quantize(rag.embedder.transform([chunk.content])))[0]
+            np.testing.assert_allclose(embeddings[position], expected, atol=1e-6)
+        
+        if rag.index is not None:
+            assert rag.index.ntotal == len(rag.chunks)
+            for position in range(len(rag.chunks)):
+                np.testing.assert_allclose(rag.index.reconstruct(position), embeddings[position], atol=1e-6)
+        
+        returns = rag.retrieve("dw.returns refund", top_k=1)[0]
+        assert returns.metadata['file_path'] == 'returns.sql'
+
+
+class TestPersistence:
+    """save() / load() round trips"""
+    
+    @pytest.mark.parametrize('options', [
+        {},
+        {'sparse_embeddings': True},
+        {'index_type': 'hnsw'},
+    ])
+    def test_round_trip(self, repo, tmp_path, options):
+        rag = build(repo, **options)
+        rag.save(tmp_path / 'index', repo_url='https://example.com/etl.git', commit_sha='abc123')
+        
+        loaded = make_pipeline(**options)
+        assert loaded.load(tmp_path / 'index')
+        
+        assert loaded.chunks.chunk_ids() == rag.chunks.chunk_ids()
+        assert [chunk.content for chunk in loaded.chunks] == [chunk.content for chunk in rag.chunks]
+        assert (loaded.repo_url, loaded.commit_sha) == ('https://example.com/etl.git', 'abc123')
+        assert loaded.table_index.writers_for_table('dw.sales') == rag.table_index.writers_for_table('dw.sales')
+        assert loaded.column_graph.to_dict() == rag.column_graph.to_dict()
+        np.testing.assert_array_equal(dense(loaded.embeddings), dense(rag.embeddings))
+        for query in ("revenue sales", "customer name trim"):
+            assert search(loaded, query) and search(loaded, query) == search(rag, query)
+    
+    def test_other_configuration_is_not_loaded(self, repo, tmp_path):
+        build(repo).save(tmp_path / 'index')
+        
+        assert not make_pipeline(index_type='hnsw').load(tmp_path / 'index')
+        assert not make_pipeline(sparse_embeddings=True).load(tmp_path / 'index')
+        assert not make_pipeline().load(tmp_path / 'missing')
+    
+    def test_ivf_fallback_records_the_built_type(self, repo, tmp_path):
+        rag = build(repo, index_type='ivf')
+        assert rag.built_index_type == 'flat'
+        rag.save(tmp_path / 'index')
+        
+        with open(tmp_path / 'index' / 'manifest.json', encoding='utf-8') as f:
+            manifest = json.load(f)
+        assert (manifest['index_type'], manifest['requested_index_type']) == ('flat', 'ivf')
+        
+        assert not make_pipeline().load(tmp_path / 'index')
+        loaded = make_pipeline(index_type='ivf')
+        assert loaded.load(tmp_path / 'index')
+        assert loaded.built_index_type == 'flat'